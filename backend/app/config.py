@@ -7,6 +7,11 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_anon_key: str
     supabase_service_role_key: str
+    supabase_jwt_secret: str = ""        # Settings -> API -> JWT Secret (legacy HS256 tokens)
+
+    # Local JWT verification — see app/services/auth/jwt_verifier.py
+    jwt_jwks_refresh_s: int = 600        # re-fetch asymmetric signing keys this often
+    auth_token_cache_ttl_s: int = 60     # verified-token cache (never past the token's exp)
 
     # WhatsApp Cloud API — get from Meta for Developers -> App -> WhatsApp -> API Setup
     whatsapp_access_token: str = ""
@@ -56,6 +61,74 @@ class Settings(BaseSettings):
 
     # Redis — for BullMQ job queue (worker service)
     redis_url: str = "redis://redis:6379"
+    signed_url_redis_cache: bool = True  # share signed photo URLs across workers via Redis
+
+    # Photo worker adaptive concurrency (AIMD) — see app/services/jobs/concurrency.py
+    photo_worker_min_concurrency: int = 1
+    photo_worker_max_concurrency: int = 8
+    photo_worker_initial_concurrency: int = 3
+    photo_worker_target_latency_s: float = 150.0   # ComfyUI generation normally 60-120s
+    photo_worker_max_error_rate: float = 0.2       # rolling share of failed generations
+
+    # Photo job stage checkpoints — see app/services/jobs/checkpoint.py
+    photo_job_spool_dir: str = ""                  # empty = <system tmp>/ava-photo-spool
+    photo_job_checkpoint_ttl_s: int = 86400        # Redis stage state + delivery key lifetime
+
+    # Photo queue fairness — see app/services/jobs/scheduling.py
+    photo_max_inflight_per_user: int = 2           # waiting + running photo jobs per user
+    photo_inflight_ttl_s: int = 900                # orphaned in-flight entries age out after this
+    photo_dedup_ttl_s: int = 600                   # identical pending scene coalesced within this window
+
+    # Chat queue — see app/services/jobs/chat_queue.py and chat_worker_main.py
+    chat_queue_enabled: bool = True                # false = run the chat pipeline inside the API process
+    chat_worker_concurrency: int = 16              # concurrent chat jobs in the chat worker
+    whatsapp_claim_ttl_s: int = 30                 # in-progress inbound claim; ~ the BullMQ job lock duration
+    whatsapp_dedup_ttl_s: int = 604800             # handled inbound message ids; Meta retries for up to 7 days
+    whatsapp_batch_concurrency: int = 8            # messages from one webhook payload processed at once
+
+    # WhatsApp phone -> user cache — see app/services/user_lookup.py
+    phone_lookup_ttl_s: int = 3600                 # Redis, linked numbers (invalidated on re-link)
+    phone_lookup_negative_ttl_s: int = 60          # Redis, unlinked numbers
+    phone_lookup_local_ttl_s: int = 30             # per-process positive hits
+    unlinked_reply_interval_s: int = 600           # one registration reply per unlinked sender per window
+
+    # Stripe webhook processing — see app/services/billing/webhook_events.py
+    stripe_event_max_attempts: int = 8             # BullMQ retries (exponential backoff from 5s)
+    stripe_worker_concurrency: int = 4             # stripe_events jobs at once in the chat worker
+
+    # Subscription entitlement cache — see app/services/billing/entitlements.py
+    entitlement_cache_ttl_s: int = 3600            # Redis (written through by Stripe webhooks)
+    entitlement_local_ttl_s: int = 30              # per-process, active entitlements only
+
+    # Admin metrics rollups — see app/services/metrics/rollups.py (reconcile runs in the photo worker)
+    metrics_reconcile_interval_s: int = 900        # rewrite recent daily rollups + recompute gauges
+    metrics_reconcile_days: int = 3                # days of metrics_daily rewritten from source per run
+    admin_user_page_size: int = 1000               # auth users per list_users() page in the user scan
+    admin_user_metrics_ttl_s: int = 600            # user scan result cache (in-process + Redis)
+    admin_timeseries_ttl_s: int = 300              # /admin/metrics/timeseries windows touching recent days
+
+    # Billing page cache — see app/services/billing/billing_cache.py
+    billing_subscription_cache_ttl_s: int = 3600   # /billing/subscription (written through by webhooks)
+    billing_invoice_cache_ttl_s: int = 86400       # /billing/invoices (invoice.* webhooks merge in)
+
+    # Google Calendar client — see app/services/google_auth/calendar_client.py
+    google_token_cache_size: int = 1000            # users whose OAuth tokens are kept in process
+    google_token_cache_ttl_s: int = 3600           # re-read from Supabase after this (reconnects elsewhere)
+    google_token_refresh_margin_s: int = 300       # refresh in the background this close to expiry
+
+    # Email outbox — see app/services/email/outbox.py (sent by the chat worker)
+    email_batch_size: int = 100                    # emails per Resend batch call (Resend max 100)
+    email_outbox_poll_s: int = 5                   # idle wait between outbox scans (enqueues wake it early)
+    email_lease_s: int = 120                       # a claimed row is reclaimable after this
+    email_max_attempts: int = 8                    # then the row is marked 'failed'
+    email_retry_base_s: int = 30                   # backoff doubles from here per failed attempt
+    email_retry_max_s: int = 3600
+
+    # Outbound WhatsApp sender — see app/services/whatsapp_sender.py
+    whatsapp_send_rate_per_s: float = 60.0         # per sending number, across all processes; Meta's default cap is 80 msg/s
+    whatsapp_send_burst: int = 20
+    whatsapp_send_processes: int = 6               # processes sending (4 API + chat + photo worker); local fallback share
+    whatsapp_send_max_attempts: int = 4            # 429 / connect errors retried with backoff (never 5xx)
 
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
 
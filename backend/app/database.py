@@ -1,4 +1,8 @@
+import httpx
+from postgrest import SyncRequestBuilder
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS, DEFAULT_POSTGREST_CLIENT_TIMEOUT
 from supabase import create_client, Client
+from yarl import URL
 from app.config import settings
 
 # Anon key client — for user-facing operations with RLS enforced
@@ -15,3 +19,38 @@ supabase_admin: Client = create_client(
     settings.supabase_url,
     settings.supabase_service_role_key
 )
+
+# Per-user PostgREST access (RLS as the caller) — one connection pool for the process.
+# supabase_client.postgrest.auth(token) writes the token into the shared client's
+# headers, and the client is rebuilt (new pool) on every sign-in; UserPostgrest keeps
+# the token in its own headers and sends through rest_session instead.
+_rest_url = URL(f"{settings.supabase_url.rstrip('/')}/rest/v1")
+rest_session = httpx.Client(
+    base_url=str(_rest_url),
+    http2=True,
+    timeout=DEFAULT_POSTGREST_CLIENT_TIMEOUT,
+    follow_redirects=True,
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+)
+_rest_headers = httpx.Headers({
+    **DEFAULT_POSTGREST_CLIENT_HEADERS,
+    "apikey": settings.supabase_anon_key,
+    "Accept-Profile": "public",
+    "Content-Profile": "public",
+})
+
+
+class UserPostgrest:
+    """PostgREST queries scoped to one user's JWT. Cheap to build per request; thread-safe."""
+
+    __slots__ = ("_headers",)
+
+    def __init__(self, token: str):
+        self._headers = _rest_headers.copy()
+        self._headers["Authorization"] = f"Bearer {token}"
+
+    def from_(self, table: str) -> SyncRequestBuilder:
+        return SyncRequestBuilder(rest_session, _rest_url.joinpath(table), self._headers, None)
+
+    def table(self, table: str) -> SyncRequestBuilder:
+        return self.from_(table)
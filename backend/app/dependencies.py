@@ -1,23 +1,21 @@
+import asyncio
+import logging
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.database import supabase_client
-from app.services.billing.subscription import get_subscription_status
+from jose import JWTError
+from app.database import UserPostgrest, supabase_client
+from app.services.auth.jwt_verifier import VerifierUnavailable, jwt_verifier
+from app.services.billing.entitlements import has_active_subscription
+
+logger = logging.getLogger(__name__)
 
 bearer_scheme = HTTPBearer()
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-):
-    """
-    Validates Supabase JWT and returns the authenticated user object.
-
-    Raises 401 if the token is missing, expired, or invalid.
-    Use as a dependency on any protected endpoint.
-    """
-    token = credentials.credentials
+async def _remote_user(token: str):
+    """Ask Supabase Auth (sees revocation). Blocking client call — run off the event loop."""
     try:
-        user_response = supabase_client.auth.get_user(token)
+        user_response = await asyncio.to_thread(supabase_client.auth.get_user, token)
         if user_response.user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -33,34 +31,58 @@ async def get_current_user(
         )
 
 
-async def get_authed_supabase(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
 ):
     """
-    Returns a callable that scopes Supabase PostgREST queries to the user's JWT.
+    Validates Supabase JWT and returns the authenticated user object.
 
-    Uses supabase_client.postgrest.auth(token) per-query rather than set_auth()
-    on the singleton — safer in async contexts where multiple requests share
-    the same client instance (avoids JWT context bleed between concurrent requests).
+    Verified locally (signature, expiry, audience, issuer — see
+    app/services/auth/jwt_verifier.py) with no network round trip; falls back to
+    Supabase Auth only when no verification key is available.
+    Raises 401 if the token is missing, expired, or invalid.
+    Use as a dependency on any protected endpoint.
+    """
+    token = credentials.credentials
+    try:
+        return await jwt_verifier.verify(token)
+    except VerifierUnavailable as e:
+        logger.warning(f"Local JWT verification unavailable, checking remotely: {e}")
+        return await _remote_user(token)
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+        )
 
-    Usage in endpoint:
-        db = Depends(get_authed_supabase)
-        result = db("select", "avatars").execute()
 
-    Or more directly via the returned helper that sets auth per-operation.
+async def get_current_user_strict(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+):
     """
-    token = credentials.credentials
+    Like get_current_user, but always confirmed by Supabase Auth, so a token revoked
+    before its expiry (sign-out, deleted or banned user) is rejected.
+    Use on revocation-sensitive routes: admin, billing mutations, phone linking.
+    """
+    return await _remote_user(credentials.credentials)
 
-    class AuthedClient:
-        """Thin wrapper that applies the user JWT to each PostgREST operation."""
 
-        def from_(self, table: str):
-            return supabase_client.postgrest.auth(token).from_(table)
+async def get_authed_supabase(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+) -> UserPostgrest:
+    """
+    Returns a PostgREST client scoped to the user's JWT (RLS applies as the caller).
 
-        def table(self, table: str):
-            return supabase_client.postgrest.auth(token).from_(table)
+    The token lives only in this client's headers; all requests share the process-wide
+    connection pool (app.database.rest_session). Unlike supabase_client.postgrest.auth(token),
+    nothing on a shared client is mutated, so concurrent requests — including queries
+    executed in worker threads via asyncio.to_thread — cannot see each other's JWT.
 
-    return AuthedClient()
+    Usage in endpoint:
+        db = Depends(get_authed_supabase)
+        result = db.from_("avatars").select("*").execute()
+    """
+    return UserPostgrest(credentials.credentials)
 
 
 async def require_active_subscription(user=Depends(get_current_user)):
@@ -68,12 +90,13 @@ async def require_active_subscription(user=Depends(get_current_user)):
     FastAPI dependency — raises 402 Payment Required if user has no active subscription.
     Used on POST /chat (web_chat router) and any other gated endpoints.
     Bypassed when STRIPE_SECRET_KEY is not configured (local dev without Stripe).
+    Served from the entitlement cache (app/services/billing/entitlements.py), which the
+    Stripe webhooks keep current — no subscriptions query in steady state.
     """
     from app.config import settings
     if not settings.stripe_secret_key:
         return user  # Stripe not configured — allow chat in dev
-    status_val = get_subscription_status(str(user.id))
-    if status_val != "active":
+    if not await has_active_subscription(str(user.id)):
         raise HTTPException(
             status_code=402,
             detail="Subscription required. Visit /subscribe to activate.",
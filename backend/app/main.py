@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -13,6 +14,10 @@ from app.routers import google_oauth
 from app.routers import web_chat, photo, billing
 from app.routers import admin
 from app.config import settings
+from app.database import rest_session
+from app.services.chat_updates import chat_updates
+from app.services.google_auth.calendar_client import calendar_client
+from app.services.whatsapp_sender import whatsapp_sender
 
 logger = logging.getLogger(__name__)
 
@@ -61,7 +66,13 @@ async def lifespan(app: FastAPI):
     Replaces the deprecated @app.on_event("startup") pattern.
     """
     _ensure_storage_buckets()
+    # Relay Redis chat-update notifications to this worker's /chat/updates long-polls
+    subscriber = asyncio.ensure_future(chat_updates.run_subscriber())
     yield
+    subscriber.cancel()
+    await whatsapp_sender.aclose()
+    await calendar_client.aclose()
+    rest_session.close()
 
 
 app = FastAPI(
@@ -84,6 +95,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Cursor"],  # incremental GET /chat/history polling
 )
 
 # Mount routers
@@ -7,6 +7,7 @@ from enum import Enum
 class MessageChannel(str, Enum):
     app = "app"
     whatsapp = "whatsapp"
+    web = "web"
 
 
 class MessageRole(str, Enum):
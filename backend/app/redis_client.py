@@ -0,0 +1,23 @@
+"""
+Shared async Redis client (redis.asyncio) for worker metrics, caches and locks.
+
+Points at the same REDIS_URL as the BullMQ queue (app/services/jobs/queue.py) and
+worker (worker_main.py). Lazy init — nothing connects at import time, so modules
+that import this file stay importable in tests and in dev without Redis.
+
+Callers treat Redis as best-effort unless stated otherwise: wrap calls in
+try/except and fall back to the database path on failure.
+"""
+from redis.asyncio import Redis
+
+from app.config import settings
+
+_redis: Redis | None = None
+
+
+def get_redis() -> Redis:
+    """Return module-level async Redis singleton. Lazy init on first call."""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(settings.redis_url, decode_responses=False)
+    return _redis
@@ -152,14 +152,14 @@ async def supabase_send_email_hook(request: Request):
         token = email_data.get("token_hash") or email_data.get("token")
         site_url = email_data.get("site_url") or settings.frontend_url
         reset_url = f"{site_url}/reset-password?token={token}&type=recovery"
-        await send_password_reset_email(user_email, reset_url)
+        await send_password_reset_email(user_email, reset_url, dedup_key=f"password_reset:{token}" if token else None)
 
     elif action_type == "signup":
         # email+password signup — send welcome email
         # Google OAuth users do NOT trigger this hook (they are auto-confirmed)
         full_name = user.get("user_metadata", {}).get("full_name", "")
         first_name = full_name.split()[0] if full_name else None
-        await send_welcome_email(user_email, first_name)
+        await send_welcome_email(user_email, first_name, dedup_key=f"welcome:{user.get('id') or user_email}")
 
     return {}
 
@@ -204,7 +204,7 @@ async def send_welcome(user=Depends(get_current_user)):
     full_name = str(user_meta.get("full_name", ""))
     first_name = full_name.split()[0] if full_name else None
 
-    await send_welcome_email(email, first_name)
+    await send_welcome_email(email, first_name, dedup_key=f"welcome:{user_id}")
 
     # Mark as sent (best-effort, non-blocking)
     try:
@@ -2,40 +2,35 @@
 Billing router — Stripe Checkout and webhook handler.
 
 POST /billing/checkout        — create Stripe Checkout Session (requires auth)
-POST /billing/webhook         — Stripe webhook endpoint (no auth — uses signature verification)
+POST /billing/webhook         — Stripe webhook endpoint (no auth — signature verified, processed in the worker)
 GET  /billing/subscription    — current subscription state from local DB (Phase 11)
-GET  /billing/invoices        — up to 12 recent Stripe invoices (Phase 11)
+GET  /billing/invoices        — up to 12 recent Stripe invoices, cached (Phase 11)
 POST /billing/portal-session  — create Stripe Customer Portal URL (Phase 11)
 POST /billing/cancel          — cancel at period end + emit survey usage event (Phase 11)
 
-Transactional emails added in Phase 9:
+Transactional emails added in Phase 9 (sent by the webhook event handlers in
+app/services/billing/webhook_events.py):
 - checkout.session.completed  -> receipt email    (EMAI-03)
 - customer.subscription.deleted -> cancellation email (EMAI-04)
 """
+import json
 import logging
-from datetime import datetime, timezone
 
 import stripe
 from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 
 from app.database import supabase_admin
-from app.dependencies import get_current_user
+from app.dependencies import get_current_user, get_current_user_strict
 from app.services.billing.stripe_client import (
     cancel_subscription_at_period_end,
     create_checkout_session,
     create_portal_session,
     verify_webhook_event,
 )
-from app.services.billing.subscription import (
-    activate_subscription,
-    deactivate_subscription,
-    get_customer_invoices,
-    get_subscription_detail,
-    get_user_email_by_subscription_id,
-    update_subscription_cancel_state,
-)
-from app.services.email.resend_client import send_cancellation_email, send_receipt_email
+from app.services.billing.subscription import get_subscription_detail, list_customer_invoices
+from app.services.billing.webhook_events import process_stripe_event, record_stripe_event
+from app.services.jobs.billing_queue import enqueue_stripe_event
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +45,7 @@ class CancelRequest(BaseModel):
 @router.get("/subscription")
 async def get_subscription(user=Depends(get_current_user)):
     """
-    Return current subscription state from local DB (not a live Stripe call).
+    Return current subscription state from the billing cache / local DB (not a live Stripe call).
     Use get_current_user only — NOT require_active_subscription (Pitfall 7).
     """
     detail = await get_subscription_detail(str(user.id))
@@ -63,22 +58,22 @@ async def get_subscription(user=Depends(get_current_user)):
 async def list_invoices(user=Depends(get_current_user)):
     """
     Return up to 12 most recent Stripe invoices for the user.
-    Calls Stripe API (not cached) — used only on explicit billing page load.
+    Served from the billing cache (kept current by invoice.* webhooks); Stripe is only
+    called, in a worker thread, on a cache miss.
     stripe_customer_id may be None for users who never subscribed — returns [].
     """
     detail = await get_subscription_detail(str(user.id))
     if detail is None or not detail.get("stripe_customer_id"):
         return []
     try:
-        invoices = get_customer_invoices(detail["stripe_customer_id"])
-        return invoices
+        return await list_customer_invoices(detail["stripe_customer_id"])
     except Exception as e:
         logger.error(f"Invoice list failed for user {user.id}: {e}")
         return []
 
 
 @router.post("/portal-session")
-async def create_billing_portal_session(user=Depends(get_current_user)):
+async def create_billing_portal_session(user=Depends(get_current_user_strict)):
     """
     Create a Stripe Customer Portal session and return the URL.
     Frontend opens URL in new tab. Never cache this URL — portal sessions are single-use.
@@ -100,7 +95,7 @@ async def create_billing_portal_session(user=Depends(get_current_user)):
 
 
 @router.post("/cancel")
-async def cancel_subscription(body: CancelRequest, user=Depends(get_current_user)):
+async def cancel_subscription(body: CancelRequest, user=Depends(get_current_user_strict)):
     """
     Set cancel_at_period_end=True on the Stripe subscription.
     CRITICAL: Uses stripe.Subscription.modify() — user retains access until period end.
@@ -136,7 +131,7 @@ class CheckoutRequest(BaseModel):
 
 
 @router.post("/checkout")
-async def create_checkout(body: CheckoutRequest = CheckoutRequest(), user=Depends(get_current_user)):
+async def create_checkout(body: CheckoutRequest = CheckoutRequest(), user=Depends(get_current_user_strict)):
     """
     Create a Stripe Checkout Session and return the redirect URL.
     Frontend redirects user to checkout_url.
@@ -155,19 +150,20 @@ async def create_checkout(body: CheckoutRequest = CheckoutRequest(), user=Depend
 @router.post("/webhook")
 async def stripe_webhook(request: Request):
     """
-    Stripe webhook — verifies signature then handles:
-    - checkout.session.completed -> activate subscription + send receipt email (EMAI-03)
-    - invoice.payment_failed -> deactivate subscription (past_due)
-    - customer.subscription.deleted -> cancel subscription + send cancellation email (EMAI-04)
+    Stripe webhook — verifies the signature, records the event id, enqueues and returns 200.
+
+    Handling (activation, status changes, receipt/cancellation emails) runs in the chat
+    worker via app/services/billing/webhook_events.py, with retries and per-subscription
+    ordering. A redelivery of an already processed event is acknowledged without running
+    its handler again. If the queue is unavailable the event is processed in-process.
 
     CRITICAL: await request.body() BEFORE any JSON parsing (Pitfall 4 from RESEARCH.md).
-    Email failures never raise — they are logged and the webhook returns 200 regardless.
     """
     raw_body = await request.body()
     sig_header = request.headers.get("stripe-signature", "")
 
     try:
-        event = verify_webhook_event(raw_body, sig_header)
+        verify_webhook_event(raw_body, sig_header)
     except stripe.error.SignatureVerificationError:
         logger.warning("Stripe webhook signature verification failed")
         raise HTTPException(status_code=400, detail="Invalid webhook signature")
@@ -175,86 +171,18 @@ async def stripe_webhook(request: Request):
         logger.error(f"Stripe webhook error: {e}")
         raise HTTPException(status_code=400, detail="Webhook processing failed")
 
-    event_type = event["type"]
-    data = event["data"]["object"]
-
-    if event_type == "checkout.session.completed":
-        user_id = data.get("metadata", {}).get("user_id")
-        if user_id:
-            await activate_subscription(
-                user_id=user_id,
-                customer_id=data.get("customer", ""),
-                subscription_id=data.get("subscription", ""),
-            )
-
-            # Emit subscription_created usage event (ADMN-02)
-            # Different from subscription_cancelled (emitted in /billing/cancel)
-            try:
-                supabase_admin.from_("usage_events").insert({
-                    "user_id": user_id,
-                    "event_type": "subscription_created",
-                    "metadata": {"customer_id": data.get("customer", "")},
-                }).execute()
-            except Exception as exc:
-                logger.error("Failed to emit subscription_created usage event: %s", exc)
-
-            # EMAI-03: receipt email — non-blocking, log-only on failure
-            try:
-                user_email = (data.get("customer_details") or {}).get("email")
-                amount_cents = data.get("amount_total") or 0
-                amount_usd = amount_cents / 100.0
-
-                # next_billing_date: not in checkout session directly; use "next month" as fallback
-                # Phase 11 will display the actual date from the subscriptions table
-                next_billing = "your next billing date"
-
-                if user_email:
-                    await send_receipt_email(user_email, amount_usd, next_billing)
-                else:
-                    logger.warning("No customer email in checkout.session.completed — receipt not sent")
-            except Exception as exc:
-                logger.error("Receipt email failed (non-blocking): %s", exc)
-
-    elif event_type in ("invoice.payment_failed",):
-        sub_id = data.get("subscription")
-        if sub_id:
-            await deactivate_subscription(sub_id, new_status="past_due")
-
-    elif event_type == "customer.subscription.updated":
-        sub_id = data.get("id")
-        if sub_id:
-            cancel_at_period_end = data.get("cancel_at_period_end", False)
-            current_period_end_ts = data.get("current_period_end")
-            try:
-                await update_subscription_cancel_state(
-                    subscription_id=sub_id,
-                    cancel_at_period_end=cancel_at_period_end,
-                    current_period_end_ts=current_period_end_ts,
-                )
-            except Exception as exc:
-                logger.error("Failed to update cancel_at_period_end for sub %s: %s", sub_id, exc)
-
-    elif event_type == "customer.subscription.deleted":
-        sub_id = data.get("id")
-        if sub_id:
-            await deactivate_subscription(sub_id, new_status="canceled")
+    # Signature covers the raw body — the verified payload as a plain dict for the job
+    event = json.loads(raw_body)
 
-            # EMAI-04: cancellation email — non-blocking, log-only on failure
-            try:
-                user_email = await get_user_email_by_subscription_id(sub_id)
-                period_end_ts = data.get("current_period_end")
-                if period_end_ts:
-                    access_until = datetime.fromtimestamp(
-                        period_end_ts, tz=timezone.utc
-                    ).strftime("%B %d, %Y")
-                else:
-                    access_until = "the end of your current billing period"
+    if not await record_stripe_event(event):
+        return {"received": True}
 
-                if user_email:
-                    await send_cancellation_email(user_email, access_until)
-                else:
-                    logger.warning("Could not resolve email for sub %s — cancellation email not sent", sub_id)
-            except Exception as exc:
-                logger.error("Cancellation email failed (non-blocking): %s", exc)
+    if not await enqueue_stripe_event(event):
+        try:
+            await process_stripe_event(event)
+        except Exception as e:
+            # Not acknowledged — Stripe redelivers and the handler runs again
+            logger.error(f"Stripe event {event['id']} failed in-process: {e}")
+            raise HTTPException(status_code=500, detail="Webhook processing failed")
 
     return {"received": True}
@@ -1,24 +1,107 @@
-from fastapi import APIRouter, Depends, Query
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+
 from app.dependencies import get_current_user, get_authed_supabase
 from app.models.message import MessageResponse
-from typing import List
+from app.services.messages.cursor import after_filter, before_filter, decode_cursor, encode_cursor
+from app.services.messages.store import MESSAGE_FIELDS, message_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
+# Rows per PostgREST round trip during export — bounds memory to one page regardless
+# of history length.
+EXPORT_PAGE_SIZE = 500
+
 
 @router.get("", response_model=List[MessageResponse])
 async def get_message_history(
+    response: Response,
     limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
     user=Depends(get_current_user),
     db=Depends(get_authed_supabase),
 ):
-    """Returns user's message history, newest first. RLS enforces isolation."""
-    result = (
+    """
+    Returns user's message history, newest first. RLS enforces isolation.
+
+    Keyset pagination: when a full page is returned, the X-Cursor header holds a cursor
+    for its oldest row — pass it back as `before` to fetch the next (older) page.
+    """
+    if before is None:
+        cached = await message_cache.page(str(user.id), db, limit)
+        if cached is not None:
+            rows = list(reversed(cached))
+            if len(rows) == limit:
+                response.headers["X-Cursor"] = encode_cursor(rows[-1])
+            return rows
+
+    query = (
         db.from_("messages")
-        .select("*")
+        .select(MESSAGE_FIELDS)
         .eq("user_id", str(user.id))
+    )
+    if before is not None:
+        query = query.or_(before_filter(decode_cursor(before)))
+    result = (
+        query
         .order("created_at", desc=True)
+        .order("id", desc=True)
         .limit(limit)
         .execute()
     )
-    return result.data
+    rows = result.data or []
+    if len(rows) == limit:
+        response.headers["X-Cursor"] = encode_cursor(rows[-1])
+    return rows
+
+
+async def _export_rows(db, user_id: str) -> AsyncIterator[bytes]:
+    """
+    Yield the user's full history as NDJSON, oldest first, one keyset page at a time.
+    PostgREST calls run in a thread so a long export does not block the event loop.
+    """
+    after_key: tuple[str, str] | None = None
+    exported = 0
+    while True:
+        query = db.from_("messages").select(MESSAGE_FIELDS).eq("user_id", user_id)
+        if after_key:
+            query = query.or_(after_filter(after_key))
+        query = query.order("created_at").order("id").limit(EXPORT_PAGE_SIZE)
+        result = await asyncio.to_thread(query.execute)
+        rows = result.data or []
+        if rows:
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode()
+            exported += len(rows)
+        if len(rows) < EXPORT_PAGE_SIZE:
+            break
+        after_key = (rows[-1]["created_at"], rows[-1]["id"])
+    logger.info(f"Exported {exported} messages for user {user_id}")
+
+
+@router.get("/export")
+async def export_message_history(
+    user=Depends(get_current_user),
+    db=Depends(get_authed_supabase),
+):
+    """
+    Streams the user's complete message history (all channels) as NDJSON, one message
+    object per line, oldest first. Used for data-access / portability requests.
+    Memory stays bounded to one EXPORT_PAGE_SIZE page however long the history is.
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d")
+    return StreamingResponse(
+        _export_rows(db, str(user.id)),
+        media_type="application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="ava-messages-{stamp}.ndjson"',
+            "Cache-Control": "no-store",
+        },
+    )
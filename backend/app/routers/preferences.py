@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.dependencies import get_current_user, get_authed_supabase
+from app.dependencies import get_current_user, get_current_user_strict, get_authed_supabase
 from app.models.preferences import PhoneLinkRequest, PreferencesResponse, PreferencesPatchRequest
 from app.config import settings
+from app.services.user_lookup import invalidate_phone_lookup
 
 router = APIRouter(prefix="/preferences", tags=["preferences"])
 
@@ -9,7 +10,7 @@ router = APIRouter(prefix="/preferences", tags=["preferences"])
 @router.put("/whatsapp")
 async def link_whatsapp(
     body: PhoneLinkRequest,
-    user=Depends(get_current_user),
+    user=Depends(get_current_user_strict),
     db=Depends(get_authed_supabase),
 ):
     """
@@ -19,11 +20,17 @@ async def link_whatsapp(
     Once linked, messages from this number on WhatsApp will be routed
     to this user's account. Pydantic validates E.164 before the DB write.
     """
+    previous = db.from_("user_preferences").select("whatsapp_phone").eq("user_id", str(user.id)).execute()
+    previous_phone = previous.data[0].get("whatsapp_phone") if previous.data else None
+
     db.from_("user_preferences").upsert({
         "user_id": str(user.id),
         "whatsapp_phone": body.phone,
     }, on_conflict="user_id").execute()
 
+    # Old number must stop routing here; new number may be negatively cached as unlinked
+    await invalidate_phone_lookup(previous_phone, body.phone)
+
     # Send welcome template to initiate the WhatsApp conversation
     if settings.whatsapp_access_token and settings.whatsapp_phone_number_id:
         try:
@@ -1,65 +1,38 @@
 """
 Web chat router — POST /chat and GET /chat/history.
 
-Uses WebAdapter -> platform_router -> ChatService pipeline.
-POST /chat: synchronous user-message insert → asyncio.ensure_future LLM task → return user row.
-GET /chat/history: returns web-channel messages (RLS-filtered).
+The LLM round trip (WebAdapter -> platform_router -> ChatService) runs in
+chat_pipeline.reply_to_web_message, normally inside the chat worker.
+POST /chat: synchronous user-message insert → enqueue LLM reply (chat worker) → return user row.
+GET /chat/history: returns web-channel messages (RLS-filtered); incremental via `after`
+  cursor + ETag/If-None-Match (304) so steady-state polling is a single-row query.
+GET /chat/updates: long-poll variant — blocks until a new message is published for the user.
 Pitfall 3: never mix channel='web' with 'whatsapp'.
 """
 import asyncio
+import hashlib
 import logging
-from datetime import datetime, timezone
-from fastapi import APIRouter, Depends
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
 from app.dependencies import get_current_user, get_authed_supabase, require_active_subscription
-from app.adapters.base import NormalizedMessage
-from app.adapters.web_adapter import WebAdapter
 from app.services.user_lookup import get_avatar_for_user
-from app.database import supabase_admin
+from app.services.storage.signed_urls import photo_urls
+from app.services.chat_pipeline import reply_to_web_message
+from app.services.chat_updates import chat_updates
+from app.services.jobs.chat_queue import enqueue_web_reply
+from app.services.messages.cursor import after_filter, decode_cursor, encode_cursor
+from app.services.messages.store import insert_messages, message_cache
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-# Module-level singletons shared with webhook (same ChatService instance ensures shared session)
-# Import from webhook to reuse — avoids creating a second ChatService with a different SessionStore
-from app.routers.webhook import _chat_service
-
-_web_adapter = WebAdapter(chat_service=_chat_service)
-
 
 class ChatRequest(BaseModel):
     text: str
 
 
-async def _run_llm_and_insert(user_id: str, text: str, avatar: dict | None) -> None:
-    """
-    Independent asyncio Task — not cancelled by connection close.
-    Runs LLM call and inserts assistant reply into DB.
-    Uses asyncio.ensure_future() (NOT FastAPI BackgroundTasks) because
-    CORSMiddleware cancels BackgroundTasks on connection close — confirmed
-    codebase bug fixed in avatars.py (Phase 07).
-    All exceptions caught — never propagates to the event loop.
-    """
-    try:
-        msg = NormalizedMessage(
-            user_id=user_id,
-            text=text,
-            platform="web",
-            timestamp=datetime.now(timezone.utc),
-        )
-        reply_text = await _web_adapter.receive(msg)
-        supabase_admin.from_("messages").insert({
-            "user_id": user_id,
-            "avatar_id": avatar["id"] if avatar else None,
-            "channel": "web",
-            "role": "assistant",
-            "content": reply_text,
-        }).execute()
-    except Exception as e:
-        logger.error(f"Background LLM task failed for user {user_id}: {e}")
-
-
 @router.post("")
 async def send_message(
     body: ChatRequest,
@@ -68,32 +41,36 @@ async def send_message(
     """
     Send a message via the web chat interface.
     Step 1: Insert user message into DB immediately (fast ~10ms).
-    Step 2: Schedule LLM + assistant insert as independent asyncio Task.
+    Step 2: Queue LLM + assistant insert for the chat worker (in-process Task if the
+            queue is unavailable).
     Step 3: Return the inserted user message row — frontend appends it to cache instantly.
-    GET /chat/history polling at 3s picks up the assistant reply when it lands.
+    GET /chat/updates picks up the assistant reply when it lands.
     """
     user_id = str(user.id)
     avatar = await get_avatar_for_user(user_id)
 
-    # Insert user message immediately — before LLM starts
-    result = supabase_admin.from_("messages").insert({
+    # Insert user message immediately — before LLM starts.
+    # insert_messages also writes through to the history cache and wakes other tabs'
+    # /chat/updates long-polls.
+    inserted = await insert_messages([{
         "user_id": user_id,
         "avatar_id": avatar["id"] if avatar else None,
         "channel": "web",
         "role": "user",
         "content": body.text,
-    }).execute()
+    }])
 
-    if not result.data:
-        from fastapi import HTTPException
+    if not inserted:
         raise HTTPException(status_code=500, detail="Failed to save message")
 
-    user_row = result.data[0]
+    user_row = inserted[0]
 
-    # Fire LLM + assistant-reply insert as independent task.
-    # asyncio.ensure_future() creates a Task NOT tied to this request — immune to
-    # CORSMiddleware cancellation (same pattern as avatars.py Phase 07 BUG FIX).
-    asyncio.ensure_future(_run_llm_and_insert(user_id, body.text, avatar))
+    # Queue LLM + assistant-reply insert for the chat worker (durable across restarts).
+    # Fallback when the queue is unreachable: asyncio.ensure_future() — a Task NOT tied
+    # to this request, immune to CORSMiddleware cancellation (same pattern as avatars.py
+    # Phase 07 BUG FIX).
+    if not await enqueue_web_reply(user_id, body.text, avatar):
+        asyncio.ensure_future(reply_to_web_message(user_id, body.text, avatar))
 
     # Return the user message row — frontend uses it to show bubble immediately
     return {
@@ -106,95 +83,210 @@ async def send_message(
 
 _PHOTO_PATH_OPEN = "[PHOTO_PATH]"
 _PHOTO_PATH_CLOSE = "[/PHOTO_PATH]"
-_PHOTO_SIGNED_URL_TTL = 3600        # signed URL lifetime: 1 hour
-_PHOTO_CACHE_REFRESH_BEFORE = 600   # regenerate when less than 10 min remain
-
-# Cache: storage_path -> (signed_url, generated_at unix timestamp)
-_signed_url_cache: dict[str, tuple[str, float]] = {}
 
 
-def _get_signed_url(storage_path: str) -> str | None:
-    """Return a cached signed URL, regenerating only when close to expiry."""
-    import time
-    cached = _signed_url_cache.get(storage_path)
-    if cached:
-        url, generated_at = cached
-        age = time.time() - generated_at
-        if age < _PHOTO_SIGNED_URL_TTL - _PHOTO_CACHE_REFRESH_BEFORE:
-            return url  # still fresh — reuse
-
-    # Generate a new signed URL
-    try:
-        sign_response = (
-            supabase_admin.storage
-            .from_("photos")
-            .create_signed_url(storage_path, _PHOTO_SIGNED_URL_TTL)
-        )
-        url = (
-            sign_response.get("signedURL")
-            or sign_response.get("signedUrl")
-            or sign_response.get("signed_url")
-        )
-        if url:
-            import time as _time
-            _signed_url_cache[storage_path] = (url, _time.time())
-            return url
-        logger.error(f"_get_signed_url: no URL in response for {storage_path!r}: {sign_response}")
-    except Exception as e:
-        logger.error(f"_get_signed_url: error signing {storage_path!r}: {e}")
-    return None
+def _photo_path(content: str) -> str | None:
+    """Storage path inside a [PHOTO_PATH]...[/PHOTO_PATH] token, if any."""
+    if _PHOTO_PATH_OPEN not in content:
+        return None
+    start = content.find(_PHOTO_PATH_OPEN) + len(_PHOTO_PATH_OPEN)
+    end = content.find(_PHOTO_PATH_CLOSE)
+    return content[start:end] if end > start else None
 
 
-def _rewrite_photo_paths(messages: list[dict]) -> list[dict]:
+async def _rewrite_photo_paths(messages: list[dict]) -> list[dict]:
     """
     Replace [PHOTO_PATH]{path}[/PHOTO_PATH] tokens in message content with
-    signed URLs. URLs are cached for ~50 minutes to prevent flicker on polling.
+    signed URLs. All paths on the page are signed in one bulk call; URLs are
+    cached (SignedUrlService) for ~50 minutes to prevent flicker on polling.
     """
+    paths = [p for p in (_photo_path(m.get("content", "")) for m in messages) if p]
+    if not paths:
+        return messages
+    urls = await photo_urls.sign_many(paths)
+
     rewritten = []
     for msg in messages:
         content: str = msg.get("content", "")
-        if _PHOTO_PATH_OPEN in content:
-            start = content.find(_PHOTO_PATH_OPEN) + len(_PHOTO_PATH_OPEN)
-            end = content.find(_PHOTO_PATH_CLOSE)
-            if end > start:
-                storage_path = content[start:end]
-                url = _get_signed_url(storage_path)
-                if url:
-                    new_content = (
-                        content[: content.find(_PHOTO_PATH_OPEN)]
-                        + f"[PHOTO]{url}[/PHOTO]"
-                        + content[end + len(_PHOTO_PATH_CLOSE):]
-                    )
-                    msg = {**msg, "content": new_content}
+        storage_path = _photo_path(content)
+        url = urls.get(storage_path) if storage_path else None
+        if url:
+            new_content = (
+                content[: content.find(_PHOTO_PATH_OPEN)]
+                + f"[PHOTO]{url}[/PHOTO]"
+                + content[content.find(_PHOTO_PATH_CLOSE) + len(_PHOTO_PATH_CLOSE):]
+            )
+            msg = {**msg, "content": new_content}
         rewritten.append(msg)
     return rewritten
 
 
+# ETag time bucket — a 304 lets the client keep previously served signed URLs, which
+# SignedUrlService guarantees valid for >= 10 min; rotating the tag every 5 min keeps
+# every URL the client holds comfortably inside that window.
+_HISTORY_ETAG_BUCKET_S = 300
+
+
+def _history_etag(last_row: dict | None, after: str | None, limit: int) -> str:
+    bucket = int(time.time() // _HISTORY_ETAG_BUCKET_S)
+    last_id = last_row["id"] if last_row else "empty"
+    digest = hashlib.sha1(f"{last_id}:{after}:{limit}:{bucket}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+_HISTORY_FIELDS = ("id", "role", "content", "created_at")
+
+
+async def _newest_row(user_id: str, db) -> dict | None:
+    """Cheap change check: newest web message (id, created_at) for this user."""
+    cached = await message_cache.page(user_id, db, 1, channel="web")
+    if cached is not None:
+        return cached[-1] if cached else None
+
+    result = (
+        db.from_("messages")
+        .select("id, created_at")
+        .eq("channel", "web")
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(1)
+        .execute()
+    )
+    return result.data[0] if result.data else None
+
+
+async def _fetch_page(user_id: str, db, after_key: tuple[str, str] | None, limit: int) -> list[dict]:
+    """
+    Chronological page: rows newer than after_key, or the most recent `limit` rows.
+    Served from the write-through history cache when it can answer exactly.
+    """
+    cached = await message_cache.page(user_id, db, limit, channel="web", after_key=after_key)
+    if cached is not None:
+        return [{f: row[f] for f in _HISTORY_FIELDS} for row in cached]
+
+    query = (
+        db.from_("messages")
+        .select(", ".join(_HISTORY_FIELDS))
+        .eq("channel", "web")
+    )
+    if after_key:
+        result = (
+            query
+            .or_(after_filter(after_key))
+            .order("created_at")
+            .order("id")
+            .limit(limit)
+            .execute()
+        )
+        return result.data or []
+    result = (
+        query
+        .order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(limit)
+        .execute()
+    )
+    # Return in chronological order for display (reverse the newest-first fetch)
+    return list(reversed(result.data or []))
+
+
 @router.get("/history")
 async def get_chat_history(
+    request: Request,
+    response: Response,
     limit: int = 50,
+    after: str | None = None,
     user=Depends(get_current_user),
     db=Depends(get_authed_supabase),
 ):
     """
-    Return recent web-channel messages for the authenticated user.
+    Return web-channel messages for the authenticated user, in chronological order.
     Filters to channel='web' only — never returns WhatsApp messages (Pitfall 3).
-    Returns newest-first, limit defaults to 50.
+
+    Without `after`: the most recent `limit` messages (default 50).
+    With `after` (cursor from a previous X-Cursor header): only messages newer than it,
+    oldest first — keyset on (created_at, id), so steady-state polls return [].
+
+    Conditional requests: the ETag is derived from the user's newest message id (one
+    single-row query). A matching If-None-Match returns 304 without fetching or
+    re-signing the page. X-Cursor carries the cursor of the newest row returned
+    (or echoes `after` when nothing is new); it is "" for an empty history. A 304 on
+    a full page carries the same X-Cursor the 200 did, so the client can go straight
+    back to long-polling /chat/updates.
 
     Any message content containing a [PHOTO_PATH] storage path token is rewritten
     to a fresh 1-hour signed URL before returning, ensuring photos remain accessible
     permanently regardless of when the message was originally created.
     """
-    result = (
-        db.from_("messages")
-        .select("id, role, content, created_at")
-        .eq("channel", "web")
-        .order("created_at", desc=True)
-        .limit(min(limit, 200))
-        .execute()
-    )
-    # Return in chronological order for display (reverse the newest-first fetch)
-    messages = list(reversed(result.data or []))
+    limit = min(limit, 200)
+    after_key = decode_cursor(after) if after else None
+
+    last_row = await _newest_row(str(user.id), db)
+
+    etag = _history_etag(last_row, after, limit)
+    if request.headers.get("if-none-match") == etag:
+        headers = {"ETag": etag}
+        if not after:
+            # The full page ends with the newest row
+            headers["X-Cursor"] = encode_cursor(last_row) if last_row else ""
+        elif last_row is None or last_row["id"] == after_key[1]:
+            headers["X-Cursor"] = after
+        return Response(status_code=304, headers=headers)
+    response.headers["ETag"] = etag
+
+    if after_key and (last_row is None or last_row["id"] == after_key[1]):
+        # Nothing newer than the cursor — skip the page query entirely
+        response.headers["X-Cursor"] = after
+        return []
+
+    messages = await _fetch_page(str(user.id), db, after_key, limit)
+    response.headers["X-Cursor"] = encode_cursor(messages[-1]) if messages else (after or "")
     # Rewrite any [PHOTO_PATH] tokens to fresh signed URLs
-    messages = _rewrite_photo_paths(messages)
+    messages = await _rewrite_photo_paths(messages)
     return messages
+
+
+_LONG_POLL_MAX_S = 30.0  # stay well under Nginx proxy_read_timeout (60s)
+
+
+@router.get("/updates")
+async def get_chat_updates(
+    response: Response,
+    after: str | None = None,
+    timeout: float = 25.0,
+    user=Depends(get_current_user),
+    db=Depends(get_authed_supabase),
+):
+    """
+    Long-poll for web-channel messages newer than `after` (an X-Cursor value).
+    Without `after` (the history was empty, X-Cursor ""), any web message counts.
+
+    Returns as soon as any exist — immediately if they already do — otherwise blocks
+    until a producer publishes for this user (chat_updates notifier, fanned out across
+    API workers via Redis pub/sub) or `timeout` seconds pass, then returns []. Same
+    response shape and X-Cursor header as GET /chat/history?after=.
+    """
+    after_key = decode_cursor(after) if after else None
+    timeout = max(0.0, min(timeout, _LONG_POLL_MAX_S))
+    user_id = str(user.id)
+    deadline = asyncio.get_running_loop().time() + timeout
+
+    # Register before the first check so an insert between check and wait still wakes us
+    event = chat_updates.register(user_id)
+    try:
+        messages: list[dict] = []
+        while True:
+            event.clear()
+            last_row = await _newest_row(user_id, db)
+            if last_row and (after_key is None or last_row["id"] != after_key[1]):
+                messages = await _fetch_page(user_id, db, after_key, 200)
+                if messages:
+                    break
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0 or not await chat_updates.wait(event, remaining):
+                break
+    finally:
+        chat_updates.unregister(user_id, event)
+
+    response.headers["X-Cursor"] = encode_cursor(messages[-1]) if messages else (after or "")
+    return await _rewrite_photo_paths(messages)
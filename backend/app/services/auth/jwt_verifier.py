@@ -0,0 +1,155 @@
+"""
+Local verification of Supabase access tokens (JWTs).
+
+get_current_user used to call supabase_client.auth.get_user(token) on every request —
+a blocking round trip to Supabase Auth on the event loop, on every history poll.
+A Supabase access token is a signed JWT, so the signature, expiry, audience and
+issuer can be checked locally:
+
+  - HS256 (legacy JWT secret): SUPABASE_JWT_SECRET.
+  - ES256/RS256 (asymmetric signing keys): public keys from the project's JWKS
+    endpoint, cached and refreshed every JWT_JWKS_REFRESH_S — and at once, at most
+    every JWKS_MIN_REFETCH_S, when a token names an unknown kid (key rotation).
+
+Verified tokens are cached (sha256 of the token -> AuthUser) for at most
+AUTH_TOKEN_CACHE_TTL_S and never past their exp.
+
+What local verification cannot see is revocation (sign-out, user deleted/banned)
+before the token expires. Revocation-sensitive routes therefore use
+dependencies.get_current_user_strict, which still asks Supabase Auth (off the event
+loop). If no key material is available at all the verifier reports unavailable and
+get_current_user falls back to the same remote check.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import dataclass, field
+
+import httpx
+from jose import JWTError, jwt
+
+from app.config import settings
+from app.services.cache.lru import TTLCache
+
+logger = logging.getLogger(__name__)
+
+AUDIENCE = "authenticated"
+JWKS_MIN_REFETCH_S = 30.0
+LEEWAY_S = 10
+ASYMMETRIC_ALGS = {"ES256", "RS256"}
+
+
+@dataclass
+class AuthUser:
+    """The subset of gotrue's User that routes read, built from verified JWT claims."""
+
+    id: str
+    email: str | None = None
+    phone: str | None = None
+    role: str | None = None
+    app_metadata: dict = field(default_factory=dict)
+    user_metadata: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_claims(cls, claims: dict) -> "AuthUser":
+        return cls(
+            id=claims["sub"],
+            email=claims.get("email"),
+            phone=claims.get("phone"),
+            role=claims.get("role"),
+            app_metadata=claims.get("app_metadata") or {},
+            user_metadata=claims.get("user_metadata") or {},
+        )
+
+
+class VerifierUnavailable(Exception):
+    """No key material to verify this token locally — caller should check remotely."""
+
+
+class SupabaseJwtVerifier:
+    def __init__(
+        self,
+        supabase_url: str | None = None,
+        jwt_secret: str | None = None,
+        jwks_refresh_s: float | None = None,
+        cache_ttl_s: float | None = None,
+        clock=time.time,
+    ):
+        base = (supabase_url or settings.supabase_url).rstrip("/")
+        self.issuer = f"{base}/auth/v1"
+        self.jwks_url = f"{self.issuer}/.well-known/jwks.json"
+        self.jwt_secret = settings.supabase_jwt_secret if jwt_secret is None else jwt_secret
+        self.jwks_refresh_s = jwks_refresh_s or settings.jwt_jwks_refresh_s
+        self.cache_ttl_s = cache_ttl_s or settings.auth_token_cache_ttl_s
+        self._clock = clock
+        self._keys: dict[str, dict] = {}
+        self._keys_fetched_at = float("-inf")   # last successful JWKS fetch
+        self._last_attempt = float("-inf")      # last fetch attempt, successful or not
+        self._jwks_lock = asyncio.Lock()
+        self._verified = TTLCache(maxsize=10000, ttl_s=self.cache_ttl_s)
+
+    async def verify(self, token: str) -> AuthUser:
+        """AuthUser for a valid token. Raises JWTError if invalid, VerifierUnavailable if unverifiable."""
+        cache_key = hashlib.sha256(token.encode()).hexdigest()
+        user = self._verified.get(cache_key)
+        if user is not None:
+            return user
+
+        header = jwt.get_unverified_header(token)
+        alg = header.get("alg")
+        if alg == "HS256":
+            if not self.jwt_secret:
+                raise VerifierUnavailable("HS256 token but SUPABASE_JWT_SECRET is not set")
+            key = self.jwt_secret
+        elif alg in ASYMMETRIC_ALGS:
+            key = await self._signing_key(header.get("kid"))
+        else:
+            raise JWTError(f"Unsupported JWT alg {alg!r}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[alg],
+            audience=AUDIENCE,
+            issuer=self.issuer,
+            options={"leeway": LEEWAY_S, "require_exp": True, "require_sub": True},
+        )
+        user = AuthUser.from_claims(claims)
+        ttl = min(self.cache_ttl_s, claims["exp"] - self._clock())
+        if ttl > 0:
+            self._verified.set(cache_key, user, ttl_s=ttl)
+        return user
+
+    async def _signing_key(self, kid: str | None) -> dict:
+        stale = self._clock() - self._keys_fetched_at > self.jwks_refresh_s
+        if stale or kid not in self._keys:
+            await self._refresh_jwks()
+        if kid in self._keys:
+            return self._keys[kid]
+        if not self._keys:
+            raise VerifierUnavailable("JWKS unavailable")
+        raise JWTError(f"Unknown signing key {kid!r}")
+
+    async def _refresh_jwks(self) -> None:
+        async with self._jwks_lock:
+            # Another request refreshed while we waited, or unknown kids / an outage are
+            # being probed too often — at most one fetch per JWKS_MIN_REFETCH_S
+            if self._clock() - self._last_attempt < JWKS_MIN_REFETCH_S:
+                return
+            self._last_attempt = self._clock()
+            try:
+                async with httpx.AsyncClient(timeout=5.0) as client:
+                    response = await client.get(self.jwks_url, headers={"apikey": settings.supabase_anon_key})
+                    response.raise_for_status()
+                    keys = response.json().get("keys", [])
+            except Exception as e:
+                logger.warning(f"JWKS refresh failed (keeping {len(self._keys)} cached keys): {e}")
+                return
+            self._keys = {k["kid"]: k for k in keys if k.get("kid")}
+            self._keys_fetched_at = self._clock()
+            logger.info(f"JWKS refreshed: {len(self._keys)} signing key(s)")
+
+
+# Module-level singleton used by app.dependencies
+jwt_verifier = SupabaseJwtVerifier()
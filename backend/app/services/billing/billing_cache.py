@@ -0,0 +1,107 @@
+"""
+Billing page cache — subscription detail per user, recent invoices per Stripe customer.
+
+GET /billing/subscription and /billing/invoices used to re-read the subscriptions
+table and call stripe.Invoice.list (synchronously, on the event loop) on every page
+load. Both are now served from Redis and kept current by the writers:
+
+  - ava:billing:sub:{user_id}       subscription detail JSON ("none" = no row), written
+    through by activate/deactivate/update_subscription_cancel_state (the Stripe
+    webhook handlers), BILLING_SUBSCRIPTION_CACHE_TTL_S as a backstop.
+  - ava:billing:invoices:{customer} up to 12 invoices, newest first; an invoice.paid /
+    invoice.payment_failed webhook merges that invoice into the cached list.
+    BILLING_INVOICE_CACHE_TTL_S as a backstop.
+
+Redis errors fall back to the database / Stripe (called in a worker thread by the
+readers in subscription.py); lookup failures are never cached.
+"""
+import json
+import logging
+
+from app.config import settings
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+MAX_INVOICES = 12
+_NO_SUBSCRIPTION = "none"
+# Returned by get_cached_subscription_detail() on a cache miss (None is a cached value)
+MISSING = object()
+
+
+def _subscription_key(user_id: str) -> str:
+    return f"ava:billing:sub:{user_id}"
+
+
+def _invoices_key(customer_id: str) -> str:
+    return f"ava:billing:invoices:{customer_id}"
+
+
+async def get_cached_subscription_detail(user_id: str):
+    """Cached detail dict, None for a cached "no subscription", or MISSING on a miss."""
+    try:
+        raw = await get_redis().get(_subscription_key(user_id))
+    except Exception as e:
+        logger.warning(f"Billing cache unavailable for user {user_id}: {e}")
+        return MISSING
+    if raw is None:
+        return MISSING
+    raw = raw.decode() if isinstance(raw, bytes) else raw
+    return None if raw == _NO_SUBSCRIPTION else json.loads(raw)
+
+
+async def store_subscription_detail(user_id: str, detail: dict | None) -> None:
+    """Write a user's subscription detail (None = no subscription row). Never raises."""
+    value = _NO_SUBSCRIPTION if detail is None else json.dumps(detail)
+    try:
+        await get_redis().set(_subscription_key(user_id), value, ex=settings.billing_subscription_cache_ttl_s)
+    except Exception as e:
+        logger.warning(f"Billing cache write failed for user {user_id}: {e}")
+
+
+async def get_cached_invoices(customer_id: str) -> list[dict] | None:
+    """Cached invoice list, or None on a miss."""
+    try:
+        raw = await get_redis().get(_invoices_key(customer_id))
+    except Exception as e:
+        logger.warning(f"Invoice cache unavailable for customer {customer_id}: {e}")
+        return None
+    return json.loads(raw) if raw is not None else None
+
+
+async def store_invoices(customer_id: str, invoices: list[dict]) -> None:
+    try:
+        await get_redis().set(
+            _invoices_key(customer_id), json.dumps(invoices[:MAX_INVOICES]),
+            ex=settings.billing_invoice_cache_ttl_s,
+        )
+    except Exception as e:
+        logger.warning(f"Invoice cache write failed for customer {customer_id}: {e}")
+
+
+def invoice_summary(invoice) -> dict:
+    """The fields GET /billing/invoices returns, from a Stripe Invoice object or webhook dict."""
+    return {
+        "id": invoice["id"],
+        "date": invoice["created"],
+        "amount_paid": invoice["amount_paid"],
+        "status": invoice["status"],
+        "invoice_pdf": invoice.get("invoice_pdf"),
+    }
+
+
+async def record_invoice(invoice: dict) -> None:
+    """
+    Merge an invoice from a webhook into its customer's cached list. With no cached
+    list there is nothing to merge into — the next page load fetches from Stripe.
+    """
+    customer_id = invoice.get("customer")
+    if not customer_id:
+        return
+    cached = await get_cached_invoices(customer_id)
+    if cached is None:
+        return
+    summary = invoice_summary(invoice)
+    merged = [summary] + [inv for inv in cached if inv.get("id") != summary["id"]]
+    merged.sort(key=lambda inv: inv["date"], reverse=True)
+    await store_invoices(customer_id, merged)
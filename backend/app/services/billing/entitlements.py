@@ -0,0 +1,118 @@
+"""
+Subscription entitlement cache — lets gated endpoints skip the subscriptions query.
+
+require_active_subscription runs on every POST /chat. The entitlement (status +
+current_period_end) only changes when a Stripe webhook lands, so it is cached and the
+webhook branches in subscription.py write the new value straight through:
+
+  - Local tier: TTLCache, active entitlements only, ENTITLEMENT_LOCAL_TTL_S (short —
+    other processes cannot evict it, so this bounds how long a cancelled subscription
+    keeps chatting on another API process).
+  - Redis tier: ava:entitlement:{user_id} = {"status", "current_period_end"} JSON for
+    ENTITLEMENT_CACHE_TTL_S, including "no subscription row" (status null). Written by
+    activate/deactivate/update_subscription_cancel_state, so a new subscriber is let
+    through on their very next request.
+
+An active entitlement whose current_period_end has passed is treated as a miss and
+re-read from the database (renewals arrive as webhooks that may have been missed).
+Database errors propagate and are never cached; Redis errors fall back to the database.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.database import supabase_admin
+from app.redis_client import get_redis
+from app.services.cache.lru import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_entitlement_local = TTLCache(maxsize=10000, ttl_s=settings.entitlement_local_ttl_s)
+
+
+def _entitlement_key(user_id: str) -> str:
+    return f"ava:entitlement:{user_id}"
+
+
+def _period_end_iso(period_end: datetime | str | None) -> str | None:
+    if isinstance(period_end, datetime):
+        return period_end.isoformat()
+    return period_end
+
+
+def _expired(entitlement: dict) -> bool:
+    """True if an active entitlement is past its current_period_end."""
+    period_end = entitlement.get("current_period_end")
+    if entitlement.get("status") != "active" or not period_end:
+        return False
+    try:
+        return datetime.fromisoformat(period_end) <= datetime.now(timezone.utc)
+    except ValueError:
+        return True  # unparseable — let the database decide
+
+
+def _fetch_entitlement(user_id: str) -> dict:
+    result = (
+        supabase_admin.from_("subscriptions")
+        .select("status, current_period_end")
+        .eq("user_id", user_id)
+        .limit(1)
+        .execute()
+    )
+    row = result.data[0] if result.data else {}
+    return {"status": row.get("status"), "current_period_end": row.get("current_period_end")}
+
+
+async def store_entitlement(user_id: str, status: str | None, current_period_end: datetime | str | None) -> None:
+    """Write an entitlement to both tiers (webhook write-through). Never raises."""
+    entitlement = {"status": status, "current_period_end": _period_end_iso(current_period_end)}
+    if status == "active":
+        _entitlement_local.set(user_id, entitlement)
+    else:
+        _entitlement_local.delete(user_id)
+    try:
+        await get_redis().set(
+            _entitlement_key(user_id), json.dumps(entitlement), ex=settings.entitlement_cache_ttl_s,
+        )
+    except Exception as e:
+        logger.warning(f"Entitlement cache write failed for user {user_id}: {e}")
+
+
+async def invalidate_entitlement(user_id: str) -> None:
+    """Forget a cached entitlement (next check reads the database)."""
+    _entitlement_local.delete(user_id)
+    try:
+        await get_redis().delete(_entitlement_key(user_id))
+    except Exception as e:
+        logger.error(f"Entitlement invalidation failed for user {user_id}: {e}")
+
+
+async def get_entitlement(user_id: str) -> dict:
+    """{"status": str | None, "current_period_end": iso str | None} for a user, cached."""
+    entitlement = _entitlement_local.get(user_id)
+    if entitlement is not None and not _expired(entitlement):
+        return entitlement
+
+    try:
+        cached = await get_redis().get(_entitlement_key(user_id))
+    except Exception as e:
+        logger.warning(f"Entitlement cache unavailable for user {user_id} (querying DB): {e}")
+        cached = None
+    if cached is not None:
+        entitlement = json.loads(cached)
+        if not _expired(entitlement):
+            if entitlement.get("status") == "active":
+                _entitlement_local.set(user_id, entitlement)
+            return entitlement
+
+    entitlement = await asyncio.to_thread(_fetch_entitlement, user_id)
+    await store_entitlement(user_id, entitlement["status"], entitlement["current_period_end"])
+    return entitlement
+
+
+async def has_active_subscription(user_id: str) -> bool:
+    """Entitlement check for gated endpoints — no DB read when the cache is warm."""
+    entitlement = await get_entitlement(user_id)
+    return entitlement.get("status") == "active"
@@ -1,11 +1,17 @@
 """
 Subscription status persistence — reads/writes the subscriptions table in Supabase.
 Uses supabase_admin (service role) because Stripe webhooks run without user JWT.
+Every write also refreshes the entitlement cache (entitlements.py) and the billing page
+cache (billing_cache.py) so gated endpoints and /billing pages see the new state on the
+next request.
 """
+import asyncio
 import logging
 import stripe
 from datetime import datetime, timezone
 from app.database import supabase_admin
+from app.services.billing import billing_cache
+from app.services.billing.entitlements import store_entitlement
 
 logger = logging.getLogger(__name__)
 
@@ -31,19 +37,36 @@ async def activate_subscription(
         data["current_period_end"] = period_end.isoformat()
 
     try:
-        supabase_admin.from_("subscriptions").upsert(
+        result = supabase_admin.from_("subscriptions").upsert(
             data, on_conflict="user_id"
         ).execute()
         logger.info(f"Subscription activated for user {user_id}")
     except Exception as e:
         logger.error(f"Failed to activate subscription for user {user_id}: {e}")
         raise
+    await store_entitlement(user_id, "active", period_end)
+    await _store_billing_details(result.data)
+
+
+async def _store_entitlements(rows: list[dict] | None) -> None:
+    """Write-through for updates keyed by stripe_subscription_id (rows returned by the update)."""
+    for row in rows or []:
+        if row.get("user_id"):
+            await store_entitlement(row["user_id"], row.get("status"), row.get("current_period_end"))
+    await _store_billing_details(rows)
+
+
+async def _store_billing_details(rows: list[dict] | None) -> None:
+    """Write-through of the /billing/subscription payload from rows returned by a write."""
+    for row in rows or []:
+        if isinstance(row, dict) and row.get("user_id"):
+            await billing_cache.store_subscription_detail(row["user_id"], _detail_from_row(row))
 
 
 async def deactivate_subscription(subscription_id: str, new_status: str = "inactive") -> None:
     """Set subscription status to inactive/past_due/canceled. Called on payment failure/cancel."""
     try:
-        supabase_admin.from_("subscriptions").update({
+        result = supabase_admin.from_("subscriptions").update({
             "status": new_status,
             "updated_at": "now()",
         }).eq("stripe_subscription_id", subscription_id).execute()
@@ -51,13 +74,14 @@ async def deactivate_subscription(subscription_id: str, new_status: str = "inact
     except Exception as e:
         logger.error(f"Failed to deactivate subscription {subscription_id}: {e}")
         raise
+    await _store_entitlements(result.data)
 
 
 def get_subscription_status(user_id: str) -> str | None:
     """
     Synchronous check — returns subscription status string or None if no row.
     Returns 'active', 'inactive', 'past_due', 'canceled', or None.
-    Used by require_active_subscription FastAPI dependency.
+    Uncached — require_active_subscription uses entitlements.has_active_subscription.
     """
     result = (
         supabase_admin.from_("subscriptions")
@@ -69,58 +93,81 @@ def get_subscription_status(user_id: str) -> str | None:
     return result.data[0]["status"] if result.data else None
 
 
+def _detail_from_row(row: dict) -> dict:
+    return {
+        "plan_name": "Ava Monthly",
+        "status": row["status"],
+        "current_period_end": row.get("current_period_end"),
+        "cancel_at_period_end": row.get("cancel_at_period_end", False),
+        "stripe_customer_id": row.get("stripe_customer_id"),
+        "stripe_subscription_id": row.get("stripe_subscription_id"),
+    }
+
+
+def _fetch_subscription_detail(user_id: str) -> dict | None:
+    result = (
+        supabase_admin.from_("subscriptions")
+        .select("status, current_period_end, cancel_at_period_end, stripe_customer_id, stripe_subscription_id")
+        .eq("user_id", user_id)
+        .limit(1)
+        .execute()
+    )
+    return _detail_from_row(result.data[0]) if result.data else None
+
+
 async def get_subscription_detail(user_id: str) -> dict | None:
     """
-    Return subscription detail from local DB (no live Stripe call).
+    Return subscription detail from the billing cache / local DB (no live Stripe call).
     Returns None if the user has no subscription row.
     Hard-codes plan_name as "Ava Monthly" — single-product MVP.
     """
+    cached = await billing_cache.get_cached_subscription_detail(user_id)
+    if cached is not billing_cache.MISSING:
+        return cached
     try:
-        result = (
-            supabase_admin.from_("subscriptions")
-            .select("status, current_period_end, cancel_at_period_end, stripe_customer_id, stripe_subscription_id")
-            .eq("user_id", user_id)
-            .limit(1)
-            .execute()
-        )
-        if not result.data:
-            return None
-        row = result.data[0]
-        return {
-            "plan_name": "Ava Monthly",
-            "status": row["status"],
-            "current_period_end": row["current_period_end"],
-            "cancel_at_period_end": row.get("cancel_at_period_end", False),
-            "stripe_customer_id": row["stripe_customer_id"],
-            "stripe_subscription_id": row["stripe_subscription_id"],
-        }
+        detail = await asyncio.to_thread(_fetch_subscription_detail, user_id)
     except Exception as e:
         logger.error(f"Failed to get subscription detail for user {user_id}: {e}")
         return None
+    await billing_cache.store_subscription_detail(user_id, detail)
+    return detail
+
+
+def _list_stripe_invoices(stripe_customer_id: str) -> list[dict]:
+    invoices = stripe.Invoice.list(customer=stripe_customer_id, limit=billing_cache.MAX_INVOICES)
+    return [billing_cache.invoice_summary(inv) for inv in invoices.data]
 
 
 def get_customer_invoices(stripe_customer_id: str) -> list[dict]:
     """
     Return up to 12 most recent Stripe invoices for the given customer.
-    Synchronous — stripe SDK is synchronous.
+    Synchronous — stripe SDK is synchronous. Uncached; see list_customer_invoices.
     Returns [] on any error.
     """
     try:
-        invoices = stripe.Invoice.list(customer=stripe_customer_id, limit=12)
-        return [
-            {
-                "date": inv.created,
-                "amount_paid": inv.amount_paid,
-                "status": inv.status,
-                "invoice_pdf": inv.invoice_pdf,
-            }
-            for inv in invoices.data
-        ]
+        return _list_stripe_invoices(stripe_customer_id)
     except Exception as e:
         logger.error(f"Failed to list invoices for customer {stripe_customer_id}: {e}")
         return []
 
 
+async def list_customer_invoices(stripe_customer_id: str) -> list[dict]:
+    """
+    Recent invoices from the billing cache; on a miss, from Stripe in a worker thread
+    (then cached). Returns [] on any error — errors are not cached.
+    """
+    cached = await billing_cache.get_cached_invoices(stripe_customer_id)
+    if cached is not None:
+        return cached
+    try:
+        invoices = await asyncio.to_thread(_list_stripe_invoices, stripe_customer_id)
+    except Exception as e:
+        logger.error(f"Failed to list invoices for customer {stripe_customer_id}: {e}")
+        return []
+    await billing_cache.store_invoices(stripe_customer_id, invoices)
+    return invoices
+
+
 async def update_subscription_cancel_state(
     subscription_id: str,
     cancel_at_period_end: bool,
@@ -128,7 +175,8 @@ async def update_subscription_cancel_state(
 ) -> None:
     """
     Persist cancel_at_period_end (and optionally current_period_end) for a subscription row.
-    Called from the customer.subscription.updated webhook branch — non-fatal on failure.
+    Called from the customer.subscription.updated webhook branch. Raises on failure so
+    the event is marked failed and retried, not recorded as processed.
     """
     try:
         update_data: dict = {
@@ -140,9 +188,10 @@ async def update_subscription_cancel_state(
                 current_period_end_ts, tz=timezone.utc
             ).isoformat()
 
-        supabase_admin.from_("subscriptions").update(update_data).eq(
+        result = supabase_admin.from_("subscriptions").update(update_data).eq(
             "stripe_subscription_id", subscription_id
         ).execute()
+        await _store_entitlements(result.data)
         logger.info(
             "Updated cancel_at_period_end=%s for subscription %s",
             cancel_at_period_end,
@@ -154,6 +203,7 @@ async def update_subscription_cancel_state(
             subscription_id,
             e,
         )
+        raise
 
 
 async def get_user_email_by_subscription_id(subscription_id: str) -> str | None:
@@ -0,0 +1,262 @@
+"""
+Stripe webhook event processing — runs off the request path.
+
+POST /billing/webhook only verifies the signature, calls record_stripe_event() and
+enqueues (app/services/jobs/billing_queue.py). The chat worker then runs
+process_stripe_event(), with BullMQ retries and backoff on failure.
+
+  - Idempotency: every event is recorded in stripe_events (migration 010) keyed by
+    event.id. A redelivery of an already processed event is acknowledged and dropped.
+    Handlers are safe to re-run after a failed attempt: the subscription write comes
+    first and is an upsert/update, and the later steps (usage event, email) never raise.
+  - Ordering per subscription: events for one subscription are applied one at a time
+    in this process (subscription_lock), and an event older than one already applied
+    in the same group (status changes, or subscription updates) is marked 'skipped',
+    so an out-of-order delivery cannot roll a canceled subscription back to past_due.
+
+The ledger fails open: if stripe_events is unreachable the event is still processed,
+only without redelivery dedup.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from app.database import supabase_admin
+from app.services.billing.billing_cache import record_invoice
+from app.services.billing.subscription import (
+    activate_subscription,
+    deactivate_subscription,
+    get_user_email_by_subscription_id,
+    update_subscription_cancel_state,
+)
+from app.services.email.resend_client import send_cancellation_email, send_receipt_email
+
+logger = logging.getLogger(__name__)
+
+# Event types whose ordering matters against each other, per subscription
+STATUS_EVENTS = ("checkout.session.completed", "invoice.payment_failed", "customer.subscription.deleted")
+UPDATE_EVENTS = ("customer.subscription.updated",)
+
+# subscription_id -> [lock, holders]; entries are dropped when the last holder releases
+_subscription_locks: dict[str, list] = {}
+
+
+@asynccontextmanager
+async def subscription_lock(subscription_id: str | None) -> AsyncIterator[None]:
+    """Serialize event handling for one subscription within this process."""
+    if not subscription_id:
+        yield
+        return
+    entry = _subscription_locks.setdefault(subscription_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _subscription_locks[subscription_id]
+
+
+def event_subscription_id(event: dict) -> str | None:
+    """The Stripe subscription id an event applies to, if any."""
+    data = event["data"]["object"]
+    if event["type"].startswith("customer.subscription."):
+        return data.get("id")
+    return data.get("subscription")
+
+
+def _ordering_group(event_type: str) -> tuple[str, ...] | None:
+    if event_type in STATUS_EVENTS:
+        return STATUS_EVENTS
+    if event_type in UPDATE_EVENTS:
+        return UPDATE_EVENTS
+    return None
+
+
+async def record_stripe_event(event: dict) -> bool:
+    """
+    Record a verified event in the stripe_events ledger.
+    Returns False for a redelivery that was already processed (or skipped) — the
+    caller acknowledges without processing. True means process (new, or a previous
+    attempt has not finished).
+    """
+    row = {
+        "id": event["id"],
+        "type": event["type"],
+        "subscription_id": event_subscription_id(event),
+        "event_created": event.get("created") or 0,
+        "payload": event,
+    }
+    try:
+        inserted = await asyncio.to_thread(
+            supabase_admin.from_("stripe_events").upsert(row, on_conflict="id", ignore_duplicates=True).execute
+        )
+        if inserted.data:
+            return True
+        existing = await asyncio.to_thread(
+            supabase_admin.from_("stripe_events").select("status").eq("id", event["id"]).limit(1).execute
+        )
+    except Exception as e:
+        logger.error(f"Stripe event ledger unavailable, processing {event['id']} without dedup: {e}")
+        return True
+    status = existing.data[0]["status"] if existing.data else "pending"
+    if status in ("processed", "skipped"):
+        logger.info(f"Duplicate Stripe delivery {event['id']} ({event['type']}) ignored")
+        return False
+    return True
+
+
+async def _mark(event_id: str, status: str, error: str | None = None, attempt: int | None = None) -> None:
+    update: dict = {"status": status, "last_error": error}
+    if attempt is not None:
+        update["attempts"] = attempt
+    if status in ("processed", "skipped"):
+        update["processed_at"] = datetime.now(timezone.utc).isoformat()
+    try:
+        await asyncio.to_thread(
+            supabase_admin.from_("stripe_events").update(update).eq("id", event_id).execute
+        )
+    except Exception as e:
+        logger.warning(f"Failed to mark Stripe event {event_id} {status}: {e}")
+
+
+async def _is_stale(event: dict, subscription_id: str | None) -> bool:
+    """True if a newer event of the same ordering group was already applied."""
+    group = _ordering_group(event["type"])
+    if not subscription_id or group is None:
+        return False
+    try:
+        newer = await asyncio.to_thread(
+            supabase_admin.from_("stripe_events")
+            .select("id")
+            .eq("subscription_id", subscription_id)
+            .eq("status", "processed")
+            .in_("type", list(group))
+            .gt("event_created", event.get("created") or 0)
+            .limit(1)
+            .execute
+        )
+    except Exception as e:
+        logger.warning(f"Stripe ordering check failed for {event['id']} (applying it): {e}")
+        return False
+    return bool(newer.data)
+
+
+async def process_stripe_event(event: dict, attempt: int | None = None) -> None:
+    """
+    Apply one Stripe event. Raises if the subscription write fails, so the job is
+    retried; marks the ledger row processed / skipped / failed. attempt (1-based,
+    from the BullMQ job) is recorded in stripe_events.attempts.
+    """
+    subscription_id = event_subscription_id(event)
+    async with subscription_lock(subscription_id):
+        if await _is_stale(event, subscription_id):
+            logger.info(f"Stripe event {event['id']} ({event['type']}) is older than applied state — skipped")
+            await _mark(event["id"], "skipped", attempt=attempt)
+            return
+        try:
+            await handle_stripe_event(event)
+        except Exception as e:
+            await _mark(event["id"], "failed", str(e)[:500], attempt=attempt)
+            raise
+        await _mark(event["id"], "processed", attempt=attempt)
+
+
+async def handle_stripe_event(event: dict) -> None:
+    """
+    Handlers per event type:
+    - checkout.session.completed -> activate subscription + queue receipt email (EMAI-03)
+    - invoice.payment_failed -> deactivate subscription (past_due)
+    - customer.subscription.updated -> persist cancel_at_period_end / current_period_end
+    - customer.subscription.deleted -> cancel subscription + queue cancellation email (EMAI-04)
+    - invoice.paid / invoice.payment_failed -> merge the invoice into the billing page cache
+
+    Email failures never raise — they are logged and the event still counts as processed.
+    """
+    event_type = event["type"]
+    data = event["data"]["object"]
+
+    if event_type == "checkout.session.completed":
+        user_id = data.get("metadata", {}).get("user_id")
+        if user_id:
+            await activate_subscription(
+                user_id=user_id,
+                customer_id=data.get("customer", ""),
+                subscription_id=data.get("subscription", ""),
+            )
+
+            # Emit subscription_created usage event (ADMN-02)
+            # Different from subscription_cancelled (emitted in /billing/cancel)
+            try:
+                supabase_admin.from_("usage_events").insert({
+                    "user_id": user_id,
+                    "event_type": "subscription_created",
+                    "metadata": {"customer_id": data.get("customer", "")},
+                }).execute()
+            except Exception as exc:
+                logger.error("Failed to emit subscription_created usage event: %s", exc)
+
+            # EMAI-03: receipt email — non-blocking, log-only on failure
+            try:
+                user_email = (data.get("customer_details") or {}).get("email")
+                amount_cents = data.get("amount_total") or 0
+                amount_usd = amount_cents / 100.0
+
+                # next_billing_date: not in checkout session directly; use "next month" as fallback
+                # Phase 11 will display the actual date from the subscriptions table
+                next_billing = "your next billing date"
+
+                if user_email:
+                    await send_receipt_email(
+                        user_email, amount_usd, next_billing, dedup_key=f"receipt:{data.get('id')}"
+                    )
+                else:
+                    logger.warning("No customer email in checkout.session.completed — receipt not sent")
+            except Exception as exc:
+                logger.error("Receipt email failed (non-blocking): %s", exc)
+
+    elif event_type in ("invoice.payment_failed",):
+        sub_id = data.get("subscription")
+        if sub_id:
+            await deactivate_subscription(sub_id, new_status="past_due")
+        await record_invoice(data)
+
+    elif event_type == "invoice.paid":
+        await record_invoice(data)
+
+    elif event_type == "customer.subscription.updated":
+        sub_id = data.get("id")
+        if sub_id:
+            cancel_at_period_end = data.get("cancel_at_period_end", False)
+            current_period_end_ts = data.get("current_period_end")
+            await update_subscription_cancel_state(
+                subscription_id=sub_id,
+                cancel_at_period_end=cancel_at_period_end,
+                current_period_end_ts=current_period_end_ts,
+            )
+
+    elif event_type == "customer.subscription.deleted":
+        sub_id = data.get("id")
+        if sub_id:
+            await deactivate_subscription(sub_id, new_status="canceled")
+
+            # EMAI-04: cancellation email — non-blocking, log-only on failure
+            try:
+                user_email = await get_user_email_by_subscription_id(sub_id)
+                period_end_ts = data.get("current_period_end")
+                if period_end_ts:
+                    access_until = datetime.fromtimestamp(
+                        period_end_ts, tz=timezone.utc
+                    ).strftime("%B %d, %Y")
+                else:
+                    access_until = "the end of your current billing period"
+
+                if user_email:
+                    await send_cancellation_email(user_email, access_until, dedup_key=f"cancellation:{sub_id}")
+                else:
+                    logger.warning("Could not resolve email for sub %s — cancellation email not sent", sub_id)
+            except Exception as exc:
+                logger.error("Cancellation email failed (non-blocking): %s", exc)
@@ -0,0 +1,57 @@
+"""
+Bounded in-process LRU cache with per-entry TTL.
+
+Used as the local tier in front of Redis for hot, cheap-to-recompute values
+(signed URLs, lookups). Single event loop — not thread-safe, and nothing here awaits.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU cache capped at `maxsize` entries; each entry expires `ttl_s` seconds after set().
+    Expired entries are dropped lazily on access; the least recently used entry is
+    evicted when a set() would exceed maxsize.
+    """
+
+    def __init__(self, maxsize: int, ttl_s: float, clock: Callable[[], float] = time.monotonic):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be >= 1, got {maxsize}")
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._data: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        value, expires_at = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_s: float | None = None) -> None:
+        expires_at = self._clock() + (self.ttl_s if ttl_s is None else ttl_s)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
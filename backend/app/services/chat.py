@@ -63,6 +63,8 @@ SEND_PHOTO_TOOL = {
 }
 
 PHOTO_PLACEHOLDER_MSG = "I'm sending you a photo... give me a moment 📸"
+PHOTO_DUPLICATE_MSG = "That photo is already on its way — give me a moment 📸"
+PHOTO_THROTTLED_MSG = "I'm still working on your other photos — ask me again once they arrive 📸"
 
 # Keywords that confirm a pending calendar conflict — lives here so it runs before
 # intent classification, where 'yes' would otherwise be classified as 'chat'.
@@ -366,13 +368,16 @@ class ChatService:
                         # Enqueue BullMQ job (non-blocking — do not await delivery)
                         from app.services.jobs.queue import enqueue_photo_job
                         channel = "web"  # default; webhook.py may override for WhatsApp
-                        await enqueue_photo_job(
+                        status = await enqueue_photo_job(
                             user_id=user_id,
                             scene_description=scene_description,
                             avatar=avatar,
                             channel=channel,
                         )
-                        reply = PHOTO_PLACEHOLDER_MSG
+                        reply = {
+                            "duplicate": PHOTO_DUPLICATE_MSG,
+                            "throttled": PHOTO_THROTTLED_MSG,
+                        }.get(status, PHOTO_PLACEHOLDER_MSG)
                         # CRITICAL: append placeholder text (NOT the tool_calls message)
                         # to history — prevents OpenAI "tool message must follow tool_calls" error
                         # (RESEARCH.md Pitfall 3)
@@ -0,0 +1,265 @@
+"""
+Chat pipeline — the LLM round trip for both channels, independent of HTTP.
+
+Runs in the chat worker (chat_worker_main.py, BullMQ queue 'chat_messages'); the
+API process only persists the user's message and enqueues. When the queue is
+unavailable the routers call the same functions in-process, so behaviour is
+identical either way.
+
+  reply_to_web_message     — web: LLM reply -> insert assistant row (user row already saved)
+  process_whatsapp_message — WhatsApp: for every message in the payload,
+                             dedup -> lookup -> LLM -> send -> log both rows
+
+Per-user ordering: each user's messages are handled one at a time (user_lock) so
+replies and session history follow the order messages arrived in, while different
+users run concurrently up to the worker's concurrency. Inbound WhatsApp messages are
+also serialized per sender phone (sender_lock) from before the dedup claim and user
+lookup, so two payloads from one sender cannot overtake each other.
+
+Module-level singletons: ChatService + adapters share one SessionStore per process.
+SessionStore is in-memory, so conversation state lives in the process that runs this
+pipeline — run a single chat worker until SessionStore is Redis-backed.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterator
+
+from app.adapters.base import NormalizedMessage
+from app.adapters.web_adapter import WebAdapter
+from app.adapters.whatsapp_adapter import WhatsAppAdapter
+from app.config import settings
+from app.services.chat import ChatService
+from app.services.llm.openai_provider import OpenAIProvider
+from app.services.messages.store import insert_messages
+from app.services.session.store import get_session_store
+from app.services.user_lookup import get_avatar_for_user, lookup_user_by_phone
+from app.services.whatsapp import (
+    allow_unlinked_reply,
+    claim_inbound_message,
+    complete_inbound_message,
+    release_inbound_message,
+    send_whatsapp_message,
+)
+
+logger = logging.getLogger(__name__)
+
+# Module-level singletons — instantiated once at import time
+_llm_provider = OpenAIProvider(
+    api_key=settings.openai_api_key,
+    model=settings.llm_model,
+)
+chat_service = ChatService(llm=_llm_provider, session_store=get_session_store())
+whatsapp_adapter = WhatsAppAdapter(
+    chat_service=chat_service,
+    phone_number_id=settings.whatsapp_phone_number_id,
+)
+web_adapter = WebAdapter(chat_service=chat_service)
+
+UNLINKED_NUMBER_MSG = (
+    "Please create an account at https://avasecret.org and link your WhatsApp number in Settings."
+)
+
+# key -> [lock, holders]; entries are dropped when the last holder releases
+_user_locks: dict[str, list] = {}
+_sender_locks: dict[str, list] = {}
+
+
+@asynccontextmanager
+async def _keyed_lock(locks: dict[str, list], key: str) -> AsyncIterator[None]:
+    entry = locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del locks[key]
+
+
+@asynccontextmanager
+async def user_lock(user_id: str) -> AsyncIterator[None]:
+    """Serialize pipeline runs for one user within this process."""
+    async with _keyed_lock(_user_locks, user_id):
+        yield
+
+
+@asynccontextmanager
+async def sender_lock(sender_phone: str) -> AsyncIterator[None]:
+    """Serialize inbound WhatsApp messages from one phone number within this process."""
+    async with _keyed_lock(_sender_locks, sender_phone):
+        yield
+
+
+async def reply_to_web_message(user_id: str, text: str, avatar: dict | None) -> None:
+    """
+    Run the LLM for a web message whose user row is already saved, then insert the
+    assistant reply (insert_messages wakes /chat/updates). All exceptions are caught
+    and logged — the user sees no reply, as before.
+    """
+    try:
+        async with user_lock(user_id):
+            msg = NormalizedMessage(
+                user_id=user_id,
+                text=text,
+                platform="web",
+                timestamp=datetime.now(timezone.utc),
+            )
+            reply_text = await web_adapter.receive(msg)
+            await insert_messages([{
+                "user_id": user_id,
+                "avatar_id": avatar["id"] if avatar else None,
+                "channel": "web",
+                "role": "assistant",
+                "content": reply_text,
+            }])
+    except Exception as e:
+        logger.error(f"Web chat reply failed for user {user_id}: {e}")
+
+
+async def _resolve_sender(value: dict, sender_phone: str) -> str | None:
+    """user_id for a sender phone; None (after sending sign-up instructions) if unlinked."""
+    # Normalize phone to E.164: WhatsApp sends "33612345678", we store "+33612345678"
+    normalized_phone = sender_phone if sender_phone.startswith("+") else f"+{sender_phone}"
+
+    # Look up user by phone (service role — no user JWT in webhook context)
+    user = await lookup_user_by_phone(normalized_phone)
+    if user is not None:
+        return user["user_id"]
+
+    # Unlinked number — send registration instructions via direct API call,
+    # at most once per UNLINKED_REPLY_INTERVAL_S so spam can't drive outbound sends
+    if not await allow_unlinked_reply(normalized_phone):
+        logger.info(f"Unlinked sender {normalized_phone} rate-limited — no registration reply")
+        return None
+    phone_number_id = value["metadata"]["phone_number_id"]
+    await send_whatsapp_message(
+        phone_number_id=phone_number_id,
+        to=sender_phone,
+        text=UNLINKED_NUMBER_MSG,
+    )
+    return None
+
+
+def _iter_inbound(body: dict) -> Iterator[tuple[dict, dict]]:
+    """(value, message) for every message in every change of every entry, in payload order."""
+    for entry in body.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            for status in value.get("statuses") or []:
+                # Delivery receipts: nothing to do unless Meta reports a failed send
+                if status.get("status") == "failed":
+                    logger.warning(
+                        f"WhatsApp delivery failed for {status.get('recipient_id')}: {status.get('errors')}"
+                    )
+            for message in value.get("messages") or []:
+                yield value, message
+
+
+async def process_whatsapp_message(body: dict) -> None:
+    """
+    Process a WhatsApp webhook payload via the WhatsAppAdapter pipeline.
+
+    Meta batches several messages (and entries/changes) into one delivery under load;
+    every one is processed. Senders run concurrently — at most WHATSAPP_BATCH_CONCURRENCY
+    messages in flight — while each sender's messages run in payload order. A failing
+    message is logged and does not stop the rest of the batch.
+    """
+    by_sender: dict[str, list[tuple[dict, dict]]] = {}
+    for value, message in _iter_inbound(body):
+        by_sender.setdefault(message.get("from", ""), []).append((value, message))
+    if not by_sender:
+        return
+
+    semaphore = asyncio.Semaphore(settings.whatsapp_batch_concurrency)
+
+    async def run_sender(items: list[tuple[dict, dict]]) -> None:
+        for value, message in items:
+            async with semaphore:
+                try:
+                    await _process_inbound(value, message)
+                except Exception as e:
+                    logger.error(f"WhatsApp message {message.get('id')} failed: {e}")
+
+    await asyncio.gather(*(run_sender(items) for items in by_sender.values()))
+
+
+async def _process_inbound(value: dict, message: dict) -> None:
+    """One inbound message: dedup -> lookup -> LLM -> send -> log both rows."""
+    if message.get("type") != "text":
+        return  # Text only in Phase 6
+
+    # Taken before the first await (claim, lookup): a sender's messages that arrive in
+    # separate, concurrently processed payloads are still handled in arrival order
+    async with sender_lock(message["from"]):
+        await _process_sender_message(value, message)
+
+
+async def _process_sender_message(value: dict, message: dict) -> None:
+    """_process_inbound body, run under the sender's lock."""
+    sender_phone = message["from"]
+    incoming_text = message["text"]["body"]
+
+    # Meta retries slow deliveries — claim the message id (short-lived until replied)
+    message_id = message.get("id")
+    if message_id and not await claim_inbound_message(message_id):
+        logger.info(f"Duplicate WhatsApp delivery {message_id} ignored")
+        return
+
+    try:
+        user_id = await _resolve_sender(value, sender_phone)
+    except Exception:
+        if message_id:
+            await release_inbound_message(message_id)
+        raise
+    if user_id is None:
+        if message_id:
+            await complete_inbound_message(message_id)
+        return
+
+    msg = NormalizedMessage(
+        user_id=user_id,
+        text=incoming_text,
+        platform="whatsapp",
+        timestamp=datetime.now(timezone.utc),
+    )
+
+    async with user_lock(user_id):
+        # receive() -> platform_router -> ChatService -> returns reply text
+        try:
+            reply_text = await whatsapp_adapter.receive(msg)
+        except Exception:
+            # Nothing sent yet — let a redelivery try again
+            if message_id:
+                await release_inbound_message(message_id)
+            raise
+
+        # Send reply (adapter resolves user_id -> phone internally)
+        await whatsapp_adapter.send(user_id, reply_text)
+        if message_id:
+            # Replied — from now on a redelivery or stalled re-run is a duplicate
+            await complete_inbound_message(message_id)
+
+        # Log both messages to Supabase (DB failure must not prevent reply — already sent)
+        avatar = await get_avatar_for_user(user_id)
+        try:
+            await insert_messages([
+                {
+                    "user_id": user_id,
+                    "avatar_id": avatar["id"] if avatar else None,
+                    "channel": "whatsapp",
+                    "role": "user",
+                    "content": incoming_text,
+                },
+                {
+                    "user_id": user_id,
+                    "avatar_id": avatar["id"] if avatar else None,
+                    "channel": "whatsapp",
+                    "role": "assistant",
+                    "content": reply_text,
+                },
+            ])
+        except Exception as e:
+            logger.error(f"Message logging failed for user {user_id}: {e}")
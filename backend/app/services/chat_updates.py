@@ -0,0 +1,85 @@
+"""
+Chat update notifier — wakes GET /chat/updates long-polls when a web message lands.
+
+Producers (messages.store.insert_messages — POST /chat, the chat worker's replies, the
+photo worker's _deliver_web) call publish(user_id) after inserting a row. Waiters block in wait(user_id, timeout).
+
+Fan-out is two-level:
+  - In-process: an asyncio.Event per waiting request, keyed by user_id.
+  - Cross-process: Redis pub/sub on ava:chat_updates. Every API worker runs
+    run_subscriber() (started in main.py lifespan) and wakes its local waiters, so the
+    long-poll can be served by any worker — and the BullMQ worker, which has no
+    waiters of its own, can still wake them.
+
+A lost notification (Redis down) only delays delivery until the long-poll times out
+and the client re-polls — the endpoint re-checks the database on every call.
+"""
+import asyncio
+import logging
+
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "ava:chat_updates"
+
+
+class ChatUpdateNotifier:
+    def __init__(self):
+        self._waiters: dict[str, set[asyncio.Event]] = {}
+
+    def register(self, user_id: str) -> asyncio.Event:
+        """Register a waiter BEFORE checking the database, so no insert can slip between."""
+        event = asyncio.Event()
+        self._waiters.setdefault(user_id, set()).add(event)
+        return event
+
+    def unregister(self, user_id: str, event: asyncio.Event) -> None:
+        waiters = self._waiters.get(user_id)
+        if waiters is not None:
+            waiters.discard(event)
+            if not waiters:
+                del self._waiters[user_id]
+
+    async def wait(self, event: asyncio.Event, timeout: float) -> bool:
+        """True if woken by a notification, False on timeout."""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def notify_local(self, user_id: str) -> None:
+        for event in self._waiters.get(user_id, ()):
+            event.set()
+
+    async def publish(self, user_id: str) -> None:
+        """Wake waiters for user_id in this process and, via Redis, in every other one."""
+        self.notify_local(user_id)
+        try:
+            await get_redis().publish(CHANNEL, user_id)
+        except Exception as e:
+            logger.warning(f"Chat update publish failed for user {user_id} (long-poll will time out): {e}")
+
+    async def run_subscriber(self) -> None:
+        """Relay Redis notifications to local waiters, forever. Reconnects with backoff."""
+        backoff = 1.0
+        while True:
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(CHANNEL)
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    data = message.get("data")
+                    if data:
+                        self.notify_local(data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Chat update subscriber disconnected (retry in {backoff:.0f}s): {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+# Module-level singleton shared by routers, the photo worker and the lifespan subscriber
+chat_updates = ChatUpdateNotifier()
@@ -0,0 +1,197 @@
+"""
+Transactional email outbox — callers enqueue and return, the chat worker sends.
+
+The auth hook and the Stripe webhook handlers used to call Resend inline (one HTTP
+round trip, plus a 3s sleep and a second try on failure) before answering. Now:
+
+  - enqueue_email() inserts one email_outbox row (migration 011) and nudges the
+    worker through a Redis list. dedup_key is unique, so the same logical email
+    (a redelivered webhook, a repeated /auth/send-welcome) is stored once.
+  - run_outbox_loop() (chat worker) claims due rows with claim_email_outbox()
+    — leased, one worker at a time, so replicas never claim the same row — and
+    sends up to EMAIL_BATCH_SIZE per call through Resend's batch API.
+  - A failed send is retried with exponential backoff (EMAIL_RETRY_BASE_S doubling,
+    capped at EMAIL_RETRY_MAX_S) until EMAIL_MAX_ATTEMPTS; a row Resend rejects as
+    invalid is marked 'failed' straight away. A worker that dies mid-send leaves a
+    'sending' row whose lease expires; the next claim counts that as an attempt and
+    makes the row due again.
+
+The first claim pins a batch_id on its rows, and the batch call carries it as
+Resend's idempotency key. A retry resends exactly that batch under the same key,
+so a send Resend accepted but never answered is not delivered twice — as long as
+the retry lands within the 24 hours Resend keeps the key, which the backoff
+schedule does. If the outbox table is unreachable, enqueue_email() sends the email
+directly in a background task — the caller still never waits on Resend.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import resend
+
+from app.config import settings
+from app.database import supabase_admin
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+WAKE_KEY = "ava:email:outbox_wake"
+
+# Direct sends started when the outbox is unreachable (strong refs until done)
+_fallback_tasks: set[asyncio.Task] = set()
+
+
+def _params(to: str, subject: str, html: str) -> dict:
+    return {"from": settings.resend_from_address, "to": [to], "subject": subject, "html": html}
+
+
+def _sync_send(params: dict) -> dict:
+    """Single synchronous Resend call — runs in a thread via asyncio.to_thread."""
+    resend.api_key = settings.resend_api_key
+    return resend.Emails.send(params)
+
+
+async def _send_direct(to: str, subject: str, html: str) -> None:
+    try:
+        await asyncio.to_thread(_sync_send, _params(to, subject, html))
+        logger.info(f"Email sent directly to {to} (outbox unavailable): {subject}")
+    except Exception as e:
+        logger.error(f"Direct email send failed for {to} ({subject}): {e}")
+
+
+async def enqueue_email(to: str, subject: str, html: str, dedup_key: str | None = None) -> bool:
+    """
+    Queue an email for the outbox worker. Returns without waiting for Resend.
+    dedup_key identifies the logical email (e.g. "welcome:<user_id>"); None means
+    never deduplicate. Returns False only if the email could not be queued or sent.
+    Never raises.
+    """
+    if not settings.resend_api_key:
+        logger.warning(f"RESEND_API_KEY not configured — email not sent to {to}")
+        return False
+
+    row = {
+        "dedup_key": dedup_key or f"once:{uuid.uuid4()}",
+        "to_address": to,
+        "subject": subject,
+        "html": html,
+    }
+    try:
+        inserted = await asyncio.to_thread(
+            supabase_admin.from_("email_outbox")
+            .upsert(row, on_conflict="dedup_key", ignore_duplicates=True)
+            .execute
+        )
+    except Exception as e:
+        logger.error(f"Email outbox unavailable, sending to {to} in the background: {e}")
+        task = asyncio.create_task(_send_direct(to, subject, html))
+        _fallback_tasks.add(task)
+        task.add_done_callback(_fallback_tasks.discard)
+        return True
+
+    if not inserted.data:
+        logger.info(f"Email {row['dedup_key']} already queued — not sent again")
+        return True
+    try:
+        await get_redis().lpush(WAKE_KEY, "1")
+    except Exception as e:
+        logger.warning(f"Email outbox wake-up failed (worker will poll): {e}")
+    return True
+
+
+def retry_delay_s(attempts: int) -> int:
+    """Backoff before the next try after `attempts` failed sends."""
+    return min(settings.email_retry_base_s * 2 ** (attempts - 1), settings.email_retry_max_s)
+
+
+def _claim(limit: int) -> list[dict]:
+    result = supabase_admin.rpc("claim_email_outbox", {
+        "p_limit": limit,
+        "p_lease_s": settings.email_lease_s,
+        "p_max_attempts": settings.email_max_attempts,
+    }).execute()
+    # Stable order: a retried batch must repeat the payload sent under its key
+    return sorted(result.data or [], key=lambda row: row["id"])
+
+
+def _send_batch(rows: list[dict]) -> dict:
+    """One Resend batch call for the claimed rows (all share one batch_id). Synchronous."""
+    resend.api_key = settings.resend_api_key
+    return resend.Batch.send(
+        [_params(r["to_address"], r["subject"], r["html"]) for r in rows],
+        {"idempotency_key": f"ava-outbox-{rows[0]['batch_id']}", "batch_validation": "permissive"},
+    )
+
+
+def _mark_sent(ids: list[str]) -> None:
+    supabase_admin.from_("email_outbox").update({
+        "status": "sent",
+        "sent_at": datetime.now(timezone.utc).isoformat(),
+        "leased_until": None,
+        "last_error": None,
+    }).in_("id", ids).execute()
+
+
+def _mark_failed(rows: list[dict], error: str, permanent: bool = False) -> None:
+    """Schedule a retry for each row, or give up at EMAIL_MAX_ATTEMPTS / on a permanent error."""
+    now = datetime.now(timezone.utc)
+    by_attempts: dict[int, list[str]] = {}
+    for row in rows:
+        by_attempts.setdefault(row["attempts"] + 1, []).append(row["id"])
+    for attempts, ids in by_attempts.items():
+        give_up = permanent or attempts >= settings.email_max_attempts
+        supabase_admin.from_("email_outbox").update({
+            "status": "failed" if give_up else "pending",
+            "attempts": attempts,
+            "next_attempt_at": (now + timedelta(seconds=retry_delay_s(attempts))).isoformat(),
+            "leased_until": None,
+            "last_error": error[:500],
+        }).in_("id", ids).execute()
+        if give_up:
+            logger.error(f"Email outbox: giving up on {len(ids)} email(s) after {attempts} attempt(s): {error}")
+
+
+def flush_outbox_once() -> int:
+    """
+    Claim one batch of due emails, send it and record the outcome. Returns the number
+    of rows claimed (0 = nothing due). Synchronous — run via asyncio.to_thread.
+    """
+    rows = _claim(settings.email_batch_size)
+    if not rows:
+        return 0
+    try:
+        response = _send_batch(rows)
+    except Exception as e:
+        logger.warning(f"Email outbox: batch of {len(rows)} failed, retrying later: {e}")
+        _mark_failed(rows, str(e))
+        return len(rows)
+
+    # Permissive mode: invalid emails are reported by index, the rest are sent
+    errors = {err["index"]: err["message"] for err in (response.get("errors") or [])}
+    sent = [row for i, row in enumerate(rows) if i not in errors]
+    if sent:
+        _mark_sent([row["id"] for row in sent])
+    for index, message in errors.items():
+        _mark_failed([rows[index]], f"rejected by Resend: {message}", permanent=True)
+    logger.info(f"Email outbox: sent {len(sent)}, rejected {len(errors)}")
+    return len(rows)
+
+
+async def run_outbox_loop() -> None:
+    """Drain due emails, then wait for a wake-up (or EMAIL_OUTBOX_POLL_S) — forever."""
+    poll = settings.email_outbox_poll_s
+    while True:
+        try:
+            while await asyncio.to_thread(flush_outbox_once) == settings.email_batch_size:
+                pass  # a full batch — more may be due
+        except Exception as e:
+            logger.error(f"Email outbox flush failed: {e}")
+        try:
+            woke = await get_redis().blpop(WAKE_KEY, timeout=poll)
+            if woke:
+                # One flush serves every enqueue so far — drop the other wake-ups
+                await get_redis().delete(WAKE_KEY)
+        except Exception as e:
+            logger.warning(f"Email outbox wake-up wait failed (polling): {e}")
+            await asyncio.sleep(poll)
@@ -1,56 +1,28 @@
 """
-Resend email service — async wrapper over the synchronous Resend Python SDK.
+Resend email service — transactional templates, sent through the email outbox.
 
-Uses asyncio.to_thread() (established codebase pattern from Phase 4) because
-resend.Emails.send() is synchronous and would block the FastAPI event loop.
+send_email() queues the email (app/services/email/outbox.py) and returns; the chat
+worker sends it through Resend's batch API and retries failures with backoff.
+Auth and billing handlers therefore never wait on Resend (CONTEXT.md decision:
+email must not block auth/payment).
 
-Email failures never propagate to callers — one automatic retry after 3s,
-then log and return False (CONTEXT.md decision: email must not block auth/payment).
+Each helper takes an optional dedup_key naming the logical email, so a repeated
+trigger (redelivered webhook, repeated /auth/send-welcome) sends it once.
 """
-import asyncio
 import logging
 
-import resend
-
 from app.config import settings
+from app.services.email.outbox import enqueue_email
 
 logger = logging.getLogger(__name__)
 
 
-def _sync_send(params: dict) -> dict:
-    """Synchronous Resend call — runs in a thread via asyncio.to_thread."""
-    resend.api_key = settings.resend_api_key
-    return resend.Emails.send(params)
-
-
-async def send_email(to: str, subject: str, html: str, retry: bool = True) -> bool:
+async def send_email(to: str, subject: str, html: str, dedup_key: str | None = None) -> bool:
     """
-    Send a transactional email via Resend.
-
-    Returns True on success. On failure: retries once after 3s (CONTEXT.md: exact
-    retry delay is Claude's discretion), then logs and returns False.
+    Queue a transactional email. Returns True once it is queued (or already was).
     Never raises — callers must not block on email outcome.
     """
-    if not settings.resend_api_key:
-        logger.warning("RESEND_API_KEY not configured — email not sent to %s", to)
-        return False
-
-    params = {
-        "from": settings.resend_from_address,
-        "to": [to],
-        "subject": subject,
-        "html": html,
-    }
-    try:
-        await asyncio.to_thread(_sync_send, params)
-        logger.info("Email sent to %s: %s", to, subject)
-        return True
-    except Exception as exc:
-        logger.error("Email send failed for %s (%s): %s", to, subject, exc)
-        if retry:
-            await asyncio.sleep(3)
-            return await send_email(to, subject, html, retry=False)
-        return False
+    return await enqueue_email(to, subject, html, dedup_key=dedup_key)
 
 
 # ---------------------------------------------------------------------------
@@ -101,7 +73,7 @@ def _cta_button(label: str, href: str) -> str:
     )
 
 
-async def send_welcome_email(to: str, first_name: str | None = None) -> bool:
+async def send_welcome_email(to: str, first_name: str | None = None, dedup_key: str | None = None) -> bool:
     """Welcome email — triggered on new account creation (email/password AND Google)."""
     name = first_name or "there"
     body = f"""
@@ -114,10 +86,10 @@ async def send_welcome_email(to: str, first_name: str | None = None) -> bool:
       </p>
       {_cta_button("Start chatting", f"{settings.frontend_url}/chat")}
     """
-    return await send_email(to, "Welcome to Ava", _base_html("Welcome to Ava", body))
+    return await send_email(to, "Welcome to Ava", _base_html("Welcome to Ava", body), dedup_key)
 
 
-async def send_password_reset_email(to: str, reset_url: str) -> bool:
+async def send_password_reset_email(to: str, reset_url: str, dedup_key: str | None = None) -> bool:
     """Password reset email — link is valid for 5 minutes (Supabase enforced)."""
     body = f"""
       <h2 style="margin:0 0 8px;font-size:20px;color:#111827;">Reset your password</h2>
@@ -130,13 +102,14 @@ async def send_password_reset_email(to: str, reset_url: str) -> bool:
       </p>
       {_cta_button("Reset password", reset_url)}
     """
-    return await send_email(to, "Reset your Ava password", _base_html("Reset password", body))
+    return await send_email(to, "Reset your Ava password", _base_html("Reset password", body), dedup_key)
 
 
 async def send_receipt_email(
     to: str,
     amount_usd: float,
     next_billing_date: str,
+    dedup_key: str | None = None,
 ) -> bool:
     """Subscription receipt — sent on checkout.session.completed (EMAI-03)."""
     body = f"""
@@ -156,10 +129,10 @@ async def send_receipt_email(
       </table>
       {_cta_button("Manage billing", f"{settings.frontend_url}/settings")}
     """
-    return await send_email(to, "Your Ava subscription is active", _base_html("Receipt", body))
+    return await send_email(to, "Your Ava subscription is active", _base_html("Receipt", body), dedup_key)
 
 
-async def send_cancellation_email(to: str, access_until: str) -> bool:
+async def send_cancellation_email(to: str, access_until: str, dedup_key: str | None = None) -> bool:
     """Cancellation confirmation — sent on customer.subscription.deleted (EMAI-04)."""
     body = f"""
       <h2 style="margin:0 0 8px;font-size:20px;color:#111827;">Your subscription has been cancelled</h2>
@@ -176,4 +149,5 @@ async def send_cancellation_email(to: str, access_until: str) -> bool:
         to,
         "Your Ava subscription has been cancelled",
         _base_html("Subscription cancelled", body),
+        dedup_key,
     )
@@ -0,0 +1,226 @@
+"""Async Google Calendar v3 client for the calendar skill.
+
+Replaces googleapiclient.discovery.build() per request (discovery document parsed
+every time, every call run through asyncio.to_thread) with plain REST calls over
+one shared httpx pool.
+
+  - Tokens are cached per user in process (GOOGLE_TOKEN_CACHE_SIZE users), so a
+    calendar request does not re-read google_calendar_tokens from Supabase.
+  - A token within GOOGLE_TOKEN_REFRESH_MARGIN_S of expiry is refreshed in the
+    background while the current one is still used; only a token that is about
+    to expire (or already has) makes the caller wait. Concurrent refreshes for one
+    user share a single token request.
+  - A 401 from the Calendar API (token revoked or replaced by a reconnect in
+    another process) drops the cached token and retries once with a fresh one.
+
+A refresh rejected with invalid_grant raises google.auth.exceptions.RefreshError,
+as google-auth did — unless the stored grant changed meanwhile (a reconnect handled
+by another process). The skill then deletes the stored tokens and asks to reconnect.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from google.auth.exceptions import RefreshError
+
+from app.config import settings
+from app.services.cache.lru import TTLCache
+from app.services.google_auth.token_store import get_calendar_tokens, save_calendar_tokens
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_API_BASE = "https://www.googleapis.com/calendar/v3"
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+# Below this much remaining lifetime the caller waits for a refresh
+MIN_TOKEN_LIFETIME_S = 60
+
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+
+@dataclass
+class UserToken:
+    access_token: str
+    refresh_token: str
+    expiry: datetime | None
+    scopes: list[str]
+
+    def remaining_s(self) -> float:
+        """Seconds until expiry (inf if Google did not say)."""
+        if self.expiry is None:
+            return float("inf")
+        return (self.expiry - datetime.now(timezone.utc)).total_seconds()
+
+
+def _parse_expiry(val) -> datetime | None:
+    if not val:
+        return None
+    dt = val if isinstance(val, datetime) else datetime.fromisoformat(str(val).replace("Z", "+00:00"))
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+class CalendarClient:
+    def __init__(self, transport: httpx.AsyncBaseTransport | None = None):
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+        self._tokens = TTLCache(maxsize=settings.google_token_cache_size, ttl_s=settings.google_token_cache_ttl_s)
+        # user_id -> in-flight refresh; callers for the same user await the same task
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # httpx clients are bound to the loop that opened their connections
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                http2=_HTTP2 and self._transport is None,
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                transport=self._transport,
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def invalidate(self, user_id: str) -> None:
+        """Forget a user's cached token (disconnect, revocation, reconnect)."""
+        self._tokens.delete(user_id)
+
+    async def _load(self, user_id: str) -> UserToken | None:
+        tokens = await get_calendar_tokens(user_id)
+        if not tokens:
+            return None
+        return UserToken(
+            access_token=tokens["access_token"],
+            refresh_token=tokens["refresh_token"],
+            expiry=_parse_expiry(tokens.get("token_expiry")),
+            scopes=tokens.get("scopes") or [],
+        )
+
+    async def _refresh(self, user_id: str, token: UserToken) -> UserToken:
+        """Exchange the refresh token, persist and cache the result."""
+        response = await self._get_client().post(TOKEN_URI, data={
+            "grant_type": "refresh_token",
+            "refresh_token": token.refresh_token,
+            "client_id": settings.google_client_id,
+            "client_secret": settings.google_client_secret,
+        })
+        if response.status_code == 400 and response.json().get("error") == "invalid_grant":
+            self.invalidate(user_id)
+            # A reconnect in another process may have stored a new grant since we cached
+            stored = await self._load(user_id)
+            if stored is not None and stored.refresh_token != token.refresh_token:
+                self._tokens.set(user_id, stored)
+                return stored
+            raise RefreshError(f"Google refresh token rejected for {user_id}: invalid_grant")
+        response.raise_for_status()
+        body = response.json()
+        fresh = UserToken(
+            access_token=body["access_token"],
+            # Google only returns a new refresh token when it rotates it
+            refresh_token=body.get("refresh_token") or token.refresh_token,
+            expiry=datetime.now(timezone.utc) + timedelta(seconds=int(body.get("expires_in", 3600))),
+            scopes=body["scope"].split() if body.get("scope") else token.scopes,
+        )
+        await save_calendar_tokens(
+            user_id=user_id,
+            access_token=fresh.access_token,
+            refresh_token=fresh.refresh_token,
+            token_expiry=fresh.expiry,
+            scopes=fresh.scopes,
+        )
+        self._tokens.set(user_id, fresh)
+        return fresh
+
+    def _refresh_task(self, user_id: str, token: UserToken) -> asyncio.Task:
+        task = self._refreshing.get(user_id)
+        if task is None:
+            task = self._refreshing[user_id] = asyncio.create_task(self._refresh(user_id, token))
+            task.add_done_callback(lambda _: self._refreshing.pop(user_id, None))
+        return task
+
+    def _refresh_in_background(self, user_id: str, token: UserToken) -> None:
+        def _log_failure(task: asyncio.Task) -> None:
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"Background Google token refresh failed for {user_id}: {task.exception()}")
+
+        if user_id not in self._refreshing:
+            self._refresh_task(user_id, token).add_done_callback(_log_failure)
+
+    async def get_token(self, user_id: str) -> UserToken | None:
+        """
+        A usable access token for user_id, or None if Calendar is not connected.
+        Raises RefreshError if Google rejected the refresh token.
+        """
+        token = self._tokens.get(user_id)
+        if token is None:
+            token = await self._load(user_id)
+            if token is None:
+                return None
+            self._tokens.set(user_id, token)
+
+        remaining = token.remaining_s()
+        if remaining < MIN_TOKEN_LIFETIME_S:
+            return await self._refresh_task(user_id, token)
+        if remaining < settings.google_token_refresh_margin_s:
+            self._refresh_in_background(user_id, token)
+        return token
+
+    async def _request(self, user_id: str, method: str, path: str, **kwargs) -> dict:
+        """Calendar API call with the user's token; one retry with a fresh token on 401."""
+        client = self._get_client()
+        rejected: str | None = None
+        for attempt in range(2):
+            token = await self.get_token(user_id)
+            if token is None:
+                raise RefreshError(f"Google Calendar tokens for {user_id} are gone")
+            if token.access_token == rejected:
+                # The stored token is the one Google just refused — refresh it now
+                token = await self._refresh_task(user_id, token)
+            response = await client.request(
+                method, f"{CALENDAR_API_BASE}{path}",
+                headers={"Authorization": f"Bearer {token.access_token}"},
+                **kwargs,
+            )
+            if response.status_code == 401 and attempt == 0:
+                # Expired early, or replaced by a reconnect handled in another process
+                rejected = token.access_token
+                self.invalidate(user_id)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    async def list_events(
+        self,
+        user_id: str,
+        time_min: datetime,
+        time_max: datetime,
+        max_results: int | None = None,
+    ) -> list[dict]:
+        """Single (expanded) events on the primary calendar in [time_min, time_max), by start time."""
+        params = {
+            "timeMin": time_min.isoformat(),
+            "timeMax": time_max.isoformat(),
+            "singleEvents": "true",
+            "orderBy": "startTime",
+        }
+        if max_results is not None:
+            params["maxResults"] = max_results
+        result = await self._request(user_id, "GET", "/calendars/primary/events", params=params)
+        return result.get("items", [])
+
+    async def insert_event(self, user_id: str, body: dict) -> dict:
+        """Create an event on the primary calendar."""
+        return await self._request(user_id, "POST", "/calendars/primary/events", json=body)
+
+
+calendar_client = CalendarClient()
@@ -13,6 +13,7 @@ class GeneratedImage:
     model: str          # e.g. "comfyui-qwen" or "black-forest-labs/flux-1.1-pro"
     prompt: str         # Full prompt used (for audit log)
     image_bytes: bytes | None = None  # Pre-downloaded bytes (set by ComfyUIProvider)
+    image_path: str | None = None     # Streamed to disk instead (generate(output_path=...))
 
 
 @runtime_checkable
@@ -21,11 +22,14 @@ class ImageProvider(Protocol):
     Structural interface for image generation providers (ARCH-03).
     Swapping providers = swap config + new concrete class. No inheritance needed.
     reference_image_url is optional — providers that don't support i2i ignore it.
+    output_path is optional — providers that can stream write the image there and set
+    GeneratedImage.image_path; others ignore it and return image_bytes / url as before.
     """
     async def generate(
         self,
         prompt: str,
         aspect_ratio: str = "2:3",
         reference_image_url: str | None = None,
+        output_path: str | None = None,
     ) -> GeneratedImage:
         ...
@@ -32,6 +32,7 @@ def _dbg(msg: str) -> None:
 WORKFLOWS_DIR = Path(__file__).parent / "workflows"
 POLL_INTERVAL = 4.0   # seconds between status checks
 POLL_TIMEOUT = 300    # seconds before giving up
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # bytes per chunk when streaming output to disk
 
 
 def _load_workflow(name: str) -> dict:
@@ -57,7 +58,15 @@ class ComfyUIProvider:
         prompt: str,
         aspect_ratio: str = "2:3",
         reference_image_url: str | None = None,
+        output_path: str | None = None,
     ) -> GeneratedImage:
+        """
+        Run a workflow and return the output image.
+
+        With output_path the /api/view download is streamed to that file in chunks and
+        GeneratedImage.image_path is set (image_bytes stays None) — the worker uses this
+        so a full-resolution frame is never held in memory just to be written out again.
+        """
         _dbg(f"generate() ENTERED. base_url={settings.comfyui_base_url!r} api_key_set={bool(settings.comfyui_api_key)}")
         if not settings.comfyui_api_key:
             raise RuntimeError("COMFYUI_API_KEY is not set in .env")
@@ -81,15 +90,24 @@ class ComfyUIProvider:
             _dbg(f"_submit() returned prompt_id={prompt_id!r}")
 
             _dbg(f"calling _poll_and_download() for prompt_id={prompt_id!r}")
-            image_bytes = await self._poll_and_download(client, prompt_id, output_node)
-            _dbg(f"_poll_and_download() returned {len(image_bytes)} bytes")
+            output = await self._poll_and_download(
+                client, prompt_id, output_node,
+                dest=Path(output_path) if output_path else None,
+            )
 
         _dbg("generate() returning GeneratedImage")
+        if output_path:
+            return GeneratedImage(
+                url="",
+                model="comfyui-qwen",
+                prompt=prompt,
+                image_path=str(output),
+            )
         return GeneratedImage(
             url="",
             model="comfyui-qwen",
             prompt=prompt,
-            image_bytes=image_bytes,
+            image_bytes=output,
         )
 
     # ------------------------------------------------------------------
@@ -159,8 +177,12 @@ class ComfyUIProvider:
         return prompt_id
 
     async def _poll_and_download(
-        self, client: httpx.AsyncClient, prompt_id: str, output_node: str
-    ) -> bytes:
+        self,
+        client: httpx.AsyncClient,
+        prompt_id: str,
+        output_node: str,
+        dest: Path | None = None,
+    ) -> bytes | Path:
         """Poll /api/job/{id}/status until completed, then fetch history and download."""
         status_url = f"{settings.comfyui_base_url}/api/job/{prompt_id}/status"
         _dbg(f"_poll_and_download() starting. prompt_id={prompt_id!r} poll_url={status_url!r} interval={POLL_INTERVAL}s timeout={POLL_TIMEOUT}s")
@@ -190,7 +212,7 @@ class ComfyUIProvider:
             if status in ("completed", "success"):
                 _dbg(f"[POLL iter={iteration}] status={status!r} -> fetching history")
                 return await self._fetch_history_and_download(
-                    client, prompt_id, output_node
+                    client, prompt_id, output_node, dest=dest
                 )
             # ComfyUI Cloud API failure statuses: "error" (API docs), "failed",
             # "cancelled", "canceled". Without this check, a failed job would poll
@@ -210,7 +232,8 @@ class ComfyUIProvider:
         prompt_id: str,
         output_node: str,
         max_retries: int = 3,
-    ) -> bytes:
+        dest: Path | None = None,
+    ) -> bytes | Path:
         """
         GET /api/history_v2/{prompt_id} to retrieve output node filenames.
         ComfyUI Cloud returns: { "{prompt_id}": { "outputs": {...}, "status": {...} } }
@@ -238,7 +261,7 @@ class ComfyUIProvider:
 
             if outputs:
                 _dbg(f"[HIST attempt={attempt}] outputs non-empty -> calling _download_output()")
-                return await self._download_output(client, outputs, output_node)
+                return await self._download_output(client, outputs, output_node, dest=dest)
             logger.warning(
                 f"ComfyUI history_v2 outputs empty (attempt {attempt}/{max_retries})"
                 f" for job {prompt_id} — retrying. Raw keys: {list(history_data.keys())}"
@@ -253,9 +276,13 @@ class ComfyUIProvider:
         )
 
     async def _download_output(
-        self, client: httpx.AsyncClient, outputs: dict, output_node: str
-    ) -> bytes:
-        """Extract filename from outputs dict and download the image."""
+        self,
+        client: httpx.AsyncClient,
+        outputs: dict,
+        output_node: str,
+        dest: Path | None = None,
+    ) -> bytes | Path:
+        """Extract filename from outputs dict and download the image (to `dest` if given)."""
         _dbg(f"_download_output() ENTERED. output_node={output_node!r} outputs_keys={list(outputs.keys())}")
         node_out = outputs.get(output_node, {})
         _dbg(f"_download_output() node_out keys={list(node_out.keys()) if isinstance(node_out, dict) else type(node_out)}")
@@ -279,9 +306,13 @@ class ComfyUIProvider:
         view_url = f"{settings.comfyui_base_url}/api/view"
         _dbg(f"_download_output() GET {view_url} filename={filename!r} subfolder={subfolder!r}")
 
+        params = {"filename": filename, "subfolder": subfolder, "type": "output"}
+        if dest is not None:
+            return await self._stream_output(client, view_url, params, dest)
+
         view_resp = await client.get(
             view_url,
-            params={"filename": filename, "subfolder": subfolder, "type": "output"},
+            params=params,
             headers=self._headers(),
             follow_redirects=True,
         )
@@ -292,3 +323,27 @@ class ComfyUIProvider:
         logger.info(f"Downloaded {len(view_resp.content)} bytes from ComfyUI output")
         _dbg(f"_download_output() returning {len(view_resp.content)} bytes")
         return view_resp.content
+
+    async def _stream_output(
+        self, client: httpx.AsyncClient, view_url: str, params: dict, dest: Path
+    ) -> Path:
+        """Stream GET /api/view to `dest` chunk by chunk — peak memory is one chunk, not one image."""
+        written = 0
+        async with client.stream(
+            "GET",
+            view_url,
+            params=params,
+            headers=self._headers(),
+            follow_redirects=True,
+        ) as view_resp:
+            if view_resp.is_error:
+                await view_resp.aread()
+                logger.error(f"ComfyUI view error {view_resp.status_code}: {view_resp.text}")
+            view_resp.raise_for_status()
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            with open(dest, "wb") as f:
+                async for chunk in view_resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+        logger.info(f"Streamed {written} bytes from ComfyUI output to {dest}")
+        return dest
@@ -7,6 +7,7 @@ This satisfies the audit trail requirement; full CA-signed C2PA is a post-beta h
 """
 import io
 import logging
+from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 
 logger = logging.getLogger(__name__)
@@ -14,21 +15,14 @@ logger = logging.getLogger(__name__)
 WATERMARK_TEXT = "© Ava — AI Generated"
 
 
-def apply_watermark(image_bytes: bytes, text: str = WATERMARK_TEXT) -> bytes:
+def _watermark_image(img: Image.Image, text: str) -> Image.Image:
     """
-    Apply semi-transparent text watermark at bottom-right.
-    Returns JPEG bytes with watermark applied.
-
-    Args:
-        image_bytes: Raw image bytes (JPEG or PNG from Replicate).
-        text: Watermark text to overlay.
+    Draw the watermark onto an RGB copy of `img` and return it.
 
-    Returns:
-        JPEG bytes with watermark.
+    Only the text's bounding box is alpha-composited — a full-frame RGBA overlay plus
+    a full-frame composite would add two more frame-sized buffers per job.
     """
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
-    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
+    img = img.convert("RGB")
 
     # Scale font size with image width; minimum 14px for readability
     font_size = max(img.width // 40, 14)
@@ -41,7 +35,7 @@ def apply_watermark(image_bytes: bytes, text: str = WATERMARK_TEXT) -> bytes:
     except OSError:
         font = ImageFont.load_default()
 
-    bbox = draw.textbbox((0, 0), text, font=font)
+    bbox = ImageDraw.Draw(img).textbbox((0, 0), text, font=font)
     text_w = bbox[2] - bbox[0]
     text_h = bbox[3] - bbox[1]
     margin = font_size
@@ -49,12 +43,51 @@ def apply_watermark(image_bytes: bytes, text: str = WATERMARK_TEXT) -> bytes:
     x = img.width - text_w - margin
     y = img.height - text_h - margin
 
+    # Composite just the region the text covers (bbox may start right of/below the origin)
+    box = (
+        max(x, 0),
+        max(y, 0),
+        min(x + bbox[2] + 1, img.width),
+        min(y + bbox[3] + 1, img.height),
+    )
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return img  # text falls entirely outside a tiny image — nothing visible to draw
+    region = img.crop(box).convert("RGBA")
+    overlay = Image.new("RGBA", region.size, (0, 0, 0, 0))
     # White text, 180/255 opacity (semi-transparent, clearly visible)
-    draw.text((x, y), text, font=font, fill=(255, 255, 255, 180))
+    ImageDraw.Draw(overlay).text((x - box[0], y - box[1]), text, font=font, fill=(255, 255, 255, 180))
+    img.paste(Image.alpha_composite(region, overlay).convert("RGB"), box[:2])
+    return img
 
-    watermarked = Image.alpha_composite(img, overlay).convert("RGB")
+
+def apply_watermark(image_bytes: bytes, text: str = WATERMARK_TEXT) -> bytes:
+    """
+    Apply semi-transparent text watermark at bottom-right.
+    Returns JPEG bytes with watermark applied.
+
+    Args:
+        image_bytes: Raw image bytes (JPEG or PNG from Replicate).
+        text: Watermark text to overlay.
+
+    Returns:
+        JPEG bytes with watermark.
+    """
+    watermarked = _watermark_image(Image.open(io.BytesIO(image_bytes)), text)
 
     output = io.BytesIO()
     watermarked.save(output, format="JPEG", quality=90)
-    logger.info(f"Watermark applied to image ({img.width}x{img.height})")
+    logger.info(f"Watermark applied to image ({watermarked.width}x{watermarked.height})")
     return output.getvalue()
+
+
+def apply_watermark_file(src_path: str | Path, dst_path: str | Path, text: str = WATERMARK_TEXT) -> None:
+    """
+    File-to-file variant of apply_watermark() used by the photo worker.
+
+    Pillow decodes straight from the file and encodes straight to the destination,
+    so neither the encoded input nor the encoded JPEG output is held as bytes.
+    """
+    with Image.open(src_path) as src:
+        watermarked = _watermark_image(src, text)
+    watermarked.save(dst_path, format="JPEG", quality=90)
+    logger.info(f"Watermark applied to image ({watermarked.width}x{watermarked.height})")
@@ -0,0 +1,21 @@
+"""
+BullMQ processor for the 'stripe_events' queue (see billing_queue.py for the job shape).
+
+Thin dispatcher over billing.webhook_events.process_stripe_event — the same function
+the webhook runs in-process when the queue is unavailable. Exceptions propagate so
+BullMQ retries the job with backoff.
+"""
+import logging
+
+from app.services.billing.webhook_events import process_stripe_event
+
+logger = logging.getLogger(__name__)
+
+
+async def process_billing_job(job, token: str | None = None) -> None:
+    if job.name != "stripe_event":
+        raise ValueError(f"Unknown billing job name: {job.name!r}")
+    event = job.data["event"]
+    attempt = job.attemptsMade + 1
+    logger.info(f"Processing Stripe event {event['id']} ({event['type']}), attempt {attempt}")
+    await process_stripe_event(event, attempt=attempt)
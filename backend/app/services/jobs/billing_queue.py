@@ -0,0 +1,54 @@
+"""
+BullMQ billing queue (enqueue side only) — 'stripe_events', consumed by chat_worker_main.py.
+
+Jobs:
+  stripe_event {event}  verified Stripe event payload, already recorded in stripe_events
+
+The job id is the Stripe event id, so a redelivery that arrives while the first
+attempt is still queued or retrying is not added twice. A job that used up its
+STRIPE_EVENT_MAX_ATTEMPTS stays in BullMQ's failed set under that id, where add()
+would silently keep it — a later redelivery removes it first and queues a new one. Handlers are idempotent
+(see billing/webhook_events.py), so failed jobs are retried with exponential backoff.
+enqueue_stripe_event returns False instead of raising when Redis is unreachable —
+the webhook then processes the event in-process.
+"""
+import logging
+
+from bullmq import Queue
+
+from app.config import settings
+from app.services.jobs.queue import bullmq_connection
+
+logger = logging.getLogger(__name__)
+
+BILLING_QUEUE = "stripe_events"
+
+_billing_queue: Queue | None = None
+
+
+def get_billing_queue() -> Queue:
+    """Return module-level Queue singleton. Lazy init on first call."""
+    global _billing_queue
+    if _billing_queue is None:
+        _billing_queue = Queue(BILLING_QUEUE, {"connection": bullmq_connection()})
+    return _billing_queue
+
+
+async def enqueue_stripe_event(event: dict) -> bool:
+    """Queue a recorded Stripe event for the worker. False if the caller must process it."""
+    try:
+        queue = get_billing_queue()
+        if await queue.getJobState(event["id"]) == "failed":
+            await queue.remove(event["id"])
+            logger.info(f"Stripe event {event['id']} redelivered after exhausting its retries — requeued")
+        await queue.add("stripe_event", {"event": event}, {
+            "jobId": event["id"],
+            "attempts": settings.stripe_event_max_attempts,
+            "backoff": {"type": "exponential", "delay": 5000},
+            "removeOnComplete": 1000,
+            "removeOnFail": 5000,
+        })
+        return True
+    except Exception as e:
+        logger.error(f"Billing queue unavailable, processing Stripe event {event['id']} in-process: {e}")
+        return False
@@ -0,0 +1,29 @@
+"""
+BullMQ processor for the 'chat_messages' queue (see chat_queue.py for job shapes).
+
+Thin dispatcher over chat_pipeline — the same functions the routers run in-process
+when the queue is unavailable. Pipeline functions catch and log their own errors,
+so a job only fails on an unknown name or malformed data.
+"""
+import logging
+
+from app.services import chat_pipeline
+from app.services.session.store import get_session_store
+
+logger = logging.getLogger(__name__)
+
+
+async def process_chat_job(job, token: str | None = None) -> None:
+    data = job.data
+    if job.name == "web_reply":
+        await chat_pipeline.reply_to_web_message(data["user_id"], data["text"], data.get("avatar"))
+    elif job.name == "whatsapp_inbound":
+        try:
+            await chat_pipeline.process_whatsapp_message(data["body"])
+        except Exception as e:
+            # Same policy as the webhook had inline: log, never retry (Meta already got 200)
+            logger.error(f"WhatsApp processing error (job {job.id}): {e}")
+    elif job.name == "refresh_avatar":
+        await get_session_store().clear_avatar_cache(data["user_id"])
+    else:
+        raise ValueError(f"Unknown chat job name: {job.name!r}")
@@ -0,0 +1,68 @@
+"""
+BullMQ chat queue (enqueue side only) — 'chat_messages', consumed by chat_worker_main.py.
+
+Jobs:
+  web_reply        {user_id, text, avatar}  user row already inserted by POST /chat
+  whatsapp_inbound {body}                   raw Meta webhook payload
+  refresh_avatar   {user_id}                drop the chat worker's cached avatar/persona
+
+HTTP handlers enqueue and return immediately; the job survives an API restart and,
+if the chat worker dies mid-job, BullMQ's stalled-job check hands it to the next
+worker. Every enqueue_* returns False instead of raising when Redis is unreachable —
+callers then run the pipeline in-process (chat_pipeline), as before this queue existed.
+"""
+import logging
+
+from bullmq import Queue
+
+from app.config import settings
+from app.services.jobs.queue import bullmq_connection
+
+logger = logging.getLogger(__name__)
+
+CHAT_QUEUE = "chat_messages"
+
+# No automatic retries: a failed run may already have appended to the session or
+# sent a WhatsApp reply, so re-running it could answer twice. Stalled-job recovery
+# still covers a worker that died mid-job.
+_JOB_OPTS = {
+    "attempts": 1,
+    "removeOnComplete": 1000,
+    "removeOnFail": 1000,
+}
+
+_chat_queue: Queue | None = None
+
+
+def get_chat_queue() -> Queue:
+    """Return module-level Queue singleton. Lazy init on first call."""
+    global _chat_queue
+    if _chat_queue is None:
+        _chat_queue = Queue(CHAT_QUEUE, {"connection": bullmq_connection()})
+    return _chat_queue
+
+
+async def _add(name: str, data: dict) -> bool:
+    if not settings.chat_queue_enabled:
+        return False
+    try:
+        await get_chat_queue().add(name, data, _JOB_OPTS)
+        return True
+    except Exception as e:
+        logger.error(f"Chat queue unavailable, handling {name} in-process: {e}")
+        return False
+
+
+async def enqueue_web_reply(user_id: str, text: str, avatar: dict | None) -> bool:
+    """Queue the LLM reply for a saved web message. False if the caller must run it."""
+    return await _add("web_reply", {"user_id": user_id, "text": text, "avatar": avatar})
+
+
+async def enqueue_whatsapp_inbound(body: dict) -> bool:
+    """Queue a raw WhatsApp webhook payload. False if the caller must process it."""
+    return await _add("whatsapp_inbound", {"body": body})
+
+
+async def enqueue_avatar_refresh(user_id: str) -> bool:
+    """Tell the chat worker to re-read the user's avatar on their next message."""
+    return await _add("refresh_avatar", {"user_id": user_id})
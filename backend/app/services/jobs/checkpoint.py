@@ -0,0 +1,156 @@
+"""
+Stage checkpoints for photo jobs — a BullMQ retry resumes at the failed stage.
+
+process_photo_job used to be all-or-nothing: an upload or delivery failure after a
+60-120s ComfyUI generation made the retry regenerate from scratch. Each stage now
+records its completion here:
+
+  generated   -> raw image streamed to a spool file, model recorded
+  watermarked -> watermarked JPEG written to a spool file
+  uploaded    -> storage path recorded (bytes no longer needed)
+  recorded    -> audit_log + usage_events rows written
+  delivered   -> message inserted / WhatsApp link sent
+
+State lives in the Redis hash ava:photo_job:{job_id}; image bytes live in the local
+spool directory (PHOTO_JOB_SPOOL_DIR) because they are too large to park in Redis for
+every in-flight job. Both are best-effort: if Redis is unreachable or the spool file
+is missing (e.g. the retry landed on another worker container), the job simply falls
+back to the earlier stage — worst case is the old behaviour of regenerating. If the
+spool directory cannot be written at all (read-only, full disk), the processor runs
+the stages in memory for that job instead (processor._generate_and_upload).
+
+Delivery is guarded by a separate idempotency key (SET NX) so a stalled job picked up
+twice, or a retry after a lost checkpoint write, never sends the photo twice.
+"""
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from app.config import settings
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("generated", "watermarked", "uploaded", "recorded", "delivered")
+
+
+def _spool_root() -> Path:
+    return Path(settings.photo_job_spool_dir or os.path.join(tempfile.gettempdir(), "ava-photo-spool"))
+
+
+class PhotoJobCheckpoint:
+    """Per-job stage state. Call load() once before checking reached()."""
+
+    def __init__(self, job_id: str, redis=None, spool_dir: Path | None = None, ttl_s: int | None = None):
+        self.job_id = job_id
+        self._redis = redis
+        self._spool_dir = spool_dir or _spool_root()
+        self._ttl_s = ttl_s or settings.photo_job_checkpoint_ttl_s
+        self.state: dict[str, str] = {}
+
+    @property
+    def key(self) -> str:
+        return f"ava:photo_job:{self.job_id}"
+
+    @property
+    def delivery_key(self) -> str:
+        return f"ava:photo_job:{self.job_id}:delivery"
+
+    def _client(self):
+        return self._redis if self._redis is not None else get_redis()
+
+    async def load(self) -> dict[str, str]:
+        """Fetch saved state. Returns {} when nothing was saved or Redis is unreachable."""
+        try:
+            raw = await self._client().hgetall(self.key)
+        except Exception as e:
+            logger.warning(f"Checkpoint load failed for job {self.job_id} (starting fresh): {e}")
+            raw = {}
+        self.state = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in (raw or {}).items()
+        }
+        if self.state.get("stage"):
+            logger.info(f"Photo job {self.job_id} resuming after stage '{self.state['stage']}'")
+        return self.state
+
+    def reached(self, stage: str) -> bool:
+        """True if `stage` (or a later one) completed on a previous attempt."""
+        current = self.state.get("stage")
+        return current in STAGES and STAGES.index(current) >= STAGES.index(stage)
+
+    async def save(self, stage: str, **fields: str) -> None:
+        """Mark `stage` complete, storing any extra fields alongside it."""
+        self.state.update(fields)
+        self.state["stage"] = stage
+        try:
+            client = self._client()
+            await client.hset(self.key, mapping={**fields, "stage": stage})
+            await client.expire(self.key, self._ttl_s)
+        except Exception as e:
+            logger.warning(f"Checkpoint save '{stage}' failed for job {self.job_id} (non-fatal): {e}")
+
+    def spool_path(self, kind: str) -> Path:
+        return self._spool_dir / f"{self.job_id}.{kind}.jpg"
+
+    def has_spool(self, kind: str) -> bool:
+        return self.spool_path(kind).is_file()
+
+    def spool_writable(self) -> bool:
+        """True if the spool directory exists (or can be created) and is writable."""
+        try:
+            self._spool_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Photo spool dir {self._spool_dir} unavailable for job {self.job_id}: {e}")
+            return False
+        if not os.access(self._spool_dir, os.W_OK):
+            logger.warning(f"Photo spool dir {self._spool_dir} is not writable (job {self.job_id})")
+            return False
+        return True
+
+    def spool_tmp_path(self, kind: str) -> Path:
+        """Scratch path for streaming writes; commit_spool() moves it into place atomically."""
+        self._spool_dir.mkdir(parents=True, exist_ok=True)
+        return self.spool_path(kind).with_suffix(".part")
+
+    def commit_spool(self, kind: str) -> Path:
+        """Rename the scratch file into place — a crash never leaves a partial spool file."""
+        path = self.spool_path(kind)
+        path.with_suffix(".part").replace(path)
+        return path
+
+    def write_spool(self, kind: str, data: bytes) -> Path:
+        """Persist in-memory stage bytes (providers that do not stream to disk)."""
+        self.spool_tmp_path(kind).write_bytes(data)
+        return self.commit_spool(kind)
+
+    async def claim_delivery(self) -> bool:
+        """Take the delivery idempotency key. False means another attempt already delivered."""
+        try:
+            claimed = await self._client().set(self.delivery_key, "1", nx=True, ex=self._ttl_s)
+        except Exception as e:
+            # Without Redis we cannot dedupe — prefer delivering over silently dropping the photo
+            logger.warning(f"Delivery key unavailable for job {self.job_id} — delivering without dedupe: {e}")
+            return True
+        return bool(claimed)
+
+    async def release_delivery(self) -> None:
+        """Drop the delivery key after a failed delivery so the next retry can deliver."""
+        try:
+            await self._client().delete(self.delivery_key)
+        except Exception as e:
+            logger.warning(f"Delivery key release failed for job {self.job_id}: {e}")
+
+    async def clear(self) -> None:
+        """Remove spooled bytes and stage state. The delivery key is kept until its TTL expires."""
+        for kind in ("raw", "watermarked"):
+            for path in (self.spool_path(kind), self.spool_path(kind).with_suffix(".part")):
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError:
+                    pass
+        try:
+            await self._client().delete(self.key)
+        except Exception as e:
+            logger.warning(f"Checkpoint clear failed for job {self.job_id}: {e}")
@@ -0,0 +1,151 @@
+"""
+Adaptive concurrency for the photo_generation worker (AIMD).
+
+worker_main.py used to hard-code concurrency=3 regardless of how ComfyUI Cloud was
+responding. This controller adjusts the limit between min and max bounds from the
+latency and outcome of each ComfyUI generation (recorded by processor.py):
+
+  - Additive increase: latency under target, error rate under threshold and jobs
+    waiting in the queue -> +1 after `limit` consecutive healthy samples
+    (roughly one step per "round" of in-flight jobs, as in TCP congestion avoidance).
+  - Multiplicative decrease: rolling error rate over threshold, or latency EWMA over
+    target -> limit * decrease_factor (floored, never below min). A cooldown stops a
+    single saturated burst from collapsing the limit straight to min.
+
+The BullMQ Worker re-reads opts["concurrency"] before fetching each job, so the
+worker applies a new limit via the on_change callback without restarting.
+"""
+import logging
+import math
+import time
+from collections import deque
+from typing import Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD concurrency limit driven by generation latency and error rate.
+
+    Not thread-safe — the worker runs a single asyncio event loop and record() never awaits.
+    """
+
+    def __init__(
+        self,
+        min_limit: int,
+        max_limit: int,
+        initial_limit: int,
+        target_latency_s: float,
+        max_error_rate: float,
+        window: int = 20,
+        decrease_factor: float = 0.5,
+        ewma_alpha: float = 0.3,
+        cooldown_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if min_limit < 1 or max_limit < min_limit:
+            raise ValueError(f"Invalid concurrency bounds: min={min_limit} max={max_limit}")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency_s = target_latency_s
+        self.max_error_rate = max_error_rate
+        self.decrease_factor = decrease_factor
+        self.ewma_alpha = ewma_alpha
+        self.cooldown_s = cooldown_s
+        self._clock = clock
+
+        self._limit = max(min_limit, min(max_limit, initial_limit))
+        self._outcomes: deque[bool] = deque(maxlen=window)  # True = ComfyUI error
+        self._latency_ewma: float | None = None
+        self._healthy_streak = 0
+        self._last_decrease_at: float | None = None
+        self._queue_depth = 0
+        self._listeners: list[Callable[[int], None]] = []
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(self._outcomes) / len(self._outcomes)
+
+    def on_change(self, callback: Callable[[int], None]) -> None:
+        """Register a callback invoked with the new limit whenever it changes."""
+        self._listeners.append(callback)
+
+    def set_queue_depth(self, waiting: int) -> None:
+        """Record how many jobs are waiting — no increase is attempted on an empty queue."""
+        self._queue_depth = max(0, waiting)
+
+    def record(self, latency_s: float, ok: bool) -> int:
+        """Feed one ComfyUI generation outcome into the controller. Returns the current limit."""
+        self._outcomes.append(not ok)
+        if self._latency_ewma is None:
+            self._latency_ewma = latency_s
+        else:
+            self._latency_ewma = (
+                self.ewma_alpha * latency_s + (1 - self.ewma_alpha) * self._latency_ewma
+            )
+
+        saturated = (
+            self.error_rate > self.max_error_rate
+            or self._latency_ewma > self.target_latency_s
+        )
+        if saturated:
+            self._healthy_streak = 0
+            self._decrease()
+        elif ok:
+            self._healthy_streak += 1
+            if self._healthy_streak >= self._limit and self._queue_depth > 0:
+                self._healthy_streak = 0
+                self._set_limit(self._limit + 1, "headroom")
+        return self._limit
+
+    def snapshot(self) -> dict:
+        """Current controller state — published as worker metrics."""
+        return {
+            "concurrency_limit": self._limit,
+            "latency_ewma_s": round(self._latency_ewma or 0.0, 2),
+            "error_rate": round(self.error_rate, 3),
+            "queue_depth": self._queue_depth,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+        }
+
+    def _decrease(self) -> None:
+        now = self._clock()
+        if self._last_decrease_at is not None and now - self._last_decrease_at < self.cooldown_s:
+            return
+        self._last_decrease_at = now
+        self._set_limit(math.floor(self._limit * self.decrease_factor), "saturation")
+
+    def _set_limit(self, new_limit: int, reason: str) -> None:
+        new_limit = max(self.min_limit, min(self.max_limit, new_limit))
+        if new_limit == self._limit:
+            return
+        logger.info(
+            "Photo worker concurrency %d -> %d (%s, latency_ewma=%.1fs, error_rate=%.2f)",
+            self._limit, new_limit, reason, self._latency_ewma or 0.0, self.error_rate,
+        )
+        self._limit = new_limit
+        for callback in self._listeners:
+            try:
+                callback(new_limit)
+            except Exception as exc:
+                logger.error("Concurrency listener failed: %s", exc)
+
+
+# Module-level singleton — fed by processor.py, applied to the Worker by worker_main.py
+photo_concurrency = AdaptiveConcurrency(
+    min_limit=settings.photo_worker_min_concurrency,
+    max_limit=settings.photo_worker_max_concurrency,
+    initial_limit=settings.photo_worker_initial_concurrency,
+    target_latency_s=settings.photo_worker_target_latency_s,
+    max_error_rate=settings.photo_worker_max_error_rate,
+)
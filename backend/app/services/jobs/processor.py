@@ -1,8 +1,10 @@
 """
-BullMQ photo job processor — called by the Worker for each 'generate_photo' job.
+BullMQ photo job processor — called by the Worker for each 'generate_photo' and
+'generate_reference' job (dispatched by process_job).
 
 Delivery strategy:
-  - Web: Insert assistant photo message into messages table. Frontend polls /chat/history.
+  - Web: Insert assistant photo message into messages table and publish a chat update
+    (wakes GET /chat/updates long-polls via Redis pub/sub).
   - WhatsApp: Send signed URL link via Meta WhatsApp API (PLAT-03 — no inline NSFW).
 
 Full pipeline per job:
@@ -10,29 +12,43 @@ Full pipeline per job:
   2. Call ComfyUI Cloud API (image-to-image if reference exists, else text-to-image)
      — 4-step flow: POST /api/prompt → poll /api/job/{id}/status →
        GET /api/history_v2/{id} → GET /api/view (download)
-  3. Image bytes returned directly by ComfyUIProvider
-  4. Apply Pillow watermark (compliance requirement)
+  3. Image streamed by ComfyUIProvider straight to a spool file (no in-memory copy)
+  4. Apply Pillow watermark (compliance requirement) file-to-file
   5. Upload watermarked JPEG to Supabase Storage: photos/{user_id}/{job_id}.jpg
   6. Audit log (compliance)
   7. Deliver to user via channel-appropriate method:
        Web: store [PHOTO_PATH] storage path in message; GET /chat/history re-signs at read time
        WhatsApp: generate a fresh 1-hour signed URL at delivery time
   8. On all-retries-exhausted: notify user of failure
+
+Steps 3-8 checkpoint their output (app/services/jobs/checkpoint.py): a BullMQ retry
+resumes at the failed stage, and a delivery idempotency key prevents double sends.
 """
 import logging
+import resource
+import time
+from pathlib import Path
+
 import httpx
 from app.services.image.comfyui_provider import ComfyUIProvider
 from app.services.image.prompt_builder import build_avatar_prompt
-from app.services.image.watermark import apply_watermark
+from app.services.image.watermark import apply_watermark, apply_watermark_file
+from app.services.jobs.concurrency import photo_concurrency
+from app.services.jobs.checkpoint import PhotoJobCheckpoint
+from app.services.jobs.scheduling import release_photo_slot
+from app.services.storage.signed_urls import photo_urls
+from app.services.messages.store import insert_messages
 from app.database import supabase_admin
 
 logger = logging.getLogger(__name__)
 
 PHOTO_BUCKET = "photos"
-WHATSAPP_SIGNED_URL_TTL = 3600  # 1 hour — WhatsApp links are one-shot, short TTL is fine
 
 _image_provider = ComfyUIProvider()
 
+# Neutral full-body scene for the avatar reference image (image-to-image anchor)
+REFERENCE_SCENE = "neutral background, natural light, full body visible, standing"
+
 PHOTO_FAILURE_MSG = (
     "I wasn't able to send you a photo right now — please try again later."
 )
@@ -49,37 +65,16 @@ async def _deliver_web(user_id: str, avatar: dict, storage_path: str) -> None:
     # converts this to a fresh signed URL before sending to the frontend.
     content = f"[PHOTO_PATH]{storage_path}[/PHOTO_PATH]"
     avatar_id = avatar.get("id") if avatar else None
-    supabase_admin.from_("messages").insert({
+    await insert_messages([{
         "user_id": user_id,
         "avatar_id": avatar_id,
         "channel": "web",
         "role": "assistant",
         "content": content,
-    }).execute()
-
-
-async def _deliver_whatsapp(user_id: str, storage_path: str) -> None:
-    """Send a fresh signed URL link via WhatsApp (PLAT-03 — no inline NSFW images on WhatsApp).
-
-    Generates a fresh 1-hour signed URL at delivery time from the raw storage path.
-    WhatsApp links are one-shot (the user clicks immediately), so a short TTL is fine here.
-    The storage path lives permanently in Supabase Storage; new signed URLs can always be
-    generated on demand.
-    """
-    from app.services.whatsapp import send_whatsapp_message
-    from app.config import settings
+    }])
 
-    # Generate a fresh short-lived signed URL for WhatsApp delivery
-    sign_response = (
-        supabase_admin.storage
-        .from_(PHOTO_BUCKET)
-        .create_signed_url(storage_path, WHATSAPP_SIGNED_URL_TTL)
-    )
-    signed_url = sign_response.get("signedURL") or sign_response.get("signed_url")
-    if not signed_url:
-        logger.error(f"_deliver_whatsapp: failed to sign path {storage_path!r} — sign_response={sign_response}")
-        return
 
+async def _get_whatsapp_phone(user_id: str) -> str | None:
     result = (
         supabase_admin
         .from_("user_preferences")
@@ -88,19 +83,257 @@ async def _deliver_whatsapp(user_id: str, storage_path: str) -> None:
         .maybe_single()
         .execute()
     )
-    phone = (result.data or {}).get("whatsapp_phone")
+    return ((result.data if result else None) or {}).get("whatsapp_phone")
+
+
+async def _send_whatsapp_text(user_id: str, text: str) -> None:
+    """Send a plain text message to the user's linked WhatsApp number (if any)."""
+    from app.services.whatsapp import send_whatsapp_message
+    from app.config import settings
+
+    phone = await _get_whatsapp_phone(user_id)
     if not phone:
-        logger.warning(f"No WhatsApp phone for user {user_id} — cannot deliver photo")
+        logger.warning(f"No WhatsApp phone for user {user_id} — cannot deliver message")
         return
 
-    message = f"Here's your photo (link valid 1h): {signed_url}"
     await send_whatsapp_message(
         phone_number_id=settings.whatsapp_phone_number_id,
         to=phone,
-        text=message,
+        text=text,
     )
 
 
+async def _deliver_whatsapp(user_id: str, storage_path: str) -> None:
+    """Send a fresh signed URL link via WhatsApp (PLAT-03 — no inline NSFW images on WhatsApp).
+
+    Generates a fresh 1-hour signed URL at delivery time from the raw storage path.
+    WhatsApp links are one-shot (the user clicks immediately), so a short TTL is fine here.
+    The storage path lives permanently in Supabase Storage; new signed URLs can always be
+    generated on demand.
+    """
+    # Signed now, not served from cache — a cached URL may have only ~10 minutes left,
+    # and the message promises the full hour (also true for a retried delivery)
+    signed_url = await photo_urls.sign_fresh(storage_path)
+    if not signed_url:
+        # Raise so the retry re-attempts delivery (the delivery key is released on failure)
+        raise RuntimeError(f"failed to sign path {storage_path!r}")
+
+    await _send_whatsapp_text(user_id, f"Here's your photo (link valid 1h): {signed_url}")
+
+
+async def _generate_timed(prompt: str, reference_image_url: str | None, output_path: str | None = None):
+    """Run the ComfyUI generation and feed its latency/outcome to the AIMD controller."""
+    started = time.monotonic()
+    try:
+        generated = await _image_provider.generate(
+            prompt, reference_image_url=reference_image_url, output_path=output_path
+        )
+    except Exception:
+        photo_concurrency.record(time.monotonic() - started, ok=False)
+        raise
+    photo_concurrency.record(time.monotonic() - started, ok=True)
+    return generated
+
+
+async def _spool_generated(generated, checkpoint: PhotoJobCheckpoint) -> Path:
+    """Move the generated image into the job's raw spool file, whatever form the provider returned."""
+    if generated.image_path:
+        # Streamed straight to the .part scratch path by the provider (generate(output_path=...))
+        return checkpoint.commit_spool("raw")
+    if generated.image_bytes:
+        return checkpoint.write_spool("raw", generated.image_bytes)
+    # URL-only providers — stream the download to disk as well
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        async with client.stream("GET", generated.url) as resp:
+            resp.raise_for_status()
+            with open(checkpoint.spool_tmp_path("raw"), "wb") as f:
+                async for chunk in resp.aiter_bytes(64 * 1024):
+                    f.write(chunk)
+    return checkpoint.commit_spool("raw")
+
+
+async def _fetch_image_bytes(generated) -> bytes:
+    """ComfyUI returns bytes directly; other providers return a URL to download."""
+    if generated.image_bytes:
+        return generated.image_bytes
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        resp = await client.get(generated.url)
+        resp.raise_for_status()
+        return resp.content
+
+
+def _rss_high_water_mb() -> float:
+    """
+    Worker process RSS high-water mark in MB (ru_maxrss is KB on Linux). It only
+    grows, covers every job this process has run and includes concurrent jobs, so
+    it cannot be attributed to one job.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _generate_and_upload(
+    checkpoint: PhotoJobCheckpoint,
+    prompt: str,
+    storage_path: str,
+    reference_path: str | None = None,
+) -> None:
+    """
+    Shared generate -> watermark -> upload stages for photo and reference jobs.
+
+    Skips any stage the checkpoint says already completed; spool files from a
+    previous attempt are reused so ComfyUI is only called when nothing survives.
+    reference_path: storage path of the avatar reference image for image-to-image
+    (None for text-to-image, e.g. when generating the reference itself).
+
+    The image moves file-to-file: ComfyUI output is streamed to the raw spool file,
+    watermarked into the watermarked spool file, and uploaded from an open file handle
+    (multipart body streamed by httpx) — no stage holds the encoded image as bytes.
+    When the spool directory cannot be written, the same stages run in memory. A spool
+    error after the image was generated finishes in memory from the raw spool file —
+    a paid generation is never repeated within one attempt.
+    """
+    if checkpoint.reached("uploaded"):
+        return
+
+    image_bytes = None
+    if checkpoint.spool_writable():
+        try:
+            await _spooled_stages(checkpoint, prompt, storage_path, reference_path)
+            return
+        except OSError as e:
+            # Disk full / spool dir gone mid-job — spooling is an optimisation, not a requirement
+            logger.warning(f"Photo spool write failed for job {checkpoint.job_id}, continuing in memory: {e}")
+            if checkpoint.reached("generated"):
+                # Raises OSError if the raw output is unreadable too — the job retries
+                image_bytes = checkpoint.spool_path("raw").read_bytes()
+    await _in_memory_stages(checkpoint, prompt, storage_path, reference_path, image_bytes)
+
+
+async def _in_memory_stages(
+    checkpoint: PhotoJobCheckpoint,
+    prompt: str,
+    storage_path: str,
+    reference_path: str | None,
+    image_bytes: bytes | None = None,
+) -> None:
+    """
+    Generate -> watermark -> upload holding the image as bytes (no spool files).
+    image_bytes: the already generated raw image — skips generation.
+    """
+    if image_bytes is None:
+        reference_image_url = None
+        if reference_path:
+            reference_image_url = await photo_urls.sign(reference_path)
+        generated = await _generate_timed(prompt, reference_image_url)
+        image_bytes = await _fetch_image_bytes(generated)
+        logger.info(f"Got {len(image_bytes)} bytes from ComfyUI (in-memory path)")
+        await checkpoint.save("generated", model=generated.model)
+
+    watermarked_bytes = apply_watermark(image_bytes)
+    supabase_admin.storage.from_(PHOTO_BUCKET).upload(
+        storage_path,
+        watermarked_bytes,
+        file_options={"content-type": "image/jpeg", "upsert": "true"},
+    )
+    logger.info(f"Uploaded to Supabase Storage: {storage_path} (in-memory path)")
+    await checkpoint.save("uploaded", storage_path=storage_path)
+
+
+async def _spooled_stages(
+    checkpoint: PhotoJobCheckpoint,
+    prompt: str,
+    storage_path: str,
+    reference_path: str | None,
+) -> None:
+    """Generate -> watermark -> upload file-to-file through the job's spool files."""
+    if not (checkpoint.reached("watermarked") and checkpoint.has_spool("watermarked")):
+        if not (checkpoint.reached("generated") and checkpoint.has_spool("raw")):
+            # Step 2: Get reference image signed URL for image-to-image generation
+            reference_image_url = None
+            if reference_path:
+                reference_image_url = await photo_urls.sign(reference_path)
+
+            # Step 3: Generate via ComfyUI Cloud (image-to-image if reference exists)
+            generated = await _generate_timed(
+                prompt, reference_image_url, output_path=str(checkpoint.spool_tmp_path("raw"))
+            )
+
+            # Step 4: Spool the output (ComfyUI streams it to disk directly)
+            raw_path = await _spool_generated(generated, checkpoint)
+            logger.info(f"Got {raw_path.stat().st_size} bytes from ComfyUI")
+            await checkpoint.save("generated", model=generated.model)
+
+        # Step 5: Apply visible watermark (compliance requirement)
+        apply_watermark_file(checkpoint.spool_path("raw"), checkpoint.spool_tmp_path("watermarked"))
+        checkpoint.commit_spool("watermarked")
+        await checkpoint.save("watermarked")
+
+    # Step 6: Upload to Supabase Storage private bucket (upsert — safe to repeat).
+    # A file object (not a path) so storage3 streams it and the handle is closed here.
+    with open(checkpoint.spool_path("watermarked"), "rb") as f:
+        supabase_admin.storage.from_(PHOTO_BUCKET).upload(
+            storage_path,
+            f,
+            file_options={"content-type": "image/jpeg", "upsert": "true"},
+        )
+    logger.info(
+        f"Uploaded to Supabase Storage: {storage_path} "
+        f"(worker process RSS high-water mark {_rss_high_water_mb():.1f} MB)"
+    )
+    await checkpoint.save("uploaded", storage_path=storage_path)
+
+
+def _is_final_attempt(job) -> bool:
+    max_attempts = job.opts.get("attempts", 3) if job.opts else 3
+    return job.attemptsMade >= max_attempts - 1
+
+
+async def _record_generation(user_id: str, job_id: str, channel: str, prompt: str, model: str, storage_path: str) -> None:
+    """Audit log + usage event. Both writes are non-fatal."""
+    # Audit log — compliance (image generation tracking per CONTEXT.md)
+    try:
+        supabase_admin.from_("audit_log").insert({
+            "user_id": user_id,
+            "event_type": "photo_generated",
+            "event_category": "image_generation",
+            "action": "generate",
+            "resource_type": "photo",
+            "event_data": {
+                "prompt": prompt[:500],
+                "model": model,
+                "storage_path": storage_path,
+                "job_id": job_id,
+            },
+            "result": "success",
+        }).execute()
+    except Exception as e:
+        logger.warning(f"Audit log write failed (non-fatal): {e}")
+
+    # Emit to usage_events for admin dashboard (ADMN-02)
+    # audit_log write above is kept — both writes happen independently
+    try:
+        supabase_admin.from_("usage_events").insert({
+            "user_id": user_id,
+            "event_type": "photo_generated",
+            "metadata": {"job_id": job_id, "channel": channel},
+        }).execute()
+    except Exception as exc:
+        logger.error("Failed to emit photo_generated usage event: %s", exc)
+
+
+async def _notify_failure(user_id: str, avatar: dict, channel: str) -> None:
+    if channel == "whatsapp":
+        await _send_whatsapp_text(user_id, PHOTO_FAILURE_MSG)
+    else:
+        await insert_messages([{
+            "user_id": user_id,
+            "avatar_id": avatar.get("id") if avatar else None,
+            "channel": "web",
+            "role": "assistant",
+            "content": PHOTO_FAILURE_MSG,
+        }])
+
+
 async def process_photo_job(job, token: str | None = None) -> None:
     """
     BullMQ Worker processor function.
@@ -109,6 +342,8 @@ async def process_photo_job(job, token: str | None = None) -> None:
     On success: delivers photo to user via channel.
     On final failure: sends user a failure notification.
     BullMQ handles retries automatically per attempts/backoff config in queue.py.
+    Each stage checkpoints its output (checkpoint.py) so a retry resumes at the
+    failed stage instead of regenerating the image.
     """
     data = job.data
     user_id: str = data["user_id"]
@@ -119,107 +354,120 @@ async def process_photo_job(job, token: str | None = None) -> None:
 
     logger.info(f"Processing photo job {job_id} for user {user_id} channel={channel}")
 
+    checkpoint = PhotoJobCheckpoint(job_id)
+    await checkpoint.load()
+
     try:
-        # Step 1: Build prompt from all avatar fields
+        # Step 1: Build prompt from all avatar fields (deterministic — cheap to rebuild on resume)
         prompt = build_avatar_prompt(avatar, scene_description)
         logger.debug(f"Prompt ({len(prompt)} chars): {prompt[:120]}...")
 
-        # Step 2: Get reference image signed URL for image-to-image generation
-        ref_sign = (
-            supabase_admin.storage
-            .from_("photos")
-            .create_signed_url(f"{user_id}/reference.jpg", 3600)
-        )
-        reference_image_url = ref_sign.get("signedURL") or ref_sign.get("signed_url")
+        storage_path = checkpoint.state.get("storage_path") or f"{user_id}/{job_id}.jpg"
 
-        # Step 3: Generate via ComfyUI Cloud (image-to-image if reference exists)
-        generated = await _image_provider.generate(
-            prompt, reference_image_url=reference_image_url
+        # Steps 2-6: generate -> watermark -> upload (resumes from checkpoint)
+        await _generate_and_upload(
+            checkpoint, prompt, storage_path, reference_path=f"{user_id}/reference.jpg"
         )
 
-        # Step 4: Get image bytes (ComfyUI returns bytes directly)
-        if generated.image_bytes:
-            image_bytes = generated.image_bytes
-        else:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                resp = await client.get(generated.url)
-                resp.raise_for_status()
-                image_bytes = resp.content
-        logger.info(f"Got {len(image_bytes)} bytes from ComfyUI")
-
-        # Step 5: Apply visible watermark (compliance requirement)
-        watermarked_bytes = apply_watermark(image_bytes)
-
-        # Step 6: Upload to Supabase Storage private bucket
-        storage_path = f"{user_id}/{job_id}.jpg"
-        supabase_admin.storage.from_(PHOTO_BUCKET).upload(
-            storage_path,
-            watermarked_bytes,
-            file_options={"content-type": "image/jpeg", "upsert": "true"},
-        )
-        logger.info(f"Uploaded to Supabase Storage: {storage_path}")
-
-        # Step 7: Audit log — compliance (image generation tracking per CONTEXT.md)
+        # Step 7: Audit log + usage event — once per job, not once per attempt.
         # Note: signed URL generation removed from this step. The storage path is permanent;
         # signed URLs are generated on demand at read time (web) or delivery time (WhatsApp).
-        try:
-            supabase_admin.from_("audit_log").insert({
-                "user_id": user_id,
-                "event_type": "photo_generated",
-                "event_category": "image_generation",
-                "action": "generate",
-                "resource_type": "photo",
-                "event_data": {
-                    "prompt": prompt[:500],
-                    "model": generated.model,
-                    "storage_path": storage_path,
-                    "job_id": job_id,
-                },
-                "result": "success",
-            }).execute()
-        except Exception as e:
-            logger.warning(f"Audit log write failed (non-fatal): {e}")
-
-        # Step 7b: Emit to usage_events for admin dashboard (ADMN-02)
-        # audit_log write above is kept — both writes happen independently
-        try:
-            supabase_admin.from_("usage_events").insert({
-                "user_id": user_id,
-                "event_type": "photo_generated",
-                "metadata": {"job_id": job_id, "channel": channel},
-            }).execute()
-        except Exception as exc:
-            logger.error("Failed to emit photo_generated usage event: %s", exc)
+        if not checkpoint.reached("recorded"):
+            await _record_generation(
+                user_id, job_id, channel, prompt,
+                checkpoint.state.get("model", "unknown"), storage_path,
+            )
+            await checkpoint.save("recorded")
 
         # Step 8: Deliver to user via channel using the permanent storage path.
         # _deliver_web stores the path in message content (re-signed at read time).
         # _deliver_whatsapp generates a fresh signed URL at delivery time.
-        if channel == "whatsapp":
-            await _deliver_whatsapp(user_id, storage_path)
-        else:
-            await _deliver_web(user_id, avatar, storage_path)
-
+        # The delivery key makes this at-most-once across retries and stalled-job re-runs.
+        if not checkpoint.reached("delivered"):
+            if await checkpoint.claim_delivery():
+                try:
+                    if channel == "whatsapp":
+                        await _deliver_whatsapp(user_id, storage_path)
+                    else:
+                        await _deliver_web(user_id, avatar, storage_path)
+                except Exception:
+                    await checkpoint.release_delivery()
+                    raise
+            else:
+                logger.info(f"Photo job {job_id} already delivered — skipping duplicate delivery")
+            await checkpoint.save("delivered")
+
+        await checkpoint.clear()
+        await release_photo_slot(user_id, scene_description, job_id)
         logger.info(f"Photo job {job_id} completed successfully")
 
     except Exception as e:
         logger.error(f"Photo job {job_id} failed (attempt {job.attemptsMade + 1}): {e}")
 
         # Notify user only on last attempt (all retries exhausted)
-        max_attempts = job.opts.get("attempts", 3) if job.opts else 3
-        if job.attemptsMade >= max_attempts - 1:
+        if _is_final_attempt(job):
             logger.warning(f"All retries exhausted for job {job_id} — sending failure notification")
+            await checkpoint.clear()
+            await release_photo_slot(user_id, scene_description, job_id)
             try:
-                if channel == "whatsapp":
-                    await _deliver_whatsapp(user_id, PHOTO_FAILURE_MSG)
-                else:
-                    supabase_admin.from_("messages").insert({
-                        "user_id": user_id,
-                        "avatar_id": avatar.get("id") if avatar else None,
-                        "channel": "web",
-                        "role": "assistant",
-                        "content": PHOTO_FAILURE_MSG,
-                    }).execute()
+                await _notify_failure(user_id, avatar, channel)
             except Exception as notify_err:
                 logger.error(f"Failure notification also failed for user {user_id}: {notify_err}")
 
         raise  # Re-raise so BullMQ records failure and triggers retry
+
+
+async def process_reference_job(job, token: str | None = None) -> None:
+    """
+    BullMQ 'generate_reference' job — the avatar's reference image.
+    Receives job.data: {user_id}.
+
+    Runs the same generate -> watermark -> upload stages as photo jobs (text-to-image,
+    no reference yet), uploads to the fixed path {user_id}/reference.jpg that photo
+    jobs read for image-to-image, then writes that path to avatars.reference_image_url.
+    The frontend polls GET /avatars/me until the column is non-null; on final failure
+    it times out with a user-facing error, so nothing is sent here.
+    """
+    user_id: str = job.data["user_id"]
+    job_id: str = str(job.id)
+    storage_path = f"{user_id}/reference.jpg"
+
+    logger.info(f"Processing reference job {job_id} for user {user_id}")
+
+    checkpoint = PhotoJobCheckpoint(job_id)
+    await checkpoint.load()
+
+    try:
+        # Fetch the current avatar — fields may have changed since the job was enqueued
+        avatar_result = supabase_admin.from_("avatars").select("*").eq("user_id", user_id).execute()
+        if not avatar_result.data:
+            logger.error(f"Reference job {job_id}: no avatar found for user {user_id} — dropping")
+            await checkpoint.clear()
+            return
+        avatar = avatar_result.data[0]
+
+        prompt = build_avatar_prompt(avatar, REFERENCE_SCENE)
+        await _generate_and_upload(checkpoint, prompt, storage_path)
+
+        # Store the storage path (NOT a signed URL) — GET /avatars/me signs at read time
+        update_result = supabase_admin.from_("avatars").update(
+            {"reference_image_url": storage_path}
+        ).eq("user_id", user_id).execute()
+        if not update_result.data:
+            raise RuntimeError(f"reference_image_url update returned no rows for user {user_id}")
+
+        await checkpoint.clear()
+        logger.info(f"Reference job {job_id} completed — path stored for user {user_id}")
+
+    except Exception as e:
+        logger.error(f"Reference job {job_id} failed (attempt {job.attemptsMade + 1}): {e}")
+        if _is_final_attempt(job):
+            await checkpoint.clear()
+        raise
+
+
+async def process_job(job, token: str | None = None) -> None:
+    """Worker entry point — dispatches photo_generation jobs by name."""
+    if job.name == "generate_reference":
+        return await process_reference_job(job, token)
+    return await process_photo_job(job, token)
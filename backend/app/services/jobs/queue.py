@@ -1,5 +1,6 @@
 """
 BullMQ photo generation queue (enqueue side only — no Worker import here).
+Carries both 'generate_photo' and 'generate_reference' jobs.
 
 Only the FastAPI web process uses this module to add jobs.
 The worker process (worker_main.py) uses BullMQ Worker directly.
@@ -7,31 +8,44 @@ The worker process (worker_main.py) uses BullMQ Worker directly.
 Anti-pattern avoided: importing BullMQ Worker in the web process (RESEARCH.md anti-patterns).
 """
 import logging
+import uuid
 from urllib.parse import urlparse
 from bullmq import Queue
 from app.config import settings
+from app.services.jobs.scheduling import (
+    ENQUEUED,
+    PRIORITY_REFERENCE,
+    acquire_photo_slot,
+    get_photo_priority,
+    release_photo_slot,
+)
 
 logger = logging.getLogger(__name__)
 
 _photo_queue: Queue | None = None
 
 
+def bullmq_connection() -> dict:
+    """BullMQ connection dict from REDIS_URL — same format for every Queue and Worker."""
+    host = "redis"
+    port = 6379
+    if settings.redis_url:
+        try:
+            parsed = urlparse(settings.redis_url)
+            host = parsed.hostname or host
+            port = parsed.port or port
+        except Exception:
+            pass
+    return {"host": host, "port": port}
+
+
 def get_photo_queue() -> Queue:
     """Return module-level Queue singleton. Lazy init on first call."""
     global _photo_queue
     if _photo_queue is None:
-        host = "redis"
-        port = 6379
-        if settings.redis_url:
-            try:
-                parsed = urlparse(settings.redis_url)
-                host = parsed.hostname or host
-                port = parsed.port or port
-            except Exception:
-                pass
         _photo_queue = Queue(
             "photo_generation",
-            {"connection": {"host": host, "port": port}},
+            {"connection": bullmq_connection()},
         )
     return _photo_queue
 
@@ -41,7 +55,7 @@ async def enqueue_photo_job(
     scene_description: str,
     avatar: dict,
     channel: str,
-) -> None:
+) -> str:
     """
     Enqueue a photo generation job to BullMQ.
 
@@ -50,21 +64,70 @@ async def enqueue_photo_job(
         scene_description: Scene/pose description from LLM send_photo tool call.
         avatar: Full avatar dict (must include gender, nationality, physical_description).
         channel: "web" or "whatsapp" (for delivery routing in processor).
+
+    Returns:
+        "enqueued", or "duplicate" / "throttled" when scheduling.py refused the job
+        (same scene already pending / user at their in-flight cap). Nothing is enqueued
+        in the latter two cases.
+
+    Raises if the job cannot be added to the queue; the slot is released first.
     """
+    job_id = uuid.uuid4().hex
+    status = await acquire_photo_slot(user_id, scene_description, job_id)
+    if status != ENQUEUED:
+        logger.info(f"Photo job not enqueued for user {user_id}: {status}")
+        return status
+
+    try:
+        priority = await get_photo_priority(user_id)
+        queue = get_photo_queue()
+        await queue.add(
+            "generate_photo",
+            {
+                "user_id": user_id,
+                "scene_description": scene_description,
+                "avatar": avatar,
+                "channel": channel,
+            },
+            {
+                "jobId": job_id,
+                "priority": priority,
+                "attempts": 3,
+                "backoff": {"type": "exponential", "delay": 2000},  # 2s, 4s, 8s retries
+                "removeOnComplete": 100,
+                "removeOnFail": 200,
+            },
+        )
+    except Exception:
+        # No job will ever release the slot — free it (and the dedup key) now
+        await release_photo_slot(user_id, scene_description, job_id)
+        raise
+    logger.info(f"Photo job {job_id} enqueued for user {user_id}, channel={channel} priority={priority}")
+    return status
+
+
+async def enqueue_reference_job(user_id: str) -> None:
+    """
+    Enqueue avatar reference-image generation ('generate_reference') to BullMQ.
+
+    Runs in the same photo_generation worker as photo jobs (shared provider,
+    watermark and upload stages, adaptive concurrency) but in its own priority lane
+    ahead of every subscription tier — onboarding waits on it. Not subject to the
+    per-user photo cap: the endpoint clears reference_image_url first, so a repeat
+    request simply overwrites {user_id}/reference.jpg.
+    """
+    job_id = f"reference-{uuid.uuid4().hex}"
     queue = get_photo_queue()
     await queue.add(
-        "generate_photo",
-        {
-            "user_id": user_id,
-            "scene_description": scene_description,
-            "avatar": avatar,
-            "channel": channel,
-        },
+        "generate_reference",
+        {"user_id": user_id},
         {
+            "jobId": job_id,
+            "priority": PRIORITY_REFERENCE,
             "attempts": 3,
-            "backoff": {"type": "exponential", "delay": 2000},  # 2s, 4s, 8s retries
+            "backoff": {"type": "exponential", "delay": 2000},
             "removeOnComplete": 100,
             "removeOnFail": 200,
         },
     )
-    logger.info(f"Photo job enqueued for user {user_id}, channel={channel}")
+    logger.info(f"Reference job {job_id} enqueued for user {user_id}")
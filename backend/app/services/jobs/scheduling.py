@@ -0,0 +1,123 @@
+"""
+Photo queue scheduling — per-user fairness, tier priority and in-flight dedup.
+
+BullMQ gives one FIFO per queue. On top of it:
+
+  - Per-user in-flight cap: each user may have at most PHOTO_MAX_INFLIGHT_PER_USER
+    jobs waiting or running. Tracked as a Redis sorted set of job ids per user
+    (score = enqueue time) so release is idempotent and entries orphaned by a crashed
+    worker age out after PHOTO_INFLIGHT_TTL_S instead of blocking the user forever.
+  - Tier priority: BullMQ `priority` (lower = served first) from the user's Stripe
+    price ID — Elite before Premium before Basic. Reference-image jobs get their own
+    lane ahead of every tier (onboarding is blocked on them).
+  - Dedup: an identical scene from the same user while the first request is still
+    pending is coalesced (SET NX on user + scene hash) instead of burning another
+    generation slot.
+
+Redis failures fail open — the job is enqueued without fairness checks rather than
+dropping a paying user's photo.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+
+from app.config import settings
+from app.database import supabase_admin
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# acquire_photo_slot() outcomes
+ENQUEUED = "enqueued"
+DUPLICATE = "duplicate"
+THROTTLED = "throttled"
+
+# BullMQ priority lanes — lower number is served first
+PRIORITY_REFERENCE = 1
+PRIORITY_BY_TIER = {
+    "elite": 2,
+    "premium": 4,
+    "basic": 6,
+}
+PRIORITY_DEFAULT = 8  # unknown price ID / no subscription row
+
+
+def _inflight_key(user_id: str) -> str:
+    return f"ava:photo_inflight:{user_id}"
+
+
+def _pending_key(user_id: str, scene_description: str) -> str:
+    normalized = " ".join(scene_description.lower().split())
+    digest = hashlib.sha1(normalized.encode()).hexdigest()[:16]
+    return f"ava:photo_pending:{user_id}:{digest}"
+
+
+def tier_for_price_id(price_id: str | None) -> str | None:
+    """Map a Stripe price ID to its plan slug using the configured price IDs."""
+    if not price_id:
+        return None
+    tiers = {
+        settings.stripe_price_id_basic: "basic",
+        settings.stripe_price_id_premium: "premium",
+        settings.stripe_price_id_elite: "elite",
+    }
+    tiers.pop("", None)
+    return tiers.get(price_id)
+
+
+async def get_photo_priority(user_id: str) -> int:
+    """BullMQ priority for a user's photo jobs, from their subscription's price ID."""
+    try:
+        result = await asyncio.to_thread(
+            lambda: supabase_admin.from_("subscriptions")
+            .select("stripe_price_id")
+            .eq("user_id", user_id)
+            .limit(1)
+            .execute()
+        )
+        price_id = result.data[0].get("stripe_price_id") if result.data else None
+    except Exception as e:
+        logger.warning(f"Tier lookup failed for user {user_id} (default priority): {e}")
+        return PRIORITY_DEFAULT
+    return PRIORITY_BY_TIER.get(tier_for_price_id(price_id), PRIORITY_DEFAULT)
+
+
+async def acquire_photo_slot(user_id: str, scene_description: str, job_id: str) -> str:
+    """
+    Reserve an in-flight slot for `job_id`. Returns ENQUEUED, DUPLICATE or THROTTLED.
+    On ENQUEUED the caller must enqueue the job; the worker calls release_photo_slot().
+    """
+    redis = get_redis()
+    pending_key = _pending_key(user_id, scene_description)
+    inflight_key = _inflight_key(user_id)
+    try:
+        if not await redis.set(pending_key, job_id, nx=True, ex=settings.photo_dedup_ttl_s):
+            return DUPLICATE
+
+        now = time.time()
+        # Add first, then count — two concurrent requests can both be throttled, never both admitted
+        await redis.zremrangebyscore(inflight_key, 0, now - settings.photo_inflight_ttl_s)
+        await redis.zadd(inflight_key, {job_id: now})
+        await redis.expire(inflight_key, settings.photo_inflight_ttl_s)
+        if await redis.zcard(inflight_key) > settings.photo_max_inflight_per_user:
+            await redis.zrem(inflight_key, job_id)
+            await redis.delete(pending_key)
+            return THROTTLED
+    except Exception as e:
+        logger.warning(f"Photo scheduling unavailable for user {user_id} (enqueueing anyway): {e}")
+    return ENQUEUED
+
+
+async def release_photo_slot(user_id: str, scene_description: str, job_id: str) -> None:
+    """Free the slot taken by acquire_photo_slot(). Idempotent — safe on every terminal path."""
+    redis = get_redis()
+    try:
+        await redis.zrem(_inflight_key(user_id), job_id)
+        pending_key = _pending_key(user_id, scene_description)
+        # Only clear the dedup key if it still belongs to this job
+        owner = await redis.get(pending_key)
+        if owner is not None and (owner.decode() if isinstance(owner, bytes) else owner) == job_id:
+            await redis.delete(pending_key)
+    except Exception as e:
+        logger.warning(f"Photo slot release failed for job {job_id}: {e}")
@@ -0,0 +1,42 @@
+"""
+Opaque keyset cursors for the messages table: base64url("created_at|id").
+
+Shared by GET /chat/history, /chat/updates (X-Cursor, `after`) and GET /messages
+(`before`). (created_at, id) is unique and matches the idx_messages_user_created_id
+index order, so a page boundary never skips or repeats a row — unlike OFFSET.
+"""
+import base64
+import uuid
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque keyset cursor for a message row: (created_at, id)."""
+    raw = f"{row['created_at']}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """(created_at, id) from a cursor. Raises HTTP 400 if it is not one we issued."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|", 1)
+        datetime.fromisoformat(created_at)  # validate — value is interpolated into a filter
+        uuid.UUID(message_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, message_id
+
+
+def after_filter(key: tuple[str, str]) -> str:
+    """PostgREST or_() expression: rows strictly after key in (created_at, id) order."""
+    created_at, message_id = key
+    return f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{message_id})'
+
+
+def before_filter(key: tuple[str, str]) -> str:
+    """PostgREST or_() expression: rows strictly before key in (created_at, id) order."""
+    created_at, message_id = key
+    return f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{message_id})'
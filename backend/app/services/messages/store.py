@@ -0,0 +1,211 @@
+"""
+Message persistence + per-user recent-history cache (write-through).
+
+Every messages-table insert goes through insert_messages(): send_message (web), the
+chat pipeline (web replies, WhatsApp), and the photo worker's _deliver_web.
+After the insert it appends the returned rows to the history cache and publishes a
+chat update for web rows, so a reader never sees an older history than a write it
+already observed (read-your-writes).
+
+Reads (GET /chat/history, /chat/updates, /messages) ask MessageHistoryCache first:
+
+  - Redis tier: list ava:msgs:{user_id} (JSON rows, newest MESSAGE_CACHE_ROWS, all
+    channels) + hash ava:msgs:{user_id}:meta {warm, complete, v}. Appends and the
+    version bump run in one Lua script; a fill only commits if no write happened since
+    it read the version, so a slow fill can never overwrite a newer append.
+  - Local tier: TTLCache of (version, rows). A single HGET of the version decides
+    whether the local copy is current — the BullMQ worker appends too, so the local
+    tier cannot be trusted without it.
+
+Ownership: the cache is keyed by the authenticated user's id and every served row is
+re-checked against it (user_id + channel filters, the same predicates RLS applies).
+If Redis is unavailable the cache answers None and callers query PostgREST as before.
+"""
+import json
+import logging
+from datetime import datetime
+
+from app.database import supabase_admin
+from app.redis_client import get_redis
+from app.services.cache.lru import TTLCache
+from app.services.chat_updates import chat_updates
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_FIELDS = "id, user_id, avatar_id, channel, role, content, created_at"
+MESSAGE_CACHE_ROWS = 200     # matches the /messages and /chat/history max page size
+MESSAGE_CACHE_TTL_S = 1800   # idle users fall out of Redis
+
+# KEYS: list, meta. ARGV: cap, ttl, row json...
+_APPEND_LUA = """
+local v = redis.call('HINCRBY', KEYS[2], 'v', 1)
+if redis.call('HGET', KEYS[2], 'warm') == '1' then
+  local n = 0
+  for i = 3, #ARGV do n = redis.call('RPUSH', KEYS[1], ARGV[i]) end
+  if n > tonumber(ARGV[1]) then
+    redis.call('LTRIM', KEYS[1], -tonumber(ARGV[1]), -1)
+    redis.call('HSET', KEYS[2], 'complete', '0')
+  end
+  redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return v
+"""
+
+# KEYS: list, meta. ARGV: expected version, complete flag, ttl, row json...
+_FILL_LUA = """
+local v = redis.call('HGET', KEYS[2], 'v') or '0'
+if v ~= ARGV[1] then return -1 end
+redis.call('DEL', KEYS[1])
+for i = 4, #ARGV do redis.call('RPUSH', KEYS[1], ARGV[i]) end
+redis.call('HSET', KEYS[2], 'warm', '1', 'complete', ARGV[2], 'v', v)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return tonumber(v)
+"""
+
+
+def _sort_key(row: dict) -> tuple[datetime, str]:
+    # PostgREST trims trailing zeros from fractional seconds — compare parsed, not as strings
+    return datetime.fromisoformat(row["created_at"]), row["id"]
+
+
+def _decode_rows(raw: list) -> list[dict]:
+    return sorted((json.loads(r) for r in raw), key=_sort_key)
+
+
+class MessageHistoryCache:
+    def __init__(self, max_users: int = 2000):
+        # user_id -> (version, chronological rows, complete)
+        self._local = TTLCache(maxsize=max_users, ttl_s=MESSAGE_CACHE_TTL_S)
+
+    @staticmethod
+    def _keys(user_id: str) -> tuple[str, str]:
+        return f"ava:msgs:{user_id}", f"ava:msgs:{user_id}:meta"
+
+    async def recent(self, user_id: str, db) -> tuple[list[dict], bool] | None:
+        """
+        Newest cached rows for user_id (all channels, chronological) and whether they are
+        the user's complete history. Fills from `db` (RLS-scoped client) on a miss.
+        None if the cache is unavailable.
+        """
+        list_key, meta_key = self._keys(user_id)
+        committed = None
+        try:
+            redis = get_redis()
+            meta = await redis.hgetall(meta_key)
+            meta = {k.decode(): v.decode() for k, v in meta.items()}
+            version = int(meta.get("v", 0))
+            if meta.get("warm") == "1":
+                local = self._local.get(user_id)
+                if local and local[0] == version:
+                    return local[1], local[2]
+                rows = _decode_rows(await redis.lrange(list_key, 0, -1))
+                complete = meta.get("complete") == "1"
+            else:
+                rows, complete = self._query(user_id, db)
+                committed = await redis.eval(
+                    _FILL_LUA, 2, list_key, meta_key,
+                    str(version), "1" if complete else "0", MESSAGE_CACHE_TTL_S,
+                    *[json.dumps(r) for r in rows],
+                )
+        except Exception as e:
+            logger.warning(f"Message cache unavailable for user {user_id} (reading DB): {e}")
+            return None
+
+        rows = [r for r in rows if r.get("user_id") == user_id]
+        if committed != -1:
+            # committed == -1: the fill raced with a write — serve this read, don't cache it
+            self._local.set(user_id, (version, rows, complete))
+        return rows, complete
+
+    @staticmethod
+    def _query(user_id: str, db) -> tuple[list[dict], bool]:
+        result = (
+            db.from_("messages")
+            .select(MESSAGE_FIELDS)
+            .eq("user_id", user_id)
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(MESSAGE_CACHE_ROWS)
+            .execute()
+        )
+        rows = list(reversed(result.data or []))
+        return rows, len(rows) < MESSAGE_CACHE_ROWS
+
+    async def append(self, user_id: str, rows: list[dict]) -> None:
+        """Write-through for freshly inserted rows (all for the same user)."""
+        list_key, meta_key = self._keys(user_id)
+        try:
+            version = await get_redis().eval(
+                _APPEND_LUA, 2, list_key, meta_key,
+                MESSAGE_CACHE_ROWS, MESSAGE_CACHE_TTL_S,
+                *[json.dumps(r) for r in rows],
+            )
+        except Exception as e:
+            # Other processes may now serve a stale page until MESSAGE_CACHE_TTL_S — drop ours at least
+            logger.error(f"Message cache write-through failed for user {user_id}: {e}")
+            self._local.delete(user_id)
+            return
+        local = self._local.get(user_id)
+        if local and local[0] == int(version) - 1:
+            merged = sorted(local[1] + rows, key=_sort_key)
+            complete = local[2] and len(merged) <= MESSAGE_CACHE_ROWS
+            self._local.set(user_id, (int(version), merged[-MESSAGE_CACHE_ROWS:], complete))
+        else:
+            self._local.delete(user_id)
+
+    async def page(
+        self,
+        user_id: str,
+        db,
+        limit: int,
+        channel: str | None = None,
+        after_key: tuple[str, str] | None = None,
+    ) -> list[dict] | None:
+        """
+        Chronological page for user_id (optionally one channel): rows newer than
+        after_key, or the newest `limit` rows. None when the cache cannot answer
+        exactly (cold/unavailable, or the page reaches past the cached window).
+        """
+        cached = await self.recent(user_id, db)
+        if cached is None:
+            return None
+        rows, complete = cached
+        if after_key:
+            cursor = (datetime.fromisoformat(after_key[0]), after_key[1])
+            if not complete and (not rows or _sort_key(rows[0]) > cursor):
+                return None  # cursor is older than the cached window
+            selected = [r for r in rows if _sort_key(r) > cursor]
+            if channel:
+                selected = [r for r in selected if r["channel"] == channel]
+            return selected[:limit]
+        if channel:
+            rows = [r for r in rows if r["channel"] == channel]
+        if len(rows) < limit and not complete:
+            return None
+        return rows[-limit:] if limit else []
+
+
+message_cache = MessageHistoryCache()
+
+
+async def insert_messages(rows: list[dict]) -> list[dict]:
+    """
+    Insert message rows (service role), write them through to the history cache and
+    wake /chat/updates long-polls for web rows. Returns the inserted rows.
+    Raises on insert failure, like the direct PostgREST calls it replaces.
+    """
+    result = supabase_admin.from_("messages").insert(rows).execute()
+    inserted = result.data or []
+
+    by_user: dict[str, list[dict]] = {}
+    for row in inserted:
+        by_user.setdefault(row["user_id"], []).append(
+            {f.strip(): row.get(f.strip()) for f in MESSAGE_FIELDS.split(",")}
+        )
+    for user_id, user_rows in by_user.items():
+        await message_cache.append(user_id, user_rows)
+        if any(r["channel"] == "web" for r in user_rows):
+            await chat_updates.publish(user_id)
+    return inserted
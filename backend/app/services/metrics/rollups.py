@@ -0,0 +1,318 @@
+"""
+Admin metrics rollups — GET /admin/metrics reads pre-aggregated counters.
+
+Tables and SQL functions come from migrations/009_metrics_rollups.sql:
+
+  - metrics_daily (day, metric): per-day counters, bumped by triggers in the same
+    transaction as each usage_events / auth.users insert. message_sent,
+    photo_generated and new_signup windows are sums of days.
+  - metrics_gauges (metric): current-state values that are not sums of days —
+    active_users (by last sign-in, from Supabase Auth) and active_subscriptions.
+
+reconcile_metrics() rewrites the last METRICS_RECONCILE_DAYS days of metrics_daily
+from source and recomputes the gauges. run_reconcile_loop() runs it every
+METRICS_RECONCILE_INTERVAL_S in the photo worker; a Redis SET NX lock keeps replicas
+from running it concurrently (fails open — reconcile is idempotent).
+
+The active_users gauge needs every auth user. iter_auth_users() pages through
+auth.admin.list_users() (ADMIN_USER_PAGE_SIZE per call) and UserMetricsFold counts
+as it goes, so memory stays at one page whatever the user count; get_user_metrics()
+caches the result for ADMIN_USER_METRICS_TTL_S (in-process + Redis).
+
+Windows are calendar days (UTC) including today, so "d7" is today + the 6 days before.
+
+get_timeseries() serves GET /admin/metrics/timeseries from the same metrics_daily
+rows — one range read per (metric, window), bucketed by day or ISO week and cached.
+"""
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator
+
+from app.config import settings
+from app.database import supabase_admin
+from app.redis_client import get_redis
+from app.services.cache.lru import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_LOCK_KEY = "ava:metrics:reconcile_lock"
+USER_METRICS_KEY = "ava:metrics:user_scan"
+_ZERO = {"d7": 0, "d30": 0, "all": 0}
+
+_user_metrics_local = TTLCache(maxsize=1, ttl_s=settings.admin_user_metrics_ttl_s)
+_user_scan_lock = asyncio.Lock()
+
+
+def _parse_dt(val) -> datetime | None:
+    """Parse datetime from string or datetime object; return None on failure."""
+    if val is None:
+        return None
+    if isinstance(val, datetime):
+        return val.replace(tzinfo=timezone.utc) if val.tzinfo is None else val
+    try:
+        # Supabase returns ISO strings — strip trailing Z, parse
+        return datetime.fromisoformat(str(val).rstrip("Z")).replace(tzinfo=timezone.utc)
+    except Exception:
+        return None
+
+
+async def iter_auth_users(per_page: int | None = None) -> AsyncIterator:
+    """
+    Every Supabase auth user, one list_users() page at a time (blocking call, run off
+    the event loop). Only the current page is held in memory.
+    """
+    per_page = per_page or settings.admin_user_page_size
+    page = 1
+    while True:
+        users = await asyncio.to_thread(supabase_admin.auth.admin.list_users, page=page, per_page=per_page)
+        for user in users:
+            yield user
+        if len(users) < per_page:
+            return
+        page += 1
+
+
+@dataclass
+class UserMetricsFold:
+    """Streaming active_users / new_signups counts — constant memory for any user count."""
+
+    now: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    active: dict = field(default_factory=lambda: dict(_ZERO))
+    new: dict = field(default_factory=lambda: dict(_ZERO))
+
+    def add(self, user) -> None:
+        cutoff_7d = self.now - timedelta(days=7)
+        cutoff_30d = self.now - timedelta(days=30)
+        last_sign = _parse_dt(getattr(user, "last_sign_in_at", None))
+        created = _parse_dt(getattr(user, "created_at", None))
+
+        if last_sign:
+            self.active["all"] += 1
+            if last_sign >= cutoff_30d:
+                self.active["d30"] += 1
+            if last_sign >= cutoff_7d:
+                self.active["d7"] += 1
+        elif created:
+            # New user who has never signed in — count as active at creation time
+            self.active["all"] += 1
+
+        if created:
+            self.new["all"] += 1
+            if created >= cutoff_30d:
+                self.new["d30"] += 1
+            if created >= cutoff_7d:
+                self.new["d7"] += 1
+
+    def result(self) -> dict:
+        return {"active_users": dict(self.active), "new_signups": dict(self.new)}
+
+
+async def compute_user_metrics() -> dict:
+    """Scan every auth user page by page and fold active_users + new_signups. Raises on Auth errors."""
+    fold = UserMetricsFold()
+    async for user in iter_auth_users():
+        fold.add(user)
+    return fold.result()
+
+
+async def get_user_metrics() -> dict:
+    """
+    compute_user_metrics(), cached for ADMIN_USER_METRICS_TTL_S in-process and in Redis.
+    Concurrent callers in a process share one scan; failures are not cached.
+    """
+    cached = _user_metrics_local.get(USER_METRICS_KEY)
+    if cached is not None:
+        return cached
+    async with _user_scan_lock:
+        cached = _user_metrics_local.get(USER_METRICS_KEY)
+        if cached is not None:
+            return cached
+        try:
+            raw = await get_redis().get(USER_METRICS_KEY)
+            cached = json.loads(raw) if raw is not None else None
+        except Exception as e:
+            logger.warning(f"User metrics cache unavailable (scanning Auth): {e}")
+        if cached is None:
+            cached = await compute_user_metrics()
+            try:
+                await get_redis().set(USER_METRICS_KEY, json.dumps(cached), ex=settings.admin_user_metrics_ttl_s)
+            except Exception as e:
+                logger.warning(f"User metrics cache write failed: {e}")
+        _user_metrics_local.set(USER_METRICS_KEY, cached)
+        return cached
+
+
+def _count_active_subscriptions(days: int | None) -> int:
+    """Active subscriptions, optionally only those created in the last `days` days."""
+    query = (
+        supabase_admin.from_("subscriptions")
+        .select("id", count="exact")
+        .eq("status", "active")
+    )
+    if days is not None:
+        query = query.gte("created_at", (datetime.now(timezone.utc) - timedelta(days=days)).isoformat())
+    return query.execute().count or 0
+
+
+def _reconcile_tables(days: int) -> list[dict]:
+    """Rewrite recent metrics_daily rows; return the subscription gauge row. Synchronous."""
+    result = supabase_admin.rpc("reconcile_metrics_daily", {"p_days": days}).execute()
+    logger.info(f"Metrics reconcile: {result.data} daily rollup rows rewritten (last {days} days)")
+    return [{
+        "metric": "active_subscriptions",
+        "d7": _count_active_subscriptions(7),
+        "d30": _count_active_subscriptions(30),
+        "all_time": _count_active_subscriptions(None),
+    }]
+
+
+async def reconcile_metrics(days: int | None = None) -> None:
+    """Rewrite recent metrics_daily rows from source and recompute gauges."""
+    days = settings.metrics_reconcile_days if days is None else days
+    gauges = await asyncio.to_thread(_reconcile_tables, days)
+    try:
+        active_users = (await get_user_metrics())["active_users"]
+        gauges.append({
+            "metric": "active_users",
+            "d7": active_users["d7"],
+            "d30": active_users["d30"],
+            "all_time": active_users["all"],
+        })
+    except Exception as e:
+        # Keep the previous gauge rather than overwrite it with zeros
+        logger.error(f"Metrics reconcile: user scan failed, active_users gauge not updated: {e}")
+    computed_at = datetime.now(timezone.utc).isoformat()
+    for gauge in gauges:
+        gauge["computed_at"] = computed_at
+    await asyncio.to_thread(
+        supabase_admin.from_("metrics_gauges").upsert(gauges, on_conflict="metric").execute
+    )
+
+
+async def run_reconcile_loop() -> None:
+    """Reconcile every METRICS_RECONCILE_INTERVAL_S, once per interval across replicas, forever."""
+    interval = settings.metrics_reconcile_interval_s
+    while True:
+        try:
+            claimed = await get_redis().set(RECONCILE_LOCK_KEY, "1", nx=True, ex=max(1, interval - 5))
+        except Exception as e:
+            logger.warning(f"Metrics reconcile lock unavailable (running anyway): {e}")
+            claimed = True
+        if claimed:
+            try:
+                await reconcile_metrics()
+            except Exception as e:
+                logger.error(f"Metrics reconcile failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def read_metrics_summary() -> dict:
+    """
+    GET /admin/metrics payload from the rollups (one RPC). Synchronous.
+    Metrics with no rollup rows yet (fresh install, gauges before the first
+    reconcile) read as zeros.
+    """
+    summary = supabase_admin.rpc("admin_metrics_summary", {}).execute().data or {}
+    daily = summary.get("daily") or {}
+    gauges = summary.get("gauges") or {}
+
+    def window(source: dict, metric: str) -> dict:
+        row = source.get(metric) or _ZERO
+        return {"d7": row["d7"], "d30": row["d30"], "all": row["all"]}
+
+    computed = [g["computed_at"] for g in gauges.values() if g.get("computed_at")]
+    return {
+        "active_users":         window(gauges, "active_users"),
+        "messages_sent":        window(daily, "message_sent"),
+        "photos_generated":     window(daily, "photo_generated"),
+        "active_subscriptions": window(gauges, "active_subscriptions"),
+        "new_signups":          window(daily, "new_signup"),
+        "gauges_computed_at":   min(computed) if computed else None,
+    }
+
+
+# --- Time series (GET /admin/metrics/timeseries) -----------------------------
+
+# API metric name -> metrics_daily.metric
+TIMESERIES_METRICS = {
+    "messages_sent": "message_sent",
+    "photos_generated": "photo_generated",
+    "new_signups": "new_signup",
+    "active_users": "active_user",
+    "mode_switches": "mode_switch",
+    "subscriptions_created": "subscription_created",
+    "subscriptions_cancelled": "subscription_cancelled",
+}
+# Daily distinct counts — a week is not the sum of its days
+DAY_ONLY_METRICS = {"active_users"}
+BUCKETS = ("day", "week")
+
+_timeseries_cache = TTLCache(maxsize=256, ttl_s=settings.admin_timeseries_ttl_s)
+
+
+def _read_daily(metric: str, start: date, end: date) -> list[dict]:
+    """metrics_daily rows for one metric in [start, end] — one indexed range read. Synchronous."""
+    return (
+        supabase_admin.from_("metrics_daily")
+        .select("day, value")
+        .eq("metric", metric)
+        .gte("day", start.isoformat())
+        .lte("day", end.isoformat())
+        .order("day")
+        .execute()
+    ).data or []
+
+
+def bucket_series(rows: list[dict], start: date, end: date, bucket: str) -> list[dict]:
+    """
+    Dense series over [start, end]: zero-filled days, or ISO weeks (Monday start,
+    clipped to the window). Rows are scattered into a day-indexed array once, then
+    each bucket is a slice sum — O(days), no per-bucket scans.
+    """
+    days = (end - start).days + 1
+    values = [0] * days
+    for row in rows:
+        offset = (date.fromisoformat(str(row["day"])[:10]) - start).days
+        if 0 <= offset < days:
+            values[offset] += int(row["value"])
+
+    if bucket == "day":
+        return [{"start": (start + timedelta(days=i)).isoformat(), "value": v} for i, v in enumerate(values)]
+
+    points = []
+    i = 0
+    while i < days:
+        bucket_start = start + timedelta(days=i)
+        width = 7 - bucket_start.weekday()  # up to the next Monday
+        points.append({"start": bucket_start.isoformat(), "value": sum(values[i:i + width])})
+        i += width
+    return points
+
+
+async def get_timeseries(metric: str, start: date, end: date, bucket: str) -> dict:
+    """
+    Bucketed series for an API metric name, cached per (metric, window, bucket).
+    Windows that reach into the days the reconcile job still rewrites expire after
+    ADMIN_TIMESERIES_TTL_S; older windows are immutable and kept for a day.
+    """
+    key = (metric, start, end, bucket)
+    cached = _timeseries_cache.get(key)
+    if cached is not None:
+        return cached
+
+    rows = await asyncio.to_thread(_read_daily, TIMESERIES_METRICS[metric], start, end)
+    points = bucket_series(rows, start, end, bucket)
+    result = {
+        "metric": metric,
+        "bucket": bucket,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "points": points,
+        "total": sum(p["value"] for p in points) if metric not in DAY_ONLY_METRICS else None,
+    }
+    settled = datetime.now(timezone.utc).date() - timedelta(days=settings.metrics_reconcile_days + 1)
+    _timeseries_cache.set(key, result, ttl_s=None if end >= settled else 86400)
+    return result
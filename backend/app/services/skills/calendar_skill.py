@@ -4,8 +4,9 @@ Handles two intents:
   - calendar_add (SECR-01): parse date/title, check conflicts, create event, confirm
   - calendar_view (SECR-02): list upcoming events as formatted bullet list
 
-Uses Google Calendar API v3 via google-api-python-client.
-All API calls are wrapped in asyncio.to_thread — never blocks the event loop.
+Uses Google Calendar API v3 through the async client in
+app/services/google_auth/calendar_client.py (shared httpx pool, per-user token
+cache with background refresh) — nothing here blocks the event loop.
 
 Conflict confirmation state machine:
   When a conflict is found, _handle_add stores a PendingCalendarAdd on
@@ -14,16 +15,15 @@ Conflict confirmation state machine:
   execute_pending_add() if the user confirmed. This avoids the problem of
   "yes" being classified as 'chat' intent instead of 'calendar_add'.
 """
-import asyncio
 import logging
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 
 import dateparser
 from google.auth.exceptions import RefreshError
-from googleapiclient.discovery import build
 
-from app.services.google_auth.flow import get_credentials_for_user, get_auth_url
+from app.services.google_auth.calendar_client import calendar_client
+from app.services.google_auth.flow import get_auth_url
 from app.services.google_auth.token_store import delete_calendar_tokens
 from app.services.skills.registry import ParsedIntent, Skill, register
 
@@ -61,12 +61,14 @@ async def execute_pending_add(pending: "PendingCalendarAdd") -> str:
     Called by ChatService after the user confirms a conflict warning.
     Returns the confirmation string or an error message.
     """
-    service, error = await _get_service(pending.user_id)
+    error = await _ensure_connected(pending.user_id)
     if error:
         return error
 
     try:
-        await _create_event(service, pending.title, pending.start_dt, pending.end_dt, pending.user_tz)
+        await _create_event(pending.user_id, pending.title, pending.start_dt, pending.end_dt, pending.user_tz)
+    except RefreshError:
+        return await _revoked(pending.user_id)
     except Exception as e:
         logger.error(f"Event creation failed (pending confirm) for {pending.user_id}: {e}")
         return CALENDAR_ERROR_MSG
@@ -107,88 +109,54 @@ def _parse_user_date(date_string: str, user_tz: str) -> datetime | None:
     )
 
 
-async def _get_service(user_id: str):
-    """Load credentials and build Calendar service. Returns (service, error_message).
+async def _revoked(user_id: str) -> str:
+    """Drop tokens Google no longer accepts; return the reconnect prompt."""
+    calendar_client.invalidate(user_id)
+    await delete_calendar_tokens(user_id)
+    return REVOKED_MSG.format(url=get_auth_url())
 
-    Returns (None, error_msg) if not connected or tokens revoked.
-    """
-    try:
-        creds = await get_credentials_for_user(user_id)
-    except RefreshError:
-        await delete_calendar_tokens(user_id)
-        url = get_auth_url()
-        return None, REVOKED_MSG.format(url=url)
 
-    if creds is None:
-        url = get_auth_url()
-        return None, NOT_CONNECTED_MSG.format(url=url)
+async def _ensure_connected(user_id: str) -> str | None:
+    """Make sure user_id has a usable Calendar token. Returns an error message, or None.
 
+    The token is cached by calendar_client, so the API calls that follow reuse it.
+    """
     try:
-        service = await asyncio.to_thread(build, "calendar", "v3", credentials=creds)
-        return service, None
+        token = await calendar_client.get_token(user_id)
+    except RefreshError:
+        return await _revoked(user_id)
     except Exception as e:
-        logger.error(f"Failed to build Calendar service for {user_id}: {e}")
-        return None, CALENDAR_ERROR_MSG
+        logger.error(f"Failed to load Calendar credentials for {user_id}: {e}")
+        return CALENDAR_ERROR_MSG
 
+    if token is None:
+        return NOT_CONNECTED_MSG.format(url=get_auth_url())
+    return None
 
-async def _check_conflicts(service, start_dt: datetime, end_dt: datetime) -> list[dict]:
-    """Return events overlapping [start_dt, end_dt) on the primary calendar."""
-    def _query():
-        result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=start_dt.isoformat(),
-                timeMax=end_dt.isoformat(),
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        return result.get("items", [])
 
+async def _check_conflicts(user_id: str, start_dt: datetime, end_dt: datetime) -> list[dict]:
+    """Return events overlapping [start_dt, end_dt) on the primary calendar."""
     try:
-        return await asyncio.to_thread(_query)
+        return await calendar_client.list_events(user_id, start_dt, end_dt)
     except Exception as e:
         logger.error(f"Conflict check failed: {e}")
         return []
 
 
-async def _create_event(service, title: str, start_dt: datetime, end_dt: datetime, user_tz: str) -> dict:
-    """Create a calendar event. Runs synchronous insert in thread pool."""
+async def _create_event(user_id: str, title: str, start_dt: datetime, end_dt: datetime, user_tz: str) -> dict:
+    """Create a calendar event on the user's primary calendar."""
     event_body = {
         "summary": title,
         "start": {"dateTime": start_dt.isoformat(), "timeZone": user_tz},
         "end": {"dateTime": end_dt.isoformat(), "timeZone": user_tz},
     }
-
-    def _insert():
-        return service.events().insert(calendarId="primary", body=event_body).execute()
-
-    return await asyncio.to_thread(_insert)
+    return await calendar_client.insert_event(user_id, event_body)
 
 
-async def _list_events(service, max_results: int = 10) -> list[dict]:
+async def _list_events(user_id: str, max_results: int = 10) -> list[dict]:
     """List upcoming events from now + 7 days."""
     now = datetime.now(timezone.utc)
-    week_out = now + timedelta(days=7)
-
-    def _query():
-        result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=now.isoformat(),
-                timeMax=week_out.isoformat(),
-                maxResults=max_results,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        return result.get("items", [])
-
-    return await asyncio.to_thread(_query)
+    return await calendar_client.list_events(user_id, now, now + timedelta(days=7), max_results=max_results)
 
 
 class CalendarSkill:
@@ -252,14 +220,14 @@ class CalendarSkill:
         # Default event duration: 1 hour
         end_dt = start_dt + timedelta(hours=1)
 
-        # --- Load Calendar service ---
-        service, error = await _get_service(user_id)
+        # --- Check Calendar connection ---
+        error = await _ensure_connected(user_id)
         if error:
             return error
 
         # --- Conflict detection ---
         try:
-            conflicts = await _check_conflicts(service, start_dt, end_dt)
+            conflicts = await _check_conflicts(user_id, start_dt, end_dt)
             if conflicts:
                 conflicting_title = conflicts[0].get("summary", "another event")
                 # Store pending add in session for confirmation on next message.
@@ -285,7 +253,9 @@ class CalendarSkill:
 
         # --- Create event ---
         try:
-            await _create_event(service, intent.extracted_title, start_dt, end_dt, user_tz)
+            await _create_event(user_id, intent.extracted_title, start_dt, end_dt, user_tz)
+        except RefreshError:
+            return await _revoked(user_id)
         except Exception as e:
             logger.error(f"Event creation failed for {user_id}: {e}")
             return CALENDAR_ERROR_MSG
@@ -297,12 +267,14 @@ class CalendarSkill:
 
     async def _handle_view(self, user_id: str, user_tz: str) -> str:
         """List upcoming events (SECR-02)."""
-        service, error = await _get_service(user_id)
+        error = await _ensure_connected(user_id)
         if error:
             return error
 
         try:
-            events = await _list_events(service)
+            events = await _list_events(user_id)
+        except RefreshError:
+            return await _revoked(user_id)
         except Exception as e:
             logger.error(f"Event listing failed for {user_id}: {e}")
             return CALENDAR_ERROR_MSG
@@ -0,0 +1,171 @@
+"""
+Shared signed-URL service for private Supabase Storage objects.
+
+Every photo the frontend or WhatsApp sees is a short-lived signed URL generated from
+a permanent storage path. Previously chat history signed paths one request at a time
+into a never-evicted dict, GET /avatars/me re-signed the reference image on every
+3s poll, and the worker signed again for WhatsApp. SignedUrlService centralises this:
+
+  1. Local tier — bounded TTLCache (per process).
+  2. Redis tier (optional, SIGNED_URL_REDIS_CACHE) — shared by all API workers and
+     the BullMQ worker so a path is signed once per validity window, not per process.
+  3. Bulk sign — all misses for a call go to Storage in ONE create_signed_urls request.
+  4. Single-flight — concurrent callers asking for a path already being signed await
+     that in-flight request instead of issuing their own.
+
+Cached URLs are only served while at least `refresh_before_s` of validity remains,
+so a URL handed out is always good for that long.
+"""
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.database import supabase_admin
+from app.redis_client import get_redis
+from app.services.cache.lru import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class SignedUrlService:
+    """Signs storage paths in one bucket, with two cache tiers and request coalescing."""
+
+    def __init__(
+        self,
+        bucket: str,
+        ttl_s: int = 3600,
+        refresh_before_s: int = 600,
+        maxsize: int = 4096,
+        use_redis: bool = True,
+    ):
+        self.bucket = bucket
+        self.ttl_s = ttl_s
+        self.refresh_before_s = refresh_before_s
+        self.use_redis = use_redis
+        # Serve a cached URL only while >= refresh_before_s of its validity remains
+        self._cache_ttl_s = ttl_s - refresh_before_s
+        self._local = TTLCache(maxsize=maxsize, ttl_s=self._cache_ttl_s)
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _redis_key(self, path: str) -> str:
+        return f"ava:signed_url:{self.bucket}:{path}"
+
+    async def sign(self, path: str) -> str | None:
+        """Signed URL for one path, or None if signing failed."""
+        return (await self.sign_many([path])).get(path)
+
+    async def sign_many(self, paths: list[str]) -> dict[str, str]:
+        """Signed URLs for `paths` (deduplicated). Paths that failed to sign are omitted."""
+        result: dict[str, str] = {}
+        missing: list[str] = []
+        for path in dict.fromkeys(paths):
+            url = self._local.get(path)
+            if url:
+                result[path] = url
+            else:
+                missing.append(path)
+
+        if missing and self.use_redis:
+            missing = await self._fill_from_redis(missing, result)
+        if not missing:
+            return result
+
+        # Single-flight: join requests already signing a path, own the rest
+        loop = asyncio.get_running_loop()
+        waiting: dict[str, asyncio.Future] = {}
+        owned: list[str] = []
+        for path in missing:
+            if path in self._inflight:
+                waiting[path] = self._inflight[path]
+            else:
+                self._inflight[path] = loop.create_future()
+                owned.append(path)
+
+        if owned:
+            signed: dict[str, str] = {}
+            try:
+                signed = await self._bulk_sign(owned)
+            finally:
+                # Always resolve — waiters must never hang on a cancelled or failed owner
+                for path in owned:
+                    future = self._inflight.pop(path)
+                    if not future.done():
+                        future.set_result(signed.get(path))
+            result.update(signed)
+            await self._store(signed)
+
+        for path, future in waiting.items():
+            url = await future
+            if url:
+                result[path] = url
+        return result
+
+    async def sign_fresh(self, path: str) -> str | None:
+        """
+        Newly signed URL valid for the full ttl_s, bypassing both cache tiers — for
+        links sent somewhere that states their lifetime (WhatsApp). Cached afterwards.
+        """
+        signed = await self._bulk_sign([path])
+        await self._store(signed)
+        return signed.get(path)
+
+    def invalidate(self, path: str) -> None:
+        """Drop a path from the local tier (Redis entries expire on their own)."""
+        self._local.delete(path)
+
+    async def _fill_from_redis(self, paths: list[str], result: dict[str, str]) -> list[str]:
+        try:
+            values = await get_redis().mget([self._redis_key(p) for p in paths])
+        except Exception as e:
+            logger.warning(f"Signed URL Redis tier unavailable (signing directly): {e}")
+            return paths
+        now = time.time()
+        still_missing = []
+        for path, value in zip(paths, values):
+            # Stored as "<serve_until epoch> <url>" so the local tier expires in step with Redis
+            serve_until, _, url = (value.decode() if isinstance(value, bytes) else value or "").partition(" ")
+            remaining = float(serve_until or 0) - now
+            if url and remaining > 0:
+                result[path] = url
+                self._local.set(path, url, ttl_s=remaining)
+            else:
+                still_missing.append(path)
+        return still_missing
+
+    async def _bulk_sign(self, paths: list[str]) -> dict[str, str]:
+        try:
+            items = await asyncio.to_thread(
+                supabase_admin.storage.from_(self.bucket).create_signed_urls,
+                paths,
+                self.ttl_s,
+            )
+        except Exception as e:
+            logger.error(f"SignedUrlService: bulk sign of {len(paths)} path(s) failed: {e}")
+            return {}
+        signed = {}
+        for item in items:
+            url = item.get("signedURL") or item.get("signedUrl")
+            if url and not item.get("error"):
+                signed[item["path"]] = url
+            else:
+                logger.error(f"SignedUrlService: no URL for {item.get('path')!r}: {item.get('error')}")
+        return signed
+
+    async def _store(self, signed: dict[str, str]) -> None:
+        for path, url in signed.items():
+            self._local.set(path, url)
+        if not signed or not self.use_redis:
+            return
+        try:
+            serve_until = int(time.time()) + self._cache_ttl_s
+            pipe = get_redis().pipeline(transaction=False)
+            for path, url in signed.items():
+                pipe.set(self._redis_key(path), f"{serve_until} {url}", ex=self._cache_ttl_s)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Signed URL Redis write failed (non-fatal): {e}")
+
+
+# Module-level singleton for the private photos bucket (reference images + generated photos)
+photo_urls = SignedUrlService("photos", use_redis=settings.signed_url_redis_cache)
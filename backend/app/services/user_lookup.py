@@ -1,28 +1,97 @@
-from app.database import supabase_admin
+"""
+User lookups for server-to-server contexts (WhatsApp webhook, chat worker).
+
+Phone -> user_id is cached because every inbound WhatsApp message needs it:
+
+  - Local tier: TTLCache, positive hits only, PHONE_LOOKUP_LOCAL_TTL_S (short — other
+    processes cannot evict it, so this bounds how long a re-linked number can route
+    to its previous owner).
+  - Redis tier: ava:phone_user:{phone} = user_id for PHONE_LOOKUP_TTL_S, or "-" for
+    an unlinked number for PHONE_LOOKUP_NEGATIVE_TTL_S, so spam from unknown numbers
+    does not reach the database on every message.
+
+PUT /preferences/whatsapp calls invalidate_phone_lookup() for the old and new number;
+negative entries only ever live in Redis, so a freshly linked number is recognised on
+the very next message. Lookup errors are never cached.
+"""
 import logging
 
+from app.config import settings
+from app.database import supabase_admin
+from app.redis_client import get_redis
+from app.services.cache.lru import TTLCache
+
 logger = logging.getLogger(__name__)
 
+_UNLINKED = "-"
+_phone_local = TTLCache(maxsize=10000, ttl_s=settings.phone_lookup_local_ttl_s)
+
+
+def _phone_key(phone: str) -> str:
+    return f"ava:phone_user:{phone}"
+
 
 async def lookup_user_by_phone(phone: str) -> dict | None:
-    """Find user by linked WhatsApp phone. Returns user_preferences row or None.
+    """Find user by linked WhatsApp phone. Returns {"user_id": ...} or None.
 
     Uses service role client (supabase_admin) — webhook is server-to-server,
     no user JWT exists in this context. RLS bypass is intentional here.
+    Served from the local/Redis cache when possible (see module docstring).
     """
+    user_id = _phone_local.get(phone)
+    if user_id:
+        return {"user_id": user_id}
+
+    try:
+        cached = await get_redis().get(_phone_key(phone))
+    except Exception as e:
+        logger.warning(f"Phone lookup cache unavailable for {phone} (querying DB): {e}")
+        cached = None
+    if cached is not None:
+        cached = cached.decode() if isinstance(cached, bytes) else cached
+        if cached == _UNLINKED:
+            return None
+        _phone_local.set(phone, cached)
+        return {"user_id": cached}
+
     try:
         result = (
             supabase_admin
             .from_("user_preferences")
             .select("user_id")
             .eq("whatsapp_phone", phone)
-            .single()
+            .limit(1)
             .execute()
         )
-        return result.data if result.data else None
     except Exception as e:
         logger.error(f"Phone lookup failed for {phone}: {e}")
         return None
+    user_id = result.data[0]["user_id"] if result.data else None
+
+    try:
+        if user_id:
+            await get_redis().set(_phone_key(phone), user_id, ex=settings.phone_lookup_ttl_s)
+        else:
+            await get_redis().set(_phone_key(phone), _UNLINKED, ex=settings.phone_lookup_negative_ttl_s)
+    except Exception as e:
+        logger.warning(f"Phone lookup cache write failed for {phone}: {e}")
+    if user_id:
+        _phone_local.set(phone, user_id)
+        return {"user_id": user_id}
+    return None
+
+
+async def invalidate_phone_lookup(*phones: str | None) -> None:
+    """Forget cached lookups for these numbers (call after linking/unlinking a phone)."""
+    phones = tuple(p for p in phones if p)
+    for phone in phones:
+        _phone_local.delete(phone)
+    if not phones:
+        return
+    try:
+        await get_redis().delete(*(_phone_key(p) for p in phones))
+    except Exception as e:
+        logger.error(f"Phone lookup invalidation failed for {phones}: {e}")
 
 
 async def get_avatar_for_user(user_id: str) -> dict | None:
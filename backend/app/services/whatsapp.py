@@ -1,10 +1,72 @@
-import httpx
 import logging
 from app.config import settings
+from app.redis_client import get_redis
+from app.services.whatsapp_sender import GRAPH_API_VERSION, whatsapp_sender  # noqa: F401
 
 logger = logging.getLogger(__name__)
 
-GRAPH_API_VERSION = "v19.0"
+
+def _inbound_key(message_id: str) -> str:
+    return f"ava:wa_inbound:{message_id}"
+
+
+async def claim_inbound_message(message_id: str) -> bool:
+    """Claim an inbound WhatsApp message id (messages[].id, "wamid...") for processing.
+
+    Meta redelivers a message when our webhook is slow or errors, possibly to a
+    different API/chat worker while the first delivery is still running. SET NX makes
+    exactly one caller win across every process; the rest get False and must drop it.
+
+    The claim first lives only WHATSAPP_CLAIM_TTL_S (about the chat worker's job lock
+    duration), so if the worker dies mid-message, BullMQ's stalled-job re-run or a
+    Meta redelivery can claim it again. complete_inbound_message() turns it into the
+    WHATSAPP_DEDUP_TTL_S "done" key — longer than Meta's retry window — once the
+    reply is sent.
+
+    Fails open: if Redis is down the message is processed (a rare duplicate reply
+    beats silently losing the message).
+    """
+    try:
+        claimed = await get_redis().set(
+            _inbound_key(message_id), "processing", nx=True, ex=settings.whatsapp_claim_ttl_s,
+        )
+    except Exception as e:
+        logger.warning(f"WhatsApp dedup unavailable for {message_id} (processing anyway): {e}")
+        return True
+    return bool(claimed)
+
+
+async def complete_inbound_message(message_id: str) -> None:
+    """Mark a claimed message done: redeliveries are dropped for WHATSAPP_DEDUP_TTL_S."""
+    try:
+        await get_redis().set(_inbound_key(message_id), "done", ex=settings.whatsapp_dedup_ttl_s)
+    except Exception as e:
+        logger.warning(f"WhatsApp dedup completion failed for {message_id}: {e}")
+
+
+async def release_inbound_message(message_id: str) -> None:
+    """Drop a claim whose processing failed before a reply was sent, so a redelivery can retry."""
+    try:
+        await get_redis().delete(_inbound_key(message_id))
+    except Exception as e:
+        logger.warning(f"WhatsApp dedup release failed for {message_id}: {e}")
+
+
+async def allow_unlinked_reply(phone: str) -> bool:
+    """True at most once per UNLINKED_REPLY_INTERVAL_S for an unlinked sender.
+
+    Spam from an unknown number gets one registration reply per window instead of one
+    per message (the phone lookup itself is negatively cached in user_lookup).
+    Fails open, like claim_inbound_message.
+    """
+    try:
+        allowed = await get_redis().set(
+            f"ava:wa_unlinked_reply:{phone}", "1", nx=True, ex=settings.unlinked_reply_interval_s,
+        )
+    except Exception as e:
+        logger.warning(f"Unlinked-sender rate limit unavailable for {phone}: {e}")
+        return True
+    return bool(allowed)
 
 
 async def send_whatsapp_template(phone_number_id: str, to: str, template_name: str, language: str = "en_US") -> None:
@@ -12,74 +74,21 @@ async def send_whatsapp_template(phone_number_id: str, to: str, template_name: s
 
     Required for first contact — free-form messages need the 24h session window.
     Template must be approved in Meta Business Manager before calling this.
+    Sent through the pooled, rate-limited whatsapp_sender (retries 429 and
+    connect/pool errors only).
     """
-    url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{phone_number_id}/messages"
-    headers = {
-        "Authorization": f"Bearer {settings.whatsapp_access_token}",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to,
-        "type": "template",
-        "template": {
-            "name": template_name,
-            "language": {"code": language},
-        },
-    }
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        logger.info(f"WhatsApp template '{template_name}' sent to {to}")
+    await whatsapp_sender.send_template(phone_number_id, to, template_name, language)
+    logger.info(f"WhatsApp template '{template_name}' sent to {to}")
 
 
 async def send_whatsapp_message(phone_number_id: str, to: str, text: str) -> None:
     """Send a text message via Meta Cloud API.
 
-    Raises httpx.HTTPStatusError on API errors. Callers must catch.
+    Sent through the pooled, rate-limited whatsapp_sender, which retries 429 and
+    connect/pool errors only — a 5xx may mean Meta already accepted the message.
+    Raises httpx.HTTPStatusError on permanent or exhausted errors. Callers must catch.
     Always pin to GRAPH_API_VERSION — Meta deprecates old versions.
     """
-    url = f"https://graph.facebook.com/{GRAPH_API_VERSION}/{phone_number_id}/messages"
-    headers = {
-        "Authorization": f"Bearer {settings.whatsapp_access_token}",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "messaging_product": "whatsapp",
-        "recipient_type": "individual",
-        "to": to,
-        "type": "text",
-        "text": {"body": text},
-    }
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        logger.info(f"WhatsApp message sent to {to}: {text[:50]}")
-
-
-def parse_incoming_message(body: dict) -> dict | None:
-    """
-    Parse a Meta webhook payload and extract message details.
+    await whatsapp_sender.send_text(phone_number_id, to, text)
+    logger.info(f"WhatsApp message sent to {to}: {text[:50]}")
 
-    Returns a dict with sender_phone, incoming_text, phone_number_id,
-    or None if the payload doesn't contain a text message.
-    """
-    try:
-        entry = body["entry"][0]
-        changes = entry["changes"][0]
-        value = changes["value"]
-
-        if "messages" not in value:
-            return None
-
-        message = value["messages"][0]
-        if message.get("type") != "text":
-            return None
-
-        return {
-            "sender_phone": message["from"],
-            "incoming_text": message["text"]["body"],
-            "phone_number_id": value["metadata"]["phone_number_id"],
-        }
-    except (KeyError, IndexError):
-        return None
@@ -0,0 +1,241 @@
+"""
+Outbound WhatsApp sender — one pooled HTTP/2 client, per-number rate limit, retries.
+
+Every outbound Graph API call (chat replies, photo deliveries, failure notices, the
+opt-in template) goes through the module-level `whatsapp_sender`, so a process keeps
+one connection pool to graph.facebook.com instead of a TLS handshake per message.
+
+  - Rate limit: a token bucket per phone_number_id (WHATSAPP_SEND_RATE_PER_S, burst
+    WHATSAPP_SEND_BURST) keeps us under Meta's per-number throughput cap; callers wait
+    for a token instead of being rejected with 429. The bucket lives in Redis
+    (ava:wa_send_bucket:{phone_number_id}, one Lua call per token) so the API workers,
+    the chat worker and the photo worker share one budget. If Redis is unreachable a
+    process falls back to a local bucket at 1/WHATSAPP_SEND_PROCESSES of the rate.
+  - Retries: sends are POSTs, so only failures where Meta cannot have accepted the
+    message are retried — 429 and errors before the request went out (connect
+    error/timeout, no pooled connection) — with exponential backoff + jitter
+    (Retry-After honoured), up to WHATSAPP_SEND_MAX_ATTEMPTS. A 5xx, read timeout or
+    dropped connection may follow a delivered message, so it raises at once rather
+    than risk a duplicate.
+  - Batches: send_text_many() fans a list out through the same bucket and pool and
+    returns per-message outcomes instead of failing the whole batch.
+
+HTTP/2 needs the optional `h2` package (httpx[http2]); without it the client falls
+back to pooled HTTP/1.1.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Callable
+
+import httpx
+
+from app.config import settings
+from app.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+GRAPH_API_VERSION = "v19.0"
+GRAPH_API_BASE = f"https://graph.facebook.com/{GRAPH_API_VERSION}"
+
+RETRYABLE_STATUS = {429}
+# Raised before the request reached Meta — safe to resend
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+MAX_BACKOFF_S = 8.0
+
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens/s refill, at most `burst` banked. Single event loop."""
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# KEYS: bucket hash. ARGV: rate, burst. Takes one token; returns the wait in seconds
+# before retrying ("0" = token granted). Redis TIME keeps every process on one clock.
+_TAKE_TOKEN_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class SharedTokenBucket:
+    """
+    Token bucket shared by every process through Redis. Falls back to `local`
+    (a per-process bucket at a fraction of the rate) while Redis is unreachable.
+    """
+
+    def __init__(self, key: str, rate: float, burst: int, local: TokenBucket):
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+        self.local = local
+
+    async def acquire(self) -> None:
+        while True:
+            try:
+                wait = float(await get_redis().eval(_TAKE_TOKEN_LUA, 1, self.key, self.rate, self.burst))
+            except Exception as e:
+                logger.warning(f"Shared WhatsApp rate limit unavailable (local share of the rate): {e}")
+                await self.local.acquire()
+                return
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class WhatsAppSender:
+    def __init__(
+        self,
+        rate_per_s: float | None = None,
+        burst: int | None = None,
+        max_attempts: int | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.rate_per_s = rate_per_s or settings.whatsapp_send_rate_per_s
+        self.burst = burst or settings.whatsapp_send_burst
+        self.max_attempts = max_attempts or settings.whatsapp_send_max_attempts
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+        self._buckets: dict[str, SharedTokenBucket] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # httpx clients are bound to the loop that opened their connections
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=GRAPH_API_BASE,
+                http2=_HTTP2 and self._transport is None,
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                transport=self._transport,
+            )
+            self._client_loop = loop
+        return self._client
+
+    def _bucket(self, phone_number_id: str) -> SharedTokenBucket:
+        bucket = self._buckets.get(phone_number_id)
+        if bucket is None:
+            processes = max(1, settings.whatsapp_send_processes)
+            local = TokenBucket(self.rate_per_s / processes, max(1, self.burst // processes))
+            bucket = self._buckets[phone_number_id] = SharedTokenBucket(
+                f"ava:wa_send_bucket:{phone_number_id}", self.rate_per_s, self.burst, local,
+            )
+        return bucket
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _backoff(attempt: int, response: httpx.Response | None) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_BACKOFF_S)
+            except ValueError:
+                pass
+        return min(0.5 * 2 ** attempt, MAX_BACKOFF_S) * random.uniform(0.5, 1.0)
+
+    async def post_message(self, phone_number_id: str, payload: dict) -> dict:
+        """
+        POST /{phone_number_id}/messages with rate limiting and retries.
+        Returns the Graph API JSON. Raises httpx.HTTPStatusError / httpx.TransportError
+        once retries are exhausted, or at once on an error that is unsafe to retry.
+        Callers must catch.
+        """
+        client = self._get_client()
+        bucket = self._bucket(phone_number_id)
+        headers = {"Authorization": f"Bearer {settings.whatsapp_access_token}"}
+        for attempt in range(self.max_attempts):
+            await bucket.acquire()
+            response = None
+            try:
+                response = await client.post(f"/{phone_number_id}/messages", headers=headers, json=payload)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+                error: Exception = httpx.HTTPStatusError(
+                    f"Graph API {response.status_code}", request=response.request, response=response,
+                )
+            except RETRYABLE_ERRORS as e:
+                error = e
+            if attempt + 1 == self.max_attempts:
+                raise error
+            delay = self._backoff(attempt, response)
+            logger.warning(
+                f"WhatsApp send to {payload.get('to')} failed ({error}); "
+                f"retry {attempt + 1}/{self.max_attempts - 1} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+    async def send_text(self, phone_number_id: str, to: str, text: str) -> dict:
+        return await self.post_message(phone_number_id, {
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": to,
+            "type": "text",
+            "text": {"body": text},
+        })
+
+    async def send_template(self, phone_number_id: str, to: str, template_name: str, language: str = "en_US") -> dict:
+        return await self.post_message(phone_number_id, {
+            "messaging_product": "whatsapp",
+            "to": to,
+            "type": "template",
+            "template": {
+                "name": template_name,
+                "language": {"code": language},
+            },
+        })
+
+    async def send_text_many(
+        self, phone_number_id: str, messages: list[tuple[str, str]],
+    ) -> list[Exception | None]:
+        """Send (to, text) pairs concurrently; returns None or the final exception for each."""
+        results = await asyncio.gather(
+            *(self.send_text(phone_number_id, to, text) for to, text in messages),
+            return_exceptions=True,
+        )
+        return [r if isinstance(r, Exception) else None for r in results]
+
+
+# Module-level singleton — one pool per process; rate buckets are shared through Redis
+whatsapp_sender = WhatsAppSender()
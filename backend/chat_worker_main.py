@@ -0,0 +1,75 @@
+"""
+BullMQ chat worker entry point.
+
+Run as a separate Docker service:
+  CMD: python chat_worker_main.py
+
+Consumes the 'chat_messages' queue (web replies, inbound WhatsApp messages, avatar
+refreshes — see app/services/jobs/chat_queue.py) so the API only persists and
+enqueues. Like worker_main.py it never imports or starts FastAPI.
+
+Also consumes 'stripe_events' (verified Stripe webhook events — see
+app/services/jobs/billing_queue.py), STRIPE_WORKER_CONCURRENCY at a time, and runs
+the email outbox sender (app/services/email/outbox.py).
+
+Concurrency: CHAT_WORKER_CONCURRENCY (default 16) jobs at once — chat jobs are I/O
+bound (OpenAI, Meta, PostgREST). Messages from the same user are still handled one
+at a time (chat_pipeline.user_lock).
+
+Run ONE replica: SessionStore (conversation mode + history) is in-memory, so every
+message for a user must reach the same process.
+"""
+import asyncio
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s — %(message)s",
+)
+logger = logging.getLogger("ava.chat_worker")
+
+
+async def main() -> None:
+    # Deferred imports ensure env vars (loaded by app.config) are available
+    from bullmq import Worker
+    from app.config import settings
+    from app.services.email.outbox import run_outbox_loop
+    from app.services.jobs.billing_processor import process_billing_job
+    from app.services.jobs.billing_queue import BILLING_QUEUE
+    from app.services.jobs.chat_processor import process_chat_job
+    from app.services.jobs.chat_queue import CHAT_QUEUE
+    from app.services.jobs.queue import bullmq_connection
+
+    connection = bullmq_connection()
+    logger.info(
+        f"Chat worker starting — Redis {connection['host']}:{connection['port']} "
+        f"concurrency={settings.chat_worker_concurrency}"
+    )
+
+    Worker(
+        CHAT_QUEUE,
+        process_chat_job,
+        {
+            "connection": connection,
+            "concurrency": settings.chat_worker_concurrency,
+        },
+    )
+
+    Worker(
+        BILLING_QUEUE,
+        process_billing_job,
+        {
+            "connection": connection,
+            "concurrency": settings.stripe_worker_concurrency,
+        },
+    )
+
+    asyncio.ensure_future(run_outbox_loop())
+
+    logger.info(f"Chat worker ready — listening for {CHAT_QUEUE} and {BILLING_QUEUE} jobs...")
+    # Block forever — process killed by Docker stop signal
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
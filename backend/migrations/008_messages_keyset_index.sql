@@ -0,0 +1,21 @@
+-- =============================================================================
+-- Migration: 008_messages_keyset_index
+-- Date:      2026-10-19
+-- Description:
+--   Adds a (user_id, created_at DESC, id DESC) index on messages.
+--   GET /messages, /messages/export and /chat/history page with a keyset
+--   cursor on (created_at, id). idx_messages_user_created covers created_at
+--   only, so the id tie-break needed a sort step on every page; with id in the
+--   index each page is a single bounded index range scan in either direction.
+--   idx_messages_user_created becomes redundant and is dropped.
+--
+-- How to apply:
+--   Supabase Dashboard → SQL Editor → paste → Run
+--   OR: psql "postgresql://..." -f migrations/008_messages_keyset_index.sql
+--   (CREATE INDEX CONCURRENTLY cannot run inside a transaction block — run as-is.)
+-- =============================================================================
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_user_created_id
+  ON public.messages (user_id, created_at DESC, id DESC);
+
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_messages_user_created;
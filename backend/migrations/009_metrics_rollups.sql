@@ -0,0 +1,178 @@
+-- =============================================================================
+-- Migration: 009_metrics_rollups
+-- Date:      2026-10-19
+-- Description:
+--   Pre-aggregated admin metrics, so GET /admin/metrics no longer counts
+--   usage_events / subscriptions / auth users on every request.
+--
+--   metrics_daily (day, metric) -> value
+--     Incremented in the same transaction as the write it counts:
+--       - every usage_events insert bumps metric = event_type
+--         ('message_sent', 'photo_generated', 'mode_switch', 'subscription_created', ...)
+--       - every auth.users insert bumps metric = 'new_signup'
+--     'active_user' (distinct users with a usage event that day) is filled by
+--     reconcile_metrics_daily(), which also rewrites recent days from source so
+--     any drift (manual deletes, failed backfills) heals on the next run.
+--
+--   metrics_gauges (metric) -> d7 / d30 / all_time
+--     Current-state values that are not sums of days (active users by last
+--     sign-in, active subscriptions). Written by the backend reconcile job
+--     (app/services/metrics/rollups.py), which runs in the photo worker.
+--
+--   admin_metrics_summary() returns everything GET /admin/metrics needs in one
+--   round trip. Functions are service-role only.
+--
+-- How to apply:
+--   Supabase Dashboard → SQL Editor → paste → Run
+--   OR: psql "postgresql://..." -f migrations/009_metrics_rollups.sql
+--   Safe to re-run. The final SELECT backfills metrics_daily from all history.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.metrics_daily (
+  day        DATE        NOT NULL,
+  metric     TEXT        NOT NULL,
+  value      BIGINT      NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (metric, day)
+);
+
+CREATE TABLE IF NOT EXISTS public.metrics_gauges (
+  metric      TEXT        PRIMARY KEY,
+  d7          BIGINT      NOT NULL DEFAULT 0,
+  d30         BIGINT      NOT NULL DEFAULT 0,
+  all_time    BIGINT      NOT NULL DEFAULT 0,
+  computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- RLS on, no policies: service role only (same as usage_events)
+ALTER TABLE public.metrics_daily ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.metrics_gauges ENABLE ROW LEVEL SECURITY;
+
+-- -----------------------------------------------------------------------------
+-- Incremental counters
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.bump_metric_daily(p_metric TEXT, p_at TIMESTAMPTZ)
+RETURNS VOID
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  INSERT INTO public.metrics_daily (day, metric, value)
+  VALUES ((p_at AT TIME ZONE 'UTC')::date, p_metric, 1)
+  ON CONFLICT (metric, day)
+  DO UPDATE SET value = metrics_daily.value + 1, updated_at = NOW();
+$$;
+
+CREATE OR REPLACE FUNCTION public.usage_events_rollup()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  PERFORM public.bump_metric_daily(NEW.event_type, NEW.created_at);
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS usage_events_rollup ON public.usage_events;
+CREATE TRIGGER usage_events_rollup
+  AFTER INSERT ON public.usage_events
+  FOR EACH ROW EXECUTE FUNCTION public.usage_events_rollup();
+
+CREATE OR REPLACE FUNCTION public.auth_users_rollup()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  PERFORM public.bump_metric_daily('new_signup', NEW.created_at);
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS auth_users_rollup ON auth.users;
+CREATE TRIGGER auth_users_rollup
+  AFTER INSERT ON auth.users
+  FOR EACH ROW EXECUTE FUNCTION public.auth_users_rollup();
+
+-- -----------------------------------------------------------------------------
+-- Reconcile: rewrite the last p_days days (NULL = all history) from source
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.reconcile_metrics_daily(p_days INT DEFAULT 3)
+RETURNS INT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  since_day DATE := CASE
+    WHEN p_days IS NULL THEN DATE '1970-01-01'
+    ELSE (NOW() AT TIME ZONE 'UTC')::date - p_days
+  END;
+  written INT;
+BEGIN
+  WITH counts AS (
+    SELECT (created_at AT TIME ZONE 'UTC')::date AS day, event_type AS metric, COUNT(*) AS value
+      FROM public.usage_events
+     WHERE created_at >= since_day
+     GROUP BY 1, 2
+    UNION ALL
+    SELECT (created_at AT TIME ZONE 'UTC')::date, 'active_user', COUNT(DISTINCT user_id)
+      FROM public.usage_events
+     WHERE created_at >= since_day AND user_id IS NOT NULL
+     GROUP BY 1
+    UNION ALL
+    SELECT (created_at AT TIME ZONE 'UTC')::date, 'new_signup', COUNT(*)
+      FROM auth.users
+     WHERE created_at >= since_day
+     GROUP BY 1
+  )
+  INSERT INTO public.metrics_daily (day, metric, value)
+  SELECT day, metric, value FROM counts
+  ON CONFLICT (metric, day)
+  DO UPDATE SET value = EXCLUDED.value, updated_at = NOW();
+  GET DIAGNOSTICS written = ROW_COUNT;
+  RETURN written;
+END;
+$$;
+
+-- -----------------------------------------------------------------------------
+-- One-round-trip read for GET /admin/metrics
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.admin_metrics_summary()
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH today AS (SELECT (NOW() AT TIME ZONE 'UTC')::date AS d),
+  sums AS (
+    SELECT metric,
+           SUM(value) FILTER (WHERE day > (SELECT d FROM today) - 7)  AS d7,
+           SUM(value) FILTER (WHERE day > (SELECT d FROM today) - 30) AS d30,
+           SUM(value)                                                 AS all_time
+      FROM public.metrics_daily
+     WHERE metric <> 'active_user'  -- distinct per day; not summable across days
+     GROUP BY metric
+  )
+  SELECT jsonb_build_object(
+    'daily', COALESCE((SELECT jsonb_object_agg(metric, jsonb_build_object(
+               'd7', COALESCE(d7, 0), 'd30', COALESCE(d30, 0), 'all', COALESCE(all_time, 0)))
+               FROM sums), '{}'::jsonb),
+    'gauges', COALESCE((SELECT jsonb_object_agg(metric, jsonb_build_object(
+               'd7', d7, 'd30', d30, 'all', all_time, 'computed_at', computed_at))
+               FROM public.metrics_gauges), '{}'::jsonb)
+  );
+$$;
+
+REVOKE ALL ON FUNCTION public.bump_metric_daily(TEXT, TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.reconcile_metrics_daily(INT) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.admin_metrics_summary() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.reconcile_metrics_daily(INT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.admin_metrics_summary() TO service_role;
+
+-- Backfill every day of history once
+SELECT public.reconcile_metrics_daily(NULL);
@@ -0,0 +1,37 @@
+-- =============================================================================
+-- Migration: 010_stripe_events
+-- Date:      2026-10-19
+-- Description:
+--   Ledger of received Stripe webhook events, keyed by the Stripe event id.
+--   POST /billing/webhook records each verified event here before enqueueing
+--   it; a redelivery of an event already marked 'processed' is acknowledged
+--   without running its handler again.
+--   subscription_id + event_created let the processor skip an event that
+--   arrives after a newer one for the same subscription has been applied
+--   (Stripe does not guarantee delivery order).
+--
+-- How to apply:
+--   Supabase Dashboard → SQL Editor → paste → Run
+--   OR: psql "postgresql://..." -f migrations/010_stripe_events.sql
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.stripe_events (
+  id              TEXT        PRIMARY KEY,             -- Stripe event id (evt_...)
+  type            TEXT        NOT NULL,
+  subscription_id TEXT,                                -- sub_... the event applies to, if any
+  event_created   BIGINT      NOT NULL,                -- Stripe event.created (unix seconds)
+  payload         JSONB       NOT NULL,
+  status          TEXT        NOT NULL DEFAULT 'pending',
+  -- Expected values: 'pending' | 'processed' | 'skipped' | 'failed'
+  attempts        INT         NOT NULL DEFAULT 0,      -- worker attempts so far (BullMQ attemptsMade + 1)
+  last_error      TEXT,
+  received_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  processed_at    TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS stripe_events_subscription_idx
+  ON public.stripe_events (subscription_id, event_created DESC)
+  WHERE subscription_id IS NOT NULL;
+
+-- RLS on, no policies: service role only
+ALTER TABLE public.stripe_events ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,103 @@
+-- =============================================================================
+-- Migration: 011_email_outbox
+-- Date:      2026-10-19
+-- Description:
+--   Transactional email outbox. Request handlers (auth hook, Stripe webhook
+--   handlers) insert a row and return; the chat worker claims pending rows in
+--   batches, sends them through Resend's batch API and retries failures with
+--   exponential backoff (app/services/email/outbox.py).
+--   dedup_key is unique: enqueueing the same logical email twice (a redelivered
+--   webhook, a double-clicked "resend") inserts it once.
+--   claim_email_outbox() leases rows to one worker at a time and pins a
+--   batch_id on them. The worker sends the batch under that id as Resend's
+--   idempotency key, and a batch that failed or whose lease expired (worker
+--   died mid-send) is claimed again as exactly the same rows, so an accepted
+--   send whose response was lost is not delivered twice. An expired lease
+--   counts as an attempt: a row that crashes the worker gives up at
+--   p_max_attempts instead of being reclaimed forever.
+--
+-- How to apply:
+--   Supabase Dashboard → SQL Editor → paste → Run
+--   OR: psql "postgresql://..." -f migrations/011_email_outbox.sql
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.email_outbox (
+  id              UUID        PRIMARY KEY DEFAULT uuid_generate_v4(),
+  dedup_key       TEXT        NOT NULL UNIQUE,
+  to_address      TEXT        NOT NULL,
+  subject         TEXT        NOT NULL,
+  html            TEXT        NOT NULL,
+  status          TEXT        NOT NULL DEFAULT 'pending',
+  -- Expected values: 'pending' | 'sending' | 'sent' | 'failed'
+  attempts        INT         NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  leased_until    TIMESTAMPTZ,
+  last_error      TEXT,
+  batch_id        UUID,                                -- set on first claim; retries resend this batch
+  created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  sent_at         TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS email_outbox_due_idx
+  ON public.email_outbox (next_attempt_at)
+  WHERE status IN ('pending', 'sending');
+
+-- RLS on, no policies: service role only
+ALTER TABLE public.email_outbox ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.claim_email_outbox(p_limit INT, p_lease_s INT, p_max_attempts INT)
+RETURNS SETOF public.email_outbox
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_batch UUID;
+BEGIN
+  -- Claims are serialized across workers (each takes milliseconds), so a batch
+  -- is never split between two of them
+  PERFORM pg_advisory_xact_lock(hashtext('claim_email_outbox'));
+
+  -- Expired lease: the worker died or hung mid-send — count it as an attempt
+  UPDATE public.email_outbox
+     SET status = CASE WHEN attempts + 1 >= p_max_attempts THEN 'failed' ELSE 'pending' END,
+         attempts = attempts + 1,
+         leased_until = NULL,
+         last_error = 'lease expired before the send completed'
+   WHERE status = 'sending' AND leased_until < NOW();
+
+  -- A batch that was sent before is retried as the same rows, under the same key
+  SELECT batch_id INTO v_batch
+    FROM public.email_outbox
+   WHERE status = 'pending' AND next_attempt_at <= NOW() AND batch_id IS NOT NULL
+   ORDER BY next_attempt_at
+   LIMIT 1;
+
+  IF v_batch IS NOT NULL THEN
+    RETURN QUERY
+      UPDATE public.email_outbox
+         SET status = 'sending',
+             leased_until = NOW() + make_interval(secs => p_lease_s)
+       WHERE batch_id = v_batch AND status = 'pending'
+      RETURNING *;
+    RETURN;
+  END IF;
+
+  v_batch := gen_random_uuid();
+  RETURN QUERY
+    UPDATE public.email_outbox o
+       SET status = 'sending',
+           batch_id = v_batch,
+           leased_until = NOW() + make_interval(secs => p_lease_s)
+     WHERE o.id IN (
+       SELECT id FROM public.email_outbox
+        WHERE status = 'pending' AND next_attempt_at <= NOW() AND batch_id IS NULL
+        ORDER BY next_attempt_at
+        LIMIT p_limit
+     )
+    RETURNING o.*;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.claim_email_outbox(INT, INT, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.claim_email_outbox(INT, INT, INT) TO service_role;
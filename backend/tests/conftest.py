@@ -2,6 +2,68 @@ import os
 import pytest
 
 
+class MemoryRedis:
+    """
+    In-memory stand-in for the redis.asyncio.Redis calls the caches and job
+    scheduling make. Strings are stored as given and returned as bytes by get(),
+    like the real client; ttls records the last expiry set per key.
+    """
+
+    def __init__(self):
+        self.strings: dict[str, str] = {}
+        self.hashes: dict[str, dict] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.ttls: dict[str, int | None] = {}
+
+    async def get(self, key):
+        value = self.strings.get(key)
+        return value.encode() if isinstance(value, str) else value
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        self.ttls[key] = ex
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.strings.pop(key, None)
+            self.hashes.pop(key, None)
+            self.zsets.pop(key, None)
+            self.ttls.pop(key, None)
+
+    async def expire(self, key, ttl):
+        self.ttls[key] = ttl
+        return True
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def zremrangebyscore(self, key, lo, hi):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if lo <= score <= hi]:
+            del zset[member]
+
+
+@pytest.fixture
+def memory_redis() -> MemoryRedis:
+    """A fresh in-memory Redis double; patch it in with patch.object(module, "get_redis", ...)."""
+    return MemoryRedis()
+
+
 @pytest.fixture
 def unsubscribed_jwt() -> str:
     """
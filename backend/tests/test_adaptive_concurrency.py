@@ -0,0 +1,111 @@
+"""
+Tests for AdaptiveConcurrency — AIMD limit for the photo_generation worker.
+Pure in-memory controller; a fake clock drives the decrease cooldown.
+"""
+import pytest
+
+from app.services.jobs.concurrency import AdaptiveConcurrency
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _controller(clock=None, **overrides) -> AdaptiveConcurrency:
+    opts = dict(
+        min_limit=1,
+        max_limit=6,
+        initial_limit=3,
+        target_latency_s=100.0,
+        max_error_rate=0.2,
+        window=10,
+        cooldown_s=30.0,
+        clock=clock or FakeClock(),
+    )
+    opts.update(overrides)
+    return AdaptiveConcurrency(**opts)
+
+
+def test_initial_limit_clamped_to_bounds():
+    assert _controller(initial_limit=50).limit == 6
+    assert _controller(initial_limit=0).limit == 1
+
+
+def test_invalid_bounds_rejected():
+    with pytest.raises(ValueError):
+        _controller(min_limit=4, max_limit=2)
+
+
+def test_additive_increase_after_limit_healthy_samples_with_backlog():
+    c = _controller()
+    c.set_queue_depth(5)
+    for _ in range(2):
+        c.record(60.0, ok=True)
+    assert c.limit == 3
+    c.record(60.0, ok=True)  # 3rd healthy sample == current limit -> +1
+    assert c.limit == 4
+
+
+def test_no_increase_when_queue_empty():
+    c = _controller()
+    c.set_queue_depth(0)
+    for _ in range(10):
+        c.record(60.0, ok=True)
+    assert c.limit == 3
+
+
+def test_increase_capped_at_max():
+    c = _controller(initial_limit=6)
+    c.set_queue_depth(10)
+    for _ in range(20):
+        c.record(30.0, ok=True)
+    assert c.limit == 6
+
+
+def test_multiplicative_decrease_on_slow_latency():
+    c = _controller(initial_limit=6)
+    c.record(400.0, ok=True)
+    assert c.limit == 3
+
+
+def test_multiplicative_decrease_on_error_rate():
+    c = _controller(initial_limit=4)
+    c.record(60.0, ok=True)
+    c.record(60.0, ok=False)  # error rate 0.5 > 0.2
+    assert c.limit == 2
+
+
+def test_decrease_respects_cooldown_and_floor():
+    clock = FakeClock()
+    c = _controller(clock=clock, initial_limit=6)
+    c.record(400.0, ok=False)
+    assert c.limit == 3
+    c.record(400.0, ok=False)  # within cooldown — unchanged
+    assert c.limit == 3
+    clock.now += 31
+    c.record(400.0, ok=False)
+    assert c.limit == 1
+    clock.now += 31
+    c.record(400.0, ok=False)
+    assert c.limit == 1  # never below min
+
+
+def test_on_change_callback_receives_new_limit():
+    c = _controller(initial_limit=4)
+    seen = []
+    c.on_change(seen.append)
+    c.record(400.0, ok=True)
+    assert seen == [2]
+
+
+def test_snapshot_exposes_current_limit():
+    c = _controller()
+    c.record(50.0, ok=True)
+    snap = c.snapshot()
+    assert snap["concurrency_limit"] == 3
+    assert snap["latency_ewma_s"] == 50.0
+    assert snap["error_rate"] == 0.0
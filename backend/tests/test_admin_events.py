@@ -73,21 +73,21 @@ class TestModeSwitchEmission:
 
 
 class TestSubscriptionCreatedEmission:
-    """Verifies subscription_created emit is wired in billing.py."""
+    """Verifies subscription_created emit is wired in the Stripe webhook event handlers."""
 
     def test_subscription_created_emit_exists_in_billing(self):
         import inspect
-        from app.routers import billing
-        source = inspect.getsource(billing)
+        from app.services.billing import webhook_events
+        source = inspect.getsource(webhook_events)
         assert "subscription_created" in source, (
-            "billing.py must emit 'subscription_created' to usage_events (ADMN-02). "
+            "webhook_events.py must emit 'subscription_created' to usage_events (ADMN-02). "
             "subscription_cancelled alone is insufficient (different event, different handler)."
         )
 
     def test_both_subscription_events_present(self):
-        """Both subscription_created AND subscription_cancelled must exist in billing.py."""
+        """subscription_created (webhook handler) AND subscription_cancelled (/billing/cancel) must exist."""
         import inspect
         from app.routers import billing
-        source = inspect.getsource(billing)
-        assert "subscription_created" in source
-        assert "subscription_cancelled" in source
+        from app.services.billing import webhook_events
+        assert "subscription_created" in inspect.getsource(webhook_events)
+        assert "subscription_cancelled" in inspect.getsource(billing)
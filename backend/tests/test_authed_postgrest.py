@@ -0,0 +1,53 @@
+"""
+Tests for per-request PostgREST clients (database.UserPostgrest via get_authed_supabase):
+each request's JWT stays in its own headers while all share one connection pool.
+HTTP is an httpx.MockTransport — no Supabase calls.
+"""
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app import database, dependencies
+
+
+def _recording_session(seen: list):
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.url.path, request.url.params.get("user_id"), request.headers["authorization"]))
+        return httpx.Response(200, json=[])
+
+    return httpx.Client(base_url=str(database._rest_url), transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_dependency_scopes_token_without_touching_shared_client():
+    shared_before = dict(database.supabase_client.options.headers)
+    db = await dependencies.get_authed_supabase(SimpleNamespace(credentials="tok-1"))
+    seen = []
+    with patch.object(database, "rest_session", _recording_session(seen)):
+        db.from_("avatars").select("id").eq("user_id", "u1").execute()
+    assert seen == [("/rest/v1/avatars", "eq.u1", "Bearer tok-1")]
+    assert dict(database.supabase_client.options.headers) == shared_before
+
+
+def test_concurrent_requests_never_see_each_others_token():
+    seen = []
+    barrier = threading.Barrier(8)
+
+    def query(i: int):
+        db = database.UserPostgrest(f"tok-{i}")
+        builder = db.table("messages").select("id").eq("user_id", f"u{i}")
+        barrier.wait(timeout=5)  # every thread has built its query before any sends
+        builder.execute()
+
+    threads = [threading.Thread(target=query, args=(i,)) for i in range(8)]
+    with patch.object(database, "rest_session", _recording_session(seen)):
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert len(seen) == 8
+    for _, user_param, auth in seen:
+        assert auth == f"Bearer tok-{user_param.removeprefix('eq.u')}"
@@ -0,0 +1,73 @@
+"""
+Tests for the billing page cache (billing/billing_cache.py): subscription detail and
+invoice reads served without DB/Stripe calls, webhook write-through and invoice merge.
+Redis is an in-memory double; supabase_admin and stripe are MagicMocks.
+"""
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.billing import billing_cache, subscription, webhook_events
+
+
+@pytest.fixture
+def redis(memory_redis):
+    with patch.object(billing_cache, "get_redis", return_value=memory_redis), \
+         patch.object(subscription, "store_entitlement", AsyncMock()):
+        yield memory_redis
+
+
+def _invoice(invoice_id, created, status="paid"):
+    return {"id": invoice_id, "customer": "cus_1", "created": created, "amount_paid": 900,
+            "status": status, "invoice_pdf": f"https://pdf/{invoice_id}"}
+
+
+ROW = {"user_id": "u1", "status": "active", "current_period_end": "2026-11-19T00:00:00+00:00",
+       "cancel_at_period_end": False, "stripe_customer_id": "cus_1", "stripe_subscription_id": "sub_1"}
+
+
+@pytest.mark.asyncio
+async def test_subscription_detail_reads_db_once(redis):
+    db = MagicMock()
+    execute = db.from_.return_value.select.return_value.eq.return_value.limit.return_value.execute
+    execute.side_effect = [SimpleNamespace(data=[ROW]), SimpleNamespace(data=[])]
+    with patch.object(subscription, "supabase_admin", db):
+        first = await subscription.get_subscription_detail("u1")
+        assert await subscription.get_subscription_detail("u1") == first
+        assert await subscription.get_subscription_detail("u2") is None
+        assert await subscription.get_subscription_detail("u2") is None  # "no row" cached too
+    assert execute.call_count == 2
+    assert first["stripe_customer_id"] == "cus_1"
+
+
+@pytest.mark.asyncio
+async def test_cancel_state_webhook_writes_detail_through(redis):
+    db = MagicMock()
+    db.from_.return_value.update.return_value.eq.return_value.execute.return_value = SimpleNamespace(
+        data=[{**ROW, "cancel_at_period_end": True}],
+    )
+    with patch.object(subscription, "supabase_admin", db):
+        await subscription.update_subscription_cancel_state("sub_1", True, 1790000000)
+        detail = await subscription.get_subscription_detail("u1")
+    assert detail["cancel_at_period_end"] is True
+    db.from_.return_value.select.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_invoices_hit_stripe_once_then_webhooks_merge(redis):
+    listing = SimpleNamespace(data=[_invoice("in_1", 100)])
+    with patch.object(subscription.stripe.Invoice, "list", MagicMock(return_value=listing)) as stripe_list:
+        assert [i["id"] for i in await subscription.list_customer_invoices("cus_1")] == ["in_1"]
+        await webhook_events.handle_stripe_event({"type": "invoice.paid", "data": {"object": _invoice("in_2", 200)}})
+        invoices = await subscription.list_customer_invoices("cus_1")
+    stripe_list.assert_called_once()
+    assert [i["id"] for i in invoices] == ["in_2", "in_1"]
+    assert invoices[0]["invoice_pdf"] == "https://pdf/in_2"
+
+
+@pytest.mark.asyncio
+async def test_stripe_errors_are_not_cached(redis):
+    with patch.object(subscription.stripe.Invoice, "list", MagicMock(side_effect=RuntimeError("stripe down"))):
+        assert await subscription.list_customer_invoices("cus_1") == []
+    assert redis.strings == {}
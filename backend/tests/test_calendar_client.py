@@ -0,0 +1,137 @@
+"""
+Tests for the async Google Calendar client (google_auth/calendar_client.py) and its
+use by the calendar skill: per-user token cache, blocking vs background refresh,
+shared refreshes, the 401 retry and invalid_grant handling.
+Google endpoints are an httpx.MockTransport; the token store is mocked.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from google.auth.exceptions import RefreshError
+
+from app.services.google_auth import calendar_client as client_module
+from app.services.google_auth.calendar_client import CalendarClient
+from app.services.skills import calendar_skill
+
+
+def _stored(expires_in_s: float, access: str = "at-old", refresh: str = "rt-1") -> dict:
+    expiry = datetime.now(timezone.utc) + timedelta(seconds=expires_in_s)
+    return {"access_token": access, "refresh_token": refresh, "token_expiry": expiry.isoformat(), "scopes": []}
+
+
+def _google(seen: list[httpx.Request], token_status: int = 200, calendar_statuses: list[int] | None = None):
+    statuses = iter(calendar_statuses or [])
+
+    async def handler(request):
+        seen.append(request)
+        if request.url.host == "oauth2.googleapis.com":
+            await asyncio.sleep(0)  # let concurrent callers pile onto the same refresh
+            if token_status != 200:
+                return httpx.Response(token_status, json={"error": "invalid_grant"})
+            return httpx.Response(200, json={"access_token": "at-new", "expires_in": 3599})
+        return httpx.Response(next(statuses, 200), json={"items": [{"summary": "Standup"}], "id": "ev1"})
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.fixture
+def store():
+    with patch.object(client_module, "get_calendar_tokens", AsyncMock()) as get, \
+         patch.object(client_module, "save_calendar_tokens", AsyncMock()) as save:
+        yield get, save
+
+
+@pytest.mark.asyncio
+async def test_token_is_cached_per_user(store):
+    get, _ = store
+    get.return_value = _stored(3600)
+    seen = []
+    client = CalendarClient(transport=_google(seen))
+    now = datetime.now(timezone.utc)
+
+    for _ in range(3):
+        assert await client.list_events("u1", now, now + timedelta(days=7)) == [{"summary": "Standup"}]
+
+    get.assert_awaited_once_with("u1")
+    assert [r.url.host for r in seen] == ["www.googleapis.com"] * 3
+    assert seen[0].headers["authorization"] == "Bearer at-old"
+    assert seen[0].url.params["singleEvents"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_expired_token_is_refreshed_once_for_concurrent_callers(store):
+    get, save = store
+    get.return_value = _stored(-10)
+    seen = []
+    client = CalendarClient(transport=_google(seen))
+
+    tokens = await asyncio.gather(*(client.get_token("u1") for _ in range(5)))
+
+    assert {t.access_token for t in tokens} == {"at-new"}
+    assert sum(r.url.host == "oauth2.googleapis.com" for r in seen) == 1
+    save.assert_awaited_once()
+    assert save.await_args.kwargs["refresh_token"] == "rt-1"
+
+
+@pytest.mark.asyncio
+async def test_token_near_expiry_refreshes_in_background(store):
+    get, _ = store
+    get.return_value = _stored(120)  # inside the 300s margin, above the 60s floor
+    seen = []
+    client = CalendarClient(transport=_google(seen))
+
+    token = await client.get_token("u1")
+    assert token.access_token == "at-old"  # caller did not wait
+    await asyncio.gather(*client._refreshing.values())
+    assert (await client.get_token("u1")).access_token == "at-new"
+
+
+@pytest.mark.asyncio
+async def test_401_refreshes_and_retries_once(store):
+    get, _ = store
+    get.return_value = _stored(3600)
+    seen = []
+    client = CalendarClient(transport=_google(seen, calendar_statuses=[401, 200]))
+
+    event = await client.insert_event("u1", {"summary": "Lunch"})
+
+    assert event["id"] == "ev1"
+    assert [r.url.host for r in seen] == ["www.googleapis.com", "oauth2.googleapis.com", "www.googleapis.com"]
+    assert seen[-1].headers["authorization"] == "Bearer at-new"
+
+
+@pytest.mark.asyncio
+async def test_invalid_grant_raises_unless_a_new_grant_was_stored(store):
+    get, _ = store
+    get.return_value = _stored(-10)
+    client = CalendarClient(transport=_google([], token_status=400))
+    with pytest.raises(RefreshError):
+        await client.get_token("u1")
+
+    # Reconnected in another process: the stored grant is new, use it
+    get.side_effect = [_stored(-10), _stored(3600, access="at-reconnected", refresh="rt-2")]
+    client = CalendarClient(transport=_google([], token_status=400))
+    assert (await client.get_token("u1")).access_token == "at-reconnected"
+
+
+@pytest.mark.asyncio
+async def test_skill_revoked_token_deletes_tokens_and_prompts_reconnect():
+    with patch.object(calendar_skill.calendar_client, "get_token", AsyncMock(side_effect=RefreshError("gone"))), \
+         patch.object(calendar_skill, "delete_calendar_tokens", AsyncMock()) as delete, \
+         patch.object(calendar_skill, "get_auth_url", return_value="https://auth"):
+        reply = await calendar_skill.CalendarSkill()._handle_view("u1", "UTC")
+    assert reply == calendar_skill.REVOKED_MSG.format(url="https://auth")
+    delete.assert_awaited_once_with("u1")
+
+
+@pytest.mark.asyncio
+async def test_skill_view_lists_events_through_client():
+    events = [{"summary": "Standup", "start": {"dateTime": "2026-10-20T09:00:00+00:00"}}]
+    with patch.object(calendar_skill.calendar_client, "get_token", AsyncMock(return_value=object())), \
+         patch.object(calendar_skill.calendar_client, "list_events", AsyncMock(return_value=events)) as list_events:
+        reply = await calendar_skill.CalendarSkill()._handle_view("u1", "UTC")
+    assert reply == "• tue 9am — Standup"
+    assert list_events.await_args.kwargs == {"max_results": 10}
@@ -0,0 +1,201 @@
+"""
+Tests for incremental GET /chat/history (keyset `after` cursor, ETag/304) and the
+GET /chat/updates long-poll.
+The RLS-scoped PostgREST client is replaced by a recording query double.
+"""
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException, Response
+from starlette.requests import Request
+
+from app.routers import web_chat
+from app.services.messages.cursor import decode_cursor, encode_cursor
+
+ROWS = [
+    {"id": "00000000-0000-0000-0000-00000000000%d" % i, "role": "user", "content": f"m{i}",
+     "created_at": "2026-01-01T10:00:0%d+00:00" % i}
+    for i in range(1, 4)
+]
+
+
+class FakeQuery:
+    """Records builder calls; execute() answers from ROWS like PostgREST would."""
+
+    def __init__(self, db):
+        self.db = db
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return method
+
+    def execute(self):
+        self.db.queries.append(self.calls)
+        select = self.calls[0][1][0]
+        limit = next(a[0] for n, a, _ in self.calls if n == "limit")
+        desc = any(kw.get("desc") for n, _, kw in self.calls if n == "order")
+        rows = list(reversed(self.db.rows)) if desc else list(self.db.rows)
+        if any(n == "or_" for n, _, _ in self.calls):
+            rows = [r for r in rows if r["id"] > self.db.after_id]
+        fields = [f.strip() for f in select.split(",")]
+        return SimpleNamespace(data=[{f: r[f] for f in fields} for r in rows[:limit]])
+
+
+class FakeDb:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.after_id = ""
+
+    def from_(self, table):
+        return FakeQuery(self)
+
+
+@pytest.fixture(autouse=True)
+def no_message_cache():
+    # These tests exercise the PostgREST path; the cache has its own tests
+    with patch.object(web_chat.message_cache, "page", AsyncMock(return_value=None)):
+        yield
+
+
+def _request(etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/chat/history", "headers": headers})
+
+
+async def _history(db, etag=None, after=None):
+    response = Response()
+    with patch.object(web_chat, "_rewrite_photo_paths", AsyncMock(side_effect=lambda m: m)):
+        body = await web_chat.get_chat_history(
+            _request(etag), response, limit=50, after=after, user=SimpleNamespace(id="u1"), db=db,
+        )
+    return body, response
+
+
+@pytest.mark.asyncio
+async def test_full_page_returns_chronological_rows_and_cursor():
+    db = FakeDb(ROWS)
+    body, response = await _history(db)
+    assert [m["content"] for m in body] == ["m1", "m2", "m3"]
+    assert decode_cursor(response.headers["X-Cursor"]) == (ROWS[2]["created_at"], ROWS[2]["id"])
+    assert response.headers["ETag"].startswith('W/"')
+
+
+@pytest.mark.asyncio
+async def test_matching_etag_returns_304_after_single_row_check():
+    db = FakeDb(ROWS)
+    _, first = await _history(db)
+    db.queries.clear()
+
+    result, _ = await _history(db, etag=first.headers["ETag"])
+    assert result.status_code == 304
+    assert len(db.queries) == 1  # only the newest-id check ran
+    assert result.headers["X-Cursor"] == first.headers["X-Cursor"]  # client can long-poll
+
+
+@pytest.mark.asyncio
+async def test_empty_history_304_carries_empty_cursor():
+    db = FakeDb([])
+    _, first = await _history(db)
+    assert first.headers["X-Cursor"] == ""
+    result, _ = await _history(db, etag=first.headers["ETag"])
+    assert result.status_code == 304
+    assert result.headers["X-Cursor"] == ""
+
+
+@pytest.mark.asyncio
+async def test_after_cursor_with_nothing_new_skips_page_query():
+    db = FakeDb(ROWS)
+    cursor = encode_cursor(ROWS[2])
+    body, response = await _history(db, after=cursor)
+    assert body == []
+    assert response.headers["X-Cursor"] == cursor
+    assert len(db.queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_after_cursor_returns_only_newer_rows():
+    db = FakeDb(ROWS)
+    db.after_id = ROWS[0]["id"]
+    body, response = await _history(db, after=encode_cursor(ROWS[0]))
+    assert [m["content"] for m in body] == ["m2", "m3"]
+    page_query = db.queries[-1]
+    or_filter = next(a[0] for n, a, _ in page_query if n == "or_")
+    assert ROWS[0]["id"] in or_filter and ROWS[0]["created_at"] in or_filter
+
+
+@pytest.mark.asyncio
+async def test_malformed_cursor_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        await _history(FakeDb(ROWS), after="bm90LWEtY3Vyc29y")
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_updates_long_poll_wakes_on_publish():
+    import asyncio
+    from app.services.chat_updates import chat_updates
+
+    db = FakeDb(ROWS[:1])
+    cursor = encode_cursor(ROWS[0])
+
+    async def poll():
+        response = Response()
+        with patch.object(web_chat, "_rewrite_photo_paths", AsyncMock(side_effect=lambda m: m)):
+            body = await web_chat.get_chat_updates(
+                response, after=cursor, timeout=5, user=SimpleNamespace(id="u1"), db=db,
+            )
+        return body, response
+
+    task = asyncio.ensure_future(poll())
+    await asyncio.sleep(0.05)
+    assert not task.done()  # nothing newer yet — blocked
+
+    db.rows = ROWS[:2]
+    db.after_id = ROWS[0]["id"]
+    chat_updates.notify_local("u1")
+    body, response = await asyncio.wait_for(task, 1)
+    assert [m["content"] for m in body] == ["m2"]
+    assert decode_cursor(response.headers["X-Cursor"])[1] == ROWS[1]["id"]
+
+
+@pytest.mark.asyncio
+async def test_updates_long_poll_times_out_empty():
+    db = FakeDb(ROWS[:1])
+    cursor = encode_cursor(ROWS[0])
+    response = Response()
+    body = await web_chat.get_chat_updates(
+        response, after=cursor, timeout=0.05, user=SimpleNamespace(id="u2"), db=db,
+    )
+    assert body == []
+    assert response.headers["X-Cursor"] == cursor
+
+
+@pytest.mark.asyncio
+async def test_updates_without_cursor_waits_for_first_message():
+    import asyncio
+    from app.services.chat_updates import chat_updates
+
+    db = FakeDb([])
+
+    async def poll():
+        response = Response()
+        with patch.object(web_chat, "_rewrite_photo_paths", AsyncMock(side_effect=lambda m: m)):
+            body = await web_chat.get_chat_updates(
+                response, timeout=5, user=SimpleNamespace(id="u3"), db=db,
+            )
+        return body, response
+
+    task = asyncio.ensure_future(poll())
+    await asyncio.sleep(0.05)
+    assert not task.done()  # empty history — blocked, not polled
+
+    db.rows = ROWS[:1]
+    chat_updates.notify_local("u3")
+    body, response = await asyncio.wait_for(task, 1)
+    assert [m["content"] for m in body] == ["m1"]
+    assert decode_cursor(response.headers["X-Cursor"])[1] == ROWS[0]["id"]
@@ -0,0 +1,96 @@
+"""
+Tests for queue-based chat processing: chat_queue (enqueue side), chat_processor
+(dispatch), chat_pipeline.user_lock (per-user ordering) and the router fallbacks.
+BullMQ and the pipeline are mocked — no Redis or OpenAI calls.
+"""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.routers import webhook
+from app.services import chat_pipeline
+from app.services.jobs import chat_processor, chat_queue
+
+PAYLOAD = {"entry": [{"changes": [{"value": {"messages": [{"from": "33600000000", "type": "text"}]}}]}]}
+
+
+class JsonRequest:
+    def __init__(self, body):
+        self._body = body
+
+    async def json(self):
+        return self._body
+
+
+@pytest.mark.asyncio
+async def test_webhook_enqueues_and_returns_without_processing():
+    with patch.object(webhook, "enqueue_whatsapp_inbound", AsyncMock(return_value=True)) as enqueue, \
+         patch.object(webhook, "process_whatsapp_message", AsyncMock()) as process:
+        assert await webhook.handle_incoming(JsonRequest(PAYLOAD)) == {"status": "ok"}
+    enqueue.assert_awaited_once_with(PAYLOAD)
+    process.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_webhook_processes_inline_when_queue_unavailable():
+    with patch.object(webhook, "enqueue_whatsapp_inbound", AsyncMock(return_value=False)), \
+         patch.object(webhook, "process_whatsapp_message", AsyncMock()) as process:
+        assert await webhook.handle_incoming(JsonRequest(PAYLOAD)) == {"status": "ok"}
+    process.assert_awaited_once_with(PAYLOAD)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_reports_failure_instead_of_raising():
+    queue = MagicMock()
+    queue.add = AsyncMock(side_effect=ConnectionError("redis down"))
+    with patch.object(chat_queue, "get_chat_queue", return_value=queue):
+        assert await chat_queue.enqueue_web_reply("u1", "hi", None) is False
+
+    queue.add = AsyncMock()
+    with patch.object(chat_queue, "get_chat_queue", return_value=queue):
+        assert await chat_queue.enqueue_web_reply("u1", "hi", {"id": "av-1"}) is True
+    name, data, opts = queue.add.await_args.args
+    assert (name, data["user_id"], opts["attempts"]) == ("web_reply", "u1", 1)
+
+
+@pytest.mark.asyncio
+async def test_disabled_queue_never_touches_redis():
+    with patch.object(chat_queue.settings, "chat_queue_enabled", False), \
+         patch.object(chat_queue, "get_chat_queue") as get_queue:
+        assert await chat_queue.enqueue_whatsapp_inbound(PAYLOAD) is False
+    get_queue.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_processor_dispatches_by_job_name():
+    with patch.object(chat_pipeline, "reply_to_web_message", AsyncMock()) as reply, \
+         patch.object(chat_pipeline, "process_whatsapp_message", AsyncMock(side_effect=KeyError("entry"))) as wa:
+        await chat_processor.process_chat_job(
+            SimpleNamespace(id="1", name="web_reply", data={"user_id": "u1", "text": "hi", "avatar": None})
+        )
+        # Malformed WhatsApp payloads are logged, not retried
+        await chat_processor.process_chat_job(SimpleNamespace(id="2", name="whatsapp_inbound", data={"body": {}}))
+    reply.assert_awaited_once_with("u1", "hi", None)
+    wa.assert_awaited_once()
+
+    with pytest.raises(ValueError):
+        await chat_processor.process_chat_job(SimpleNamespace(id="3", name="bogus", data={}))
+
+
+@pytest.mark.asyncio
+async def test_user_lock_serializes_one_user_but_not_others():
+    order = []
+
+    async def run(user_id, tag, delay):
+        async with chat_pipeline.user_lock(user_id):
+            order.append(f"{tag}:start")
+            await asyncio.sleep(delay)
+            order.append(f"{tag}:end")
+
+    await asyncio.gather(run("u1", "a", 0.02), run("u1", "b", 0), run("u2", "c", 0))
+    # b waits for a; c (another user) runs while a is still in flight
+    assert order.index("a:end") < order.index("b:start")
+    assert order.index("c:end") < order.index("a:end")
+    assert chat_pipeline._user_locks == {}
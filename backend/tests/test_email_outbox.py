@@ -0,0 +1,126 @@
+"""
+Tests for the transactional email outbox (app/services/email/outbox.py): enqueue with
+dedup keys, batch sends through Resend, backoff and give-up on failures, and the
+direct-send fallback when the outbox table is unreachable.
+supabase_admin, Redis and the Resend SDK are mocked.
+"""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.email import outbox, resend_client
+
+
+def _row(i: int, attempts: int = 0, batch_id: str = "b-1") -> dict:
+    return {"id": f"id-{i}", "to_address": f"u{i}@example.com", "subject": "s", "html": "<p/>",
+            "attempts": attempts, "batch_id": batch_id}
+
+
+@pytest.fixture(autouse=True)
+def configured():
+    with patch.object(outbox.settings, "resend_api_key", "re_test"), \
+         patch.object(outbox.settings, "resend_from_address", "Ava <ava@example.com>"):
+        yield
+
+
+@pytest.fixture
+def table():
+    """supabase_admin mock: from_() chains return themselves, rpc() claims rows."""
+    chain = MagicMock()
+    for name in ("upsert", "update", "in_", "eq"):
+        getattr(chain, name).return_value = chain
+    chain.execute.return_value = SimpleNamespace(data=[{"id": "id-1"}])
+    admin = MagicMock()
+    admin.from_.return_value = chain
+    with patch.object(outbox, "supabase_admin", admin):
+        yield admin, chain
+
+
+@pytest.mark.asyncio
+async def test_enqueue_inserts_with_dedup_key_and_wakes_worker(table):
+    admin, chain = table
+    redis = MagicMock(lpush=AsyncMock())
+    with patch.object(outbox, "get_redis", return_value=redis), \
+         patch.object(outbox.resend.Emails, "send") as send:
+        assert await resend_client.send_welcome_email("a@example.com", "Ann", dedup_key="welcome:u1") is True
+    row = chain.upsert.call_args.args[0]
+    assert row["dedup_key"] == "welcome:u1"
+    assert row["to_address"] == "a@example.com"
+    assert chain.upsert.call_args.kwargs == {"on_conflict": "dedup_key", "ignore_duplicates": True}
+    redis.lpush.assert_awaited_once_with(outbox.WAKE_KEY, "1")
+    send.assert_not_called()  # the caller never waits on Resend
+
+
+@pytest.mark.asyncio
+async def test_duplicate_enqueue_does_not_wake_worker(table):
+    _, chain = table
+    chain.execute.return_value = SimpleNamespace(data=[])
+    redis = MagicMock(lpush=AsyncMock())
+    with patch.object(outbox, "get_redis", return_value=redis):
+        assert await outbox.enqueue_email("a@example.com", "s", "<p/>", dedup_key="receipt:cs_1") is True
+    redis.lpush.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_outbox_down_sends_directly_in_background(table):
+    _, chain = table
+    chain.execute.side_effect = RuntimeError("db down")
+    with patch.object(outbox, "_sync_send", MagicMock()) as sync_send:
+        assert await outbox.enqueue_email("a@example.com", "s", "<p/>") is True
+        await asyncio.gather(*outbox._fallback_tasks)
+    assert sync_send.call_args.args[0]["to"] == ["a@example.com"]
+
+
+def test_flush_sends_batch_with_idempotency_key_and_marks_sent(table):
+    admin, chain = table
+    admin.rpc.return_value.execute.return_value = SimpleNamespace(data=[_row(1), _row(2)])
+    with patch.object(outbox.resend.Batch, "send", return_value={"data": [{"id": "r1"}, {"id": "r2"}]}) as send:
+        assert outbox.flush_outbox_once() == 2
+    params, options = send.call_args.args
+    assert [p["to"] for p in params] == [["u1@example.com"], ["u2@example.com"]]
+    assert options["idempotency_key"] == "ava-outbox-b-1"
+    assert admin.rpc.call_args.args[1]["p_max_attempts"] == outbox.settings.email_max_attempts
+    update = chain.update.call_args.args[0]
+    assert update["status"] == "sent"
+    chain.in_.assert_called_with("id", ["id-1", "id-2"])
+
+
+def test_failed_batch_backs_off_then_gives_up(table):
+    admin, chain = table
+    admin.rpc.return_value.execute.return_value = SimpleNamespace(data=[_row(1, attempts=0), _row(2, attempts=7)])
+    with patch.object(outbox.resend.Batch, "send", side_effect=RuntimeError("503")), \
+         patch.object(outbox.settings, "email_max_attempts", 8):
+        outbox.flush_outbox_once()
+    updates = [c.args[0] for c in chain.update.call_args_list]
+    assert {u["attempts"]: u["status"] for u in updates} == {1: "pending", 8: "failed"}
+
+
+def test_retried_batch_reuses_its_idempotency_key(table):
+    admin, _ = table
+    with patch.object(outbox.resend.Batch, "send", side_effect=TimeoutError("read timeout")) as send:
+        admin.rpc.return_value.execute.return_value = SimpleNamespace(data=[_row(1), _row(2)])
+        outbox.flush_outbox_once()
+        # The claim hands back the same batch, in whatever order the database returns it
+        admin.rpc.return_value.execute.return_value = SimpleNamespace(data=[_row(2, 1), _row(1, 1)])
+        outbox.flush_outbox_once()
+    first, retry = send.call_args_list
+    assert first.args[1]["idempotency_key"] == retry.args[1]["idempotency_key"] == "ava-outbox-b-1"
+    assert first.args[0] == retry.args[0]  # same payload under the same key
+
+
+def test_rejected_email_fails_permanently_and_rest_are_sent(table):
+    admin, chain = table
+    admin.rpc.return_value.execute.return_value = SimpleNamespace(data=[_row(1), _row(2)])
+    response = {"data": [{"id": "r1"}], "errors": [{"index": 1, "message": "Invalid `to` field"}]}
+    with patch.object(outbox.resend.Batch, "send", return_value=response):
+        outbox.flush_outbox_once()
+    updates = [c.args[0]["status"] for c in chain.update.call_args_list]
+    assert updates == ["sent", "failed"]
+
+
+def test_retry_delay_doubles_up_to_cap():
+    with patch.object(outbox.settings, "email_retry_base_s", 30), \
+         patch.object(outbox.settings, "email_retry_max_s", 100):
+        assert [outbox.retry_delay_s(n) for n in (1, 2, 3, 4)] == [30, 60, 100, 100]
@@ -0,0 +1,97 @@
+"""
+Tests for the subscription entitlement cache (billing/entitlements.py), its use in
+require_active_subscription and the webhook write-through in billing/subscription.py.
+Redis is an in-memory double; supabase_admin is a MagicMock.
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from app import dependencies
+from app.services.billing import billing_cache, entitlements, subscription
+
+
+def _future(days=10):
+    return (datetime.now(timezone.utc) + timedelta(days=days)).isoformat()
+
+
+def _admin(*rows):
+    admin = MagicMock()
+    execute = admin.from_.return_value.select.return_value.eq.return_value.limit.return_value.execute
+    execute.side_effect = [SimpleNamespace(data=r) for r in rows]
+    return admin, execute
+
+
+@pytest.fixture
+def redis(memory_redis):
+    entitlements._entitlement_local.clear()
+    with patch.object(entitlements, "get_redis", return_value=memory_redis), \
+         patch.object(billing_cache, "get_redis", return_value=memory_redis):
+        yield memory_redis
+    entitlements._entitlement_local.clear()
+
+
+@pytest.mark.asyncio
+async def test_active_user_hits_db_once(redis):
+    admin, execute = _admin([{"status": "active", "current_period_end": _future()}])
+    with patch.object(entitlements, "supabase_admin", admin):
+        for _ in range(3):
+            assert await entitlements.has_active_subscription("u1") is True
+        entitlements._entitlement_local.clear()  # another process: served from Redis
+        assert await entitlements.has_active_subscription("u1") is True
+    assert execute.call_count == 1
+    assert redis.ttls["ava:entitlement:u1"] == entitlements.settings.entitlement_cache_ttl_s
+
+
+@pytest.mark.asyncio
+async def test_no_subscription_is_cached_in_redis_only(redis):
+    admin, execute = _admin([])
+    with patch.object(entitlements, "supabase_admin", admin):
+        assert await entitlements.has_active_subscription("u2") is False
+        assert await entitlements.has_active_subscription("u2") is False
+    assert execute.call_count == 1
+    assert "u2" not in entitlements._entitlement_local
+
+
+@pytest.mark.asyncio
+async def test_lapsed_period_end_rereads_db(redis):
+    past = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    await entitlements.store_entitlement("u3", "active", past)
+    admin, execute = _admin([{"status": "past_due", "current_period_end": past}])
+    with patch.object(entitlements, "supabase_admin", admin):
+        assert await entitlements.has_active_subscription("u3") is False
+    assert execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_webhooks_write_through(redis):
+    admin = MagicMock()
+    with patch.object(subscription, "supabase_admin", admin), \
+         patch.object(entitlements, "supabase_admin", admin):
+        await subscription.activate_subscription("u4", "cus_1", "sub_1")
+        assert await entitlements.has_active_subscription("u4") is True
+
+        admin.from_.return_value.update.return_value.eq.return_value.execute.return_value = SimpleNamespace(
+            data=[{"user_id": "u4", "status": "canceled", "current_period_end": _future()}],
+        )
+        await subscription.deactivate_subscription("sub_1", new_status="canceled")
+        assert await entitlements.has_active_subscription("u4") is False
+    admin.from_.return_value.select.assert_not_called()  # never read from the DB
+    assert "u4" not in entitlements._entitlement_local
+
+
+@pytest.mark.asyncio
+async def test_require_active_subscription_uses_cache(redis):
+    await entitlements.store_entitlement("u5", "active", _future())
+    user = SimpleNamespace(id="u5")
+    with patch.object(entitlements.settings, "stripe_secret_key", "sk_test"), \
+         patch.object(entitlements, "supabase_admin") as admin:
+        assert await dependencies.require_active_subscription(user) is user
+        await entitlements.store_entitlement("u5", "past_due", None)
+        with pytest.raises(HTTPException) as exc:
+            await dependencies.require_active_subscription(user)
+    assert exc.value.status_code == 402
+    admin.from_.assert_not_called()
@@ -0,0 +1,140 @@
+"""
+Tests for local Supabase JWT verification (services/auth/jwt_verifier.py) and the
+get_current_user / get_current_user_strict dependencies. Tokens are minted locally
+with python-jose; the JWKS endpoint is an httpx.MockTransport.
+"""
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import JWTError, jwk, jwt
+
+from app import dependencies
+from app.services.auth import jwt_verifier as verifier_module
+from app.services.auth.jwt_verifier import SupabaseJwtVerifier, VerifierUnavailable
+
+URL = "https://proj.supabase.co"
+SECRET = "test-secret"
+
+
+def _claims(**overrides):
+    claims = {
+        "sub": "11111111-1111-1111-1111-111111111111",
+        "aud": "authenticated",
+        "iss": f"{URL}/auth/v1",
+        "exp": int(time.time()) + 3600,
+        "email": "a@example.com",
+        "app_metadata": {"role": "super-admin"},
+    }
+    claims.update(overrides)
+    return claims
+
+
+def _verifier(secret=SECRET):
+    return SupabaseJwtVerifier(supabase_url=URL, jwt_secret=secret, jwks_refresh_s=600, cache_ttl_s=60)
+
+
+@pytest.mark.asyncio
+async def test_hs256_token_verified_locally_and_cached():
+    verifier = _verifier()
+    token = jwt.encode(_claims(), SECRET, algorithm="HS256")
+
+    user = await verifier.verify(token)
+    assert user.id == _claims()["sub"]
+    assert user.app_metadata == {"role": "super-admin"}
+
+    with patch.object(verifier_module.jwt, "decode") as decode:
+        assert await verifier.verify(token) is user
+    decode.assert_not_called()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("overrides", [
+    {"exp": int(time.time()) - 60},
+    {"aud": "anon"},
+    {"iss": "https://evil.example/auth/v1"},
+])
+async def test_expired_wrong_audience_or_issuer_rejected(overrides):
+    token = jwt.encode(_claims(**overrides), SECRET, algorithm="HS256")
+    with pytest.raises(JWTError):
+        await _verifier().verify(token)
+
+
+@pytest.mark.asyncio
+async def test_bad_signature_rejected():
+    token = jwt.encode(_claims(), "other-secret", algorithm="HS256")
+    with pytest.raises(JWTError):
+        await _verifier().verify(token)
+
+
+@pytest.mark.asyncio
+async def test_hs256_without_secret_is_unavailable():
+    token = jwt.encode(_claims(), SECRET, algorithm="HS256")
+    with pytest.raises(VerifierUnavailable):
+        await _verifier(secret="").verify(token)
+
+
+@pytest.mark.asyncio
+async def test_es256_uses_cached_jwks():
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    public_jwk = {**jwk.construct(public_pem, "ES256").to_dict(), "kid": "key-1"}
+    fetches = []
+
+    def handler(request):
+        fetches.append(request.url)
+        return httpx.Response(200, json={"keys": [public_jwk]})
+
+    real_client = httpx.AsyncClient
+    verifier = _verifier(secret="")
+    with patch.object(verifier_module.httpx, "AsyncClient",
+                      lambda **kw: real_client(transport=httpx.MockTransport(handler))):
+        for i in range(3):
+            token = jwt.encode(_claims(email=f"{i}@x"), private_pem, algorithm="ES256", headers={"kid": "key-1"})
+            assert (await verifier.verify(token)).email == f"{i}@x"
+        unknown = jwt.encode(_claims(), private_pem, algorithm="ES256", headers={"kid": "key-2"})
+        with pytest.raises(JWTError):
+            await verifier.verify(unknown)
+
+    # One fetch; the unknown kid's refetch is throttled by JWKS_MIN_REFETCH_S
+    assert len(fetches) == 1
+    assert str(fetches[0]) == f"{URL}/auth/v1/.well-known/jwks.json"
+
+
+def _credentials(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_rejects_invalid_token_without_remote_call():
+    auth = MagicMock()
+    with patch.object(dependencies, "jwt_verifier", _verifier()), \
+         patch.object(dependencies.supabase_client, "auth", auth):
+        with pytest.raises(HTTPException) as exc:
+            await dependencies.get_current_user(_credentials("not-a-jwt"))
+    assert exc.value.status_code == 401
+    auth.get_user.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_falls_back_to_remote_when_unverifiable():
+    auth = MagicMock()
+    auth.get_user.return_value = SimpleNamespace(user=SimpleNamespace(id="u1"))
+    token = jwt.encode(_claims(), SECRET, algorithm="HS256")
+    with patch.object(dependencies, "jwt_verifier", _verifier(secret="")), \
+         patch.object(dependencies.supabase_client, "auth", auth):
+        assert (await dependencies.get_current_user(_credentials(token))).id == "u1"
+        # Strict always asks Supabase Auth, even for a locally valid token
+        assert (await dependencies.get_current_user_strict(_credentials(token))).id == "u1"
+    assert auth.get_user.call_count == 2
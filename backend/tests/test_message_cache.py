@@ -0,0 +1,152 @@
+"""
+Tests for the per-user message history cache (services/messages/store.py).
+Redis is replaced by an in-memory double that runs the two Lua scripts' logic in Python;
+PostgREST is a MagicMock returning a fixed newest-first page.
+"""
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.messages import store
+from app.services.messages.store import MessageHistoryCache
+
+
+class LuaRedis:
+    """hgetall/lrange plus eval() emulating _APPEND_LUA and _FILL_LUA."""
+
+    def __init__(self):
+        self.lists: dict[str, list[bytes]] = {}
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.before_fill = None  # hook to simulate a write racing a fill
+
+    async def hgetall(self, key):
+        return {k.encode(): v.encode() for k, v in self.hashes.get(key, {}).items()}
+
+    async def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    async def eval(self, script, numkeys, list_key, meta_key, *argv):
+        meta = self.hashes.setdefault(meta_key, {})
+        if script == store._APPEND_LUA:
+            cap, _ttl, *rows = argv
+            meta["v"] = str(int(meta.get("v", 0)) + 1)
+            if meta.get("warm") == "1":
+                items = self.lists.setdefault(list_key, [])
+                items.extend(r.encode() for r in rows)
+                if len(items) > cap:
+                    del items[:-cap]
+                    meta["complete"] = "0"
+            return int(meta["v"])
+        if self.before_fill:
+            await self.before_fill()
+        expected, complete, _ttl, *rows = argv
+        if meta.get("v", "0") != expected:
+            return -1
+        self.lists[list_key] = [r.encode() for r in rows]
+        meta.update(warm="1", complete=complete, v=meta.get("v", "0"))
+        return int(meta["v"])
+
+
+def _row(i, channel="web", user_id="u1"):
+    return {
+        "id": f"00000000-0000-0000-0000-{i:012d}", "user_id": user_id, "avatar_id": None,
+        "channel": channel, "role": "user", "content": f"m{i}",
+        "created_at": f"2026-01-01T10:{i // 60:02d}:{i % 60:02d}+00:00",
+    }
+
+
+def _db(rows):
+    db = MagicMock()
+    query = db.from_.return_value.select.return_value.eq.return_value
+    query.order.return_value.order.return_value.limit.return_value.execute.return_value = (
+        SimpleNamespace(data=list(reversed(rows)))
+    )
+    return db
+
+
+@pytest.fixture
+def redis():
+    fake = LuaRedis()
+    with patch.object(store, "get_redis", return_value=fake):
+        yield fake
+
+
+@pytest.mark.asyncio
+async def test_cold_read_fills_once_then_serves_from_cache(redis):
+    cache = MessageHistoryCache()
+    db = _db([_row(1), _row(2, "whatsapp"), _row(3)])
+
+    page = await cache.page("u1", db, 50, channel="web")
+    assert [r["content"] for r in page] == ["m1", "m3"]
+    assert redis.hashes["ava:msgs:u1:meta"]["warm"] == "1"
+
+    # Second process (empty local tier) reads the Redis list without touching the DB
+    other = MessageHistoryCache()
+    db.reset_mock()
+    assert [r["content"] for r in await other.page("u1", db, 50)] == ["m1", "m2", "m3"]
+    db.from_.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_append_is_visible_to_every_process(redis):
+    api, worker = MessageHistoryCache(), MessageHistoryCache()
+    db = _db([_row(1)])
+    await api.page("u1", db, 50)
+
+    await worker.append("u1", [_row(2)])  # e.g. the photo worker delivering
+    page = await api.page("u1", db, 50)
+    assert [r["content"] for r in page] == ["m1", "m2"]
+
+
+@pytest.mark.asyncio
+async def test_after_cursor_and_window_bounds(redis):
+    cache = MessageHistoryCache()
+    rows = [_row(i) for i in range(1, store.MESSAGE_CACHE_ROWS + 1)]
+    db = _db(rows)  # a full page: history may be longer than the cached window
+
+    newer = await cache.page("u1", db, 50, after_key=(rows[-3]["created_at"], rows[-3]["id"]))
+    assert [r["id"] for r in newer] == [rows[-2]["id"], rows[-1]["id"]]
+    # Cursor older than the window, or more rows than cached: the cache can't answer exactly
+    assert await cache.page("u1", db, 10, after_key=("2025-01-01T00:00:00+00:00", "x")) is None
+    assert await cache.page("u1", db, store.MESSAGE_CACHE_ROWS + 1) is None
+
+
+@pytest.mark.asyncio
+async def test_fill_racing_a_write_is_not_cached(redis):
+    cache = MessageHistoryCache()
+    db = _db([_row(1)])
+
+    async def concurrent_insert():
+        redis.before_fill = None
+        await MessageHistoryCache().append("u1", [_row(2)])
+    redis.before_fill = concurrent_insert
+
+    await cache.page("u1", db, 50)
+    assert "ava:msgs:u1" not in redis.lists
+    assert "u1" not in cache._local
+
+
+@pytest.mark.asyncio
+async def test_redis_down_falls_back_to_database():
+    cache = MessageHistoryCache()
+    with patch.object(store, "get_redis", side_effect=ConnectionError("down")):
+        assert await cache.page("u1", _db([_row(1)]), 50) is None
+
+
+@pytest.mark.asyncio
+async def test_insert_messages_writes_through_and_publishes_web_rows():
+    admin = MagicMock()
+    admin.from_.return_value.insert.return_value.execute.return_value = SimpleNamespace(
+        data=[_row(1, "whatsapp"), _row(2, "web", user_id="u2")]
+    )
+    with patch.object(store, "supabase_admin", admin), \
+         patch.object(store.message_cache, "append", AsyncMock()) as append, \
+         patch.object(store.chat_updates, "publish", AsyncMock()) as publish:
+        inserted = await store.insert_messages([{"content": "x"}])
+
+    assert len(inserted) == 2
+    assert sorted(c.args[0] for c in append.await_args_list) == ["u1", "u2"]
+    publish.assert_awaited_once_with("u2")
+    assert json.dumps(append.await_args_list[0].args[1])  # serialisable for the Redis list
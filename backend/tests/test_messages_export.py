@@ -0,0 +1,137 @@
+"""
+Tests for GET /messages keyset pagination (`before` cursor) and the NDJSON
+GET /messages/export stream. PostgREST is replaced by a query double that applies
+the keyset or_() filter, ordering and limit to an in-memory table.
+"""
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.routers import messages
+from app.services.messages.cursor import decode_cursor
+
+ROWS = [
+    {"id": f"00000000-0000-0000-0000-{i:012d}", "user_id": "u1", "avatar_id": None,
+     "channel": "web", "role": "user", "content": f"m{i}",
+     "created_at": f"2026-01-01T10:{i // 60:02d}:{i % 60:02d}+00:00"}
+    for i in range(1, 1201)
+]
+
+
+class TableQuery:
+    def __init__(self, db):
+        self.db = db
+        self.key = None
+        self.op = None
+        self.desc = False
+        self.limit_n = None
+
+    def select(self, fields):
+        self.db.selects.append(fields)
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def or_(self, expr):
+        self.op = "gt" if expr.startswith("created_at.gt") else "lt"
+        self.key = expr.split('"')[1], expr.rsplit(".", 1)[1].rstrip(")")
+        return self
+
+    def order(self, column, desc=False):
+        self.desc = desc
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def execute(self):
+        self.db.pages += 1
+        rows = sorted(self.db.rows, key=lambda r: (r["created_at"], r["id"]), reverse=self.desc)
+        if self.key:
+            if self.op == "gt":
+                rows = [r for r in rows if (r["created_at"], r["id"]) > self.key]
+            else:
+                rows = [r for r in rows if (r["created_at"], r["id"]) < self.key]
+        return SimpleNamespace(data=rows[: self.limit_n])
+
+
+class TableDb:
+    def __init__(self, rows):
+        self.rows = rows
+        self.pages = 0
+        self.selects = []
+
+    def from_(self, table):
+        return TableQuery(self)
+
+
+USER = SimpleNamespace(id="u1")
+
+
+@pytest.fixture(autouse=True)
+def no_message_cache():
+    with patch.object(messages.message_cache, "page", AsyncMock(return_value=None)):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_before_cursor_pages_backwards_without_gaps():
+    db = TableDb(ROWS[:120])
+    seen, before = [], None
+    while True:
+        response = Response()
+        page = await messages.get_message_history(response, limit=50, before=before, user=USER, db=db)
+        seen.extend(r["content"] for r in page)
+        before = response.headers.get("X-Cursor")
+        if not before:
+            break
+    assert seen == [f"m{i}" for i in range(120, 0, -1)]
+    assert all(s == messages.MESSAGE_FIELDS for s in db.selects)  # projected, not select("*")
+
+
+@pytest.mark.asyncio
+async def test_full_last_page_cursor_then_empty_page():
+    db = TableDb(ROWS[:50])
+    first = Response()
+    await messages.get_message_history(first, limit=50, before=None, user=USER, db=db)
+    assert decode_cursor(first.headers["X-Cursor"])[1] == ROWS[0]["id"]
+
+    second = Response()
+    page = await messages.get_message_history(
+        second, limit=50, before=first.headers["X-Cursor"], user=USER, db=db,
+    )
+    assert page == []
+    assert "X-Cursor" not in second.headers
+
+
+@pytest.mark.asyncio
+async def test_invalid_before_cursor_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        await messages.get_message_history(Response(), limit=50, before="nope", user=USER, db=TableDb([]))
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_streams_every_row_oldest_first_in_bounded_pages():
+    db = TableDb(ROWS)
+    response = await messages.export_message_history(user=USER, db=db)
+    assert response.media_type == "application/x-ndjson"
+    assert "attachment" in response.headers["content-disposition"]
+
+    chunks = [chunk async for chunk in response.body_iterator]
+    lines = b"".join(chunks).decode().splitlines()
+    assert [json.loads(line)["content"] for line in lines] == [r["content"] for r in ROWS]
+    # 1200 rows / 500 per page: every chunk holds at most one page
+    assert db.pages == 3
+    assert max(c.count(b"\n") for c in chunks) <= messages.EXPORT_PAGE_SIZE
+
+
+@pytest.mark.asyncio
+async def test_export_of_empty_history_is_empty():
+    response = await messages.export_message_history(user=USER, db=TableDb([]))
+    assert [chunk async for chunk in response.body_iterator] == []
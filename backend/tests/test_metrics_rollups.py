@@ -0,0 +1,176 @@
+"""
+Tests for admin metrics rollups (services/metrics/rollups.py), the paginated auth user
+scan, and GET /admin/metrics answering from rollups. supabase_admin is a MagicMock;
+Redis is an in-memory double.
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers import admin
+from app.services.metrics import rollups
+
+SUMMARY = {
+    "daily": {
+        "message_sent": {"d7": 40, "d30": 120, "all": 900},
+        "photo_generated": {"d7": 3, "d30": 9, "all": 50},
+        "new_signup": {"d7": 2, "d30": 5, "all": 30},
+    },
+    "gauges": {
+        "active_users": {"d7": 7, "d30": 12, "all": 30, "computed_at": "2026-10-19T10:00:00+00:00"},
+    },
+}
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reads_one_rpc():
+    db = MagicMock()
+    db.rpc.return_value.execute.return_value = SimpleNamespace(data=SUMMARY)
+    with patch.object(rollups, "supabase_admin", db):
+        metrics = await admin.get_metrics(user=MagicMock())
+
+    db.rpc.assert_called_once_with("admin_metrics_summary", {})
+    db.from_.assert_not_called()
+    db.auth.admin.list_users.assert_not_called()
+    assert metrics["messages_sent"] == {"d7": 40, "d30": 120, "all": 900}
+    assert metrics["new_signups"] == {"d7": 2, "d30": 5, "all": 30}
+    assert metrics["active_users"] == {"d7": 7, "d30": 12, "all": 30}
+    # No gauge row yet (before the first reconcile) reads as zeros
+    assert metrics["active_subscriptions"] == {"d7": 0, "d30": 0, "all": 0}
+    assert metrics["gauges_computed_at"] == "2026-10-19T10:00:00+00:00"
+    assert "fetched_at" in metrics
+
+
+@pytest.fixture
+def redis(memory_redis):
+    rollups._user_metrics_local.clear()
+    with patch.object(rollups, "get_redis", return_value=memory_redis):
+        yield memory_redis
+    rollups._user_metrics_local.clear()
+
+
+def _user(days_ago_signed_in=None, days_ago_created=400):
+    now = datetime.now(timezone.utc)
+    return SimpleNamespace(
+        last_sign_in_at=(now - timedelta(days=days_ago_signed_in)).isoformat() if days_ago_signed_in is not None else None,
+        created_at=(now - timedelta(days=days_ago_created)).isoformat(),
+    )
+
+
+def _db_with_subscription_counts(total=4, recent=1):
+    db = MagicMock()
+    db.rpc.return_value.execute.return_value = SimpleNamespace(data=12)
+    db.from_.return_value.select.return_value.eq.return_value.execute.return_value = SimpleNamespace(count=total)
+    db.from_.return_value.select.return_value.eq.return_value.gte.return_value.execute.return_value = \
+        SimpleNamespace(count=recent)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_user_scan_pages_through_every_user(redis):
+    pages = {1: [_user(1), _user(10)], 2: [_user(40), _user(None, 2)], 3: [_user(3)]}
+    db = MagicMock()
+    db.auth.admin.list_users.side_effect = lambda page, per_page: pages[page]
+    with patch.object(rollups, "supabase_admin", db), \
+         patch.object(rollups.settings, "admin_user_page_size", 2):
+        metrics = await rollups.compute_user_metrics()
+
+    assert db.auth.admin.list_users.call_count == 3  # stops after the short page
+    assert metrics["active_users"] == {"d7": 2, "d30": 3, "all": 5}
+    assert metrics["new_signups"] == {"d7": 1, "d30": 1, "all": 5}
+
+
+@pytest.mark.asyncio
+async def test_user_metrics_are_cached_across_refreshes(redis):
+    db = MagicMock()
+    db.auth.admin.list_users.return_value = [_user(1)]
+    with patch.object(rollups, "supabase_admin", db):
+        first = await rollups.get_user_metrics()
+        await rollups.get_user_metrics()
+        rollups._user_metrics_local.clear()  # another process: served from Redis
+        assert await rollups.get_user_metrics() == first
+    assert db.auth.admin.list_users.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_reconcile_rewrites_days_and_upserts_gauges(redis):
+    db = _db_with_subscription_counts()
+    db.auth.admin.list_users.return_value = [_user(30 * 12)]
+    with patch.object(rollups, "supabase_admin", db):
+        await rollups.reconcile_metrics(days=5)
+
+    db.rpc.assert_called_once_with("reconcile_metrics_daily", {"p_days": 5})
+    gauges = {g["metric"]: g for g in db.from_.return_value.upsert.call_args.args[0]}
+    assert (gauges["active_subscriptions"]["d7"], gauges["active_subscriptions"]["all_time"]) == (1, 4)
+    assert (gauges["active_users"]["d7"], gauges["active_users"]["all_time"]) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_keeps_previous_user_gauge_when_auth_fails(redis):
+    db = _db_with_subscription_counts(0, 0)
+    db.auth.admin.list_users.side_effect = RuntimeError("auth down")
+    with patch.object(rollups, "supabase_admin", db):
+        await rollups.reconcile_metrics()
+    metrics = [g["metric"] for g in db.from_.return_value.upsert.call_args.args[0]]
+    assert metrics == ["active_subscriptions"]
+    assert rollups.USER_METRICS_KEY not in redis.strings  # failures are not cached
+
+
+@pytest.mark.asyncio
+async def test_reconcile_loop_runs_once_per_interval_across_replicas():
+    claimed = set()
+
+    class NxRedis:
+        async def set(self, key, value, nx=False, ex=None):
+            if nx and key in claimed:
+                return None
+            claimed.add(key)
+            return True
+
+    runs = []
+    with patch.object(rollups, "get_redis", return_value=NxRedis()), \
+         patch.object(rollups, "reconcile_metrics", AsyncMock(side_effect=lambda: runs.append(1))):
+        replicas = [asyncio.ensure_future(rollups.run_reconcile_loop()) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        for task in replicas:
+            task.cancel()
+    assert len(runs) == 1
+
+
+def test_bucket_series_zero_fills_days_and_clips_weeks():
+    rows = [{"day": "2026-10-05", "value": 2}, {"day": "2026-10-07", "value": 3}, {"day": "2026-10-13", "value": 4}]
+    start, end = date(2026, 10, 4), date(2026, 10, 13)  # Sunday .. Tuesday
+
+    days = rollups.bucket_series(rows, start, end, "day")
+    assert len(days) == 10 and days[1] == {"start": "2026-10-05", "value": 2} and days[2]["value"] == 0
+
+    weeks = rollups.bucket_series(rows, start, end, "week")
+    assert weeks == [
+        {"start": "2026-10-04", "value": 0},  # clipped: Sunday only
+        {"start": "2026-10-05", "value": 5},
+        {"start": "2026-10-12", "value": 4},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_timeseries_endpoint_reads_rollups_once_per_window():
+    rollups._timeseries_cache.clear()
+    db = MagicMock()
+    query = db.from_.return_value.select.return_value.eq.return_value.gte.return_value.lte.return_value.order.return_value
+    query.execute.return_value = SimpleNamespace(data=[{"day": "2026-01-02", "value": 7}])
+    with patch.object(rollups, "supabase_admin", db):
+        for _ in range(2):
+            series = await admin.get_metrics_timeseries(
+                "messages_sent", from_=date(2026, 1, 1), to=date(2026, 1, 31), bucket="week", user=MagicMock(),
+            )
+    assert query.execute.call_count == 1
+    db.from_.return_value.select.return_value.eq.assert_called_once_with("metric", "message_sent")
+    assert series["total"] == 7 and series["points"][0]["start"] == "2026-01-01"
+
+    with pytest.raises(HTTPException) as exc:
+        await admin.get_metrics_timeseries("active_users", from_=None, to=None, bucket="week", user=MagicMock())
+    assert exc.value.status_code == 400
@@ -0,0 +1,87 @@
+"""
+Tests for the cached phone -> user lookup (user_lookup.py), its invalidation from
+PUT /preferences/whatsapp, and the unlinked-sender reply rate limit.
+Redis is an in-memory double; supabase_admin and the RLS client are MagicMocks.
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.models.preferences import PhoneLinkRequest
+from app.routers import preferences
+from app.services import user_lookup, whatsapp
+
+
+def _admin(*results):
+    admin = MagicMock()
+    execute = admin.from_.return_value.select.return_value.eq.return_value.limit.return_value.execute
+    execute.side_effect = [SimpleNamespace(data=r) for r in results]
+    return admin, execute
+
+
+@pytest.fixture
+def redis(memory_redis):
+    user_lookup._phone_local.clear()
+    with patch.object(user_lookup, "get_redis", return_value=memory_redis), \
+         patch.object(whatsapp, "get_redis", return_value=memory_redis):
+        yield memory_redis
+    user_lookup._phone_local.clear()
+
+
+@pytest.mark.asyncio
+async def test_linked_number_hits_db_once(redis):
+    admin, execute = _admin([{"user_id": "u1"}])
+    with patch.object(user_lookup, "supabase_admin", admin):
+        for _ in range(3):
+            assert await user_lookup.lookup_user_by_phone("+33600000000") == {"user_id": "u1"}
+        user_lookup._phone_local.clear()  # another process: served from Redis
+        assert await user_lookup.lookup_user_by_phone("+33600000000") == {"user_id": "u1"}
+    assert execute.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_unlinked_number_is_negatively_cached_with_short_ttl(redis):
+    admin, execute = _admin([])
+    with patch.object(user_lookup, "supabase_admin", admin):
+        assert await user_lookup.lookup_user_by_phone("+1555") is None
+        assert await user_lookup.lookup_user_by_phone("+1555") is None
+    assert execute.call_count == 1
+    assert redis.ttls["ava:phone_user:+1555"] == user_lookup.settings.phone_lookup_negative_ttl_s
+    assert "+1555" not in user_lookup._phone_local  # negatives never cached per process
+
+
+@pytest.mark.asyncio
+async def test_db_errors_are_not_cached(redis):
+    admin = MagicMock()
+    admin.from_.side_effect = [RuntimeError("db down"), MagicMock()]
+    with patch.object(user_lookup, "supabase_admin", admin):
+        assert await user_lookup.lookup_user_by_phone("+1555") is None
+    assert redis.strings == {}
+
+
+@pytest.mark.asyncio
+async def test_linking_a_number_invalidates_old_and_new(redis):
+    admin, _ = _admin([], [{"user_id": "u1"}])
+    with patch.object(user_lookup, "supabase_admin", admin):
+        assert await user_lookup.lookup_user_by_phone("+33611111111") is None  # cached unlinked
+        redis.strings["ava:phone_user:+33600000000"] = "u1"  # previous number
+
+        db = MagicMock()
+        db.from_.return_value.select.return_value.eq.return_value.execute.return_value = (
+            SimpleNamespace(data=[{"whatsapp_phone": "+33600000000"}])
+        )
+        with patch.object(preferences.settings, "whatsapp_access_token", ""):
+            await preferences.link_whatsapp(
+                PhoneLinkRequest(phone="+33611111111"), user=SimpleNamespace(id="u1"), db=db,
+            )
+
+        assert redis.strings == {}
+        assert await user_lookup.lookup_user_by_phone("+33611111111") == {"user_id": "u1"}
+
+
+@pytest.mark.asyncio
+async def test_unlinked_sender_gets_one_reply_per_window(redis):
+    assert await whatsapp.allow_unlinked_reply("+1555") is True
+    assert await whatsapp.allow_unlinked_reply("+1555") is False
+    assert await whatsapp.allow_unlinked_reply("+1666") is True
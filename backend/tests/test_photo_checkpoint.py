@@ -0,0 +1,195 @@
+"""
+Tests for stage-checkpointed photo jobs (processor.py + checkpoint.py).
+Redis is the shared in-memory double; supabase_admin and ComfyUI are mocked.
+"""
+import io
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from PIL import Image
+
+from app.services.image.base import GeneratedImage
+from app.services.jobs import processor
+from app.services.jobs.checkpoint import PhotoJobCheckpoint
+
+
+def _png_bytes() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _job(attempts_made=0):
+    return SimpleNamespace(
+        id="job-1",
+        data={
+            "user_id": "user-1",
+            "scene_description": "at the beach",
+            "avatar": {"id": "av-1", "gender": "female", "nationality": "french"},
+            "channel": "web",
+        },
+        attemptsMade=attempts_made,
+        opts={"attempts": 3},
+    )
+
+
+@pytest.fixture
+def env(tmp_path, memory_redis):
+    redis = memory_redis
+    admin = MagicMock()
+    admin.storage.from_.return_value.create_signed_url.return_value = {"signedURL": "https://x/ref"}
+    generate = AsyncMock(return_value=GeneratedImage(
+        url="", model="comfyui", prompt="p", image_bytes=_png_bytes(),
+    ))
+
+    def make_checkpoint(job_id):
+        return PhotoJobCheckpoint(job_id, redis=redis, spool_dir=tmp_path)
+
+    with patch.object(processor, "supabase_admin", admin), \
+         patch.object(processor, "PhotoJobCheckpoint", side_effect=make_checkpoint), \
+         patch.object(processor._image_provider, "generate", generate), \
+         patch.object(processor, "release_photo_slot", AsyncMock()), \
+         patch.object(processor.photo_urls, "sign", AsyncMock(return_value="https://x/ref")), \
+         patch.object(processor, "insert_messages", AsyncMock()) as insert_messages:
+        yield SimpleNamespace(
+            redis=redis, admin=admin, generate=generate, spool=tmp_path,
+            insert_messages=insert_messages,
+        )
+
+
+@pytest.mark.asyncio
+async def test_retry_after_upload_failure_does_not_regenerate(env):
+    upload = env.admin.storage.from_.return_value.upload
+    upload.side_effect = [RuntimeError("storage down"), None]
+
+    with pytest.raises(RuntimeError):
+        await processor.process_photo_job(_job(attempts_made=0))
+    assert env.generate.await_count == 1
+    assert env.redis.hashes["ava:photo_job:job-1"]["stage"] == "watermarked"
+
+    await processor.process_photo_job(_job(attempts_made=1))
+    assert env.generate.await_count == 1  # resumed from spooled bytes
+    assert upload.call_count == 2
+    # Success clears state and spool files
+    assert "ava:photo_job:job-1" not in env.redis.hashes
+    assert list(env.spool.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_delivery_is_idempotent(env):
+    await processor.process_photo_job(_job())
+    assert env.insert_messages.await_count == 1
+
+    # Stalled-job re-run with lost stage state: delivery key blocks a second message
+    await processor.process_photo_job(_job(attempts_made=1))
+    assert env.insert_messages.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_delivery_releases_key_for_retry(env):
+    with patch.object(processor, "_deliver_web", AsyncMock(side_effect=[RuntimeError("db"), None])) as deliver:
+        with pytest.raises(RuntimeError):
+            await processor.process_photo_job(_job(attempts_made=0))
+        assert "ava:photo_job:job-1:delivery" not in env.redis.strings
+
+        await processor.process_photo_job(_job(attempts_made=1))
+    assert deliver.await_count == 2
+    assert env.generate.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_whatsapp_final_failure_sends_text_not_storage_path(env):
+    env.generate.side_effect = RuntimeError("comfy down")
+    job = _job(attempts_made=2)
+    job.data["channel"] = "whatsapp"
+
+    with patch.object(processor, "_send_whatsapp_text", AsyncMock()) as send_text, \
+         patch.object(processor, "_deliver_whatsapp", AsyncMock()) as deliver:
+        with pytest.raises(RuntimeError):
+            await processor.process_photo_job(job)
+    send_text.assert_awaited_once_with("user-1", processor.PHOTO_FAILURE_MSG)
+    deliver.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_without_redis_starts_fresh(tmp_path):
+    broken = MagicMock()
+    broken.hgetall = AsyncMock(side_effect=ConnectionError("no redis"))
+    broken.set = AsyncMock(side_effect=ConnectionError("no redis"))
+    cp = PhotoJobCheckpoint("job-2", redis=broken, spool_dir=tmp_path)
+    assert await cp.load() == {}
+    assert not cp.reached("generated")
+    assert await cp.claim_delivery() is True
+
+
+@pytest.mark.asyncio
+async def test_reference_job_uses_shared_stages_and_stores_path(env):
+    avatars = env.admin.from_.return_value
+    avatars.select.return_value.eq.return_value.execute.return_value = SimpleNamespace(
+        data=[{"id": "av-1", "user_id": "user-1", "gender": "female"}]
+    )
+    avatars.update.return_value.eq.return_value.execute.return_value = SimpleNamespace(data=[{"id": "av-1"}])
+    job = SimpleNamespace(
+        id="reference-1", name="generate_reference", data={"user_id": "user-1"},
+        attemptsMade=0, opts={"attempts": 3},
+    )
+
+    await processor.process_job(job)
+
+    # Text-to-image — no reference exists yet
+    assert env.generate.await_args.kwargs["reference_image_url"] is None
+    upload = env.admin.storage.from_.return_value.upload
+    assert upload.call_args.args[0] == "user-1/reference.jpg"
+    avatars.update.assert_called_once_with({"reference_image_url": "user-1/reference.jpg"})
+
+
+@pytest.mark.asyncio
+async def test_unwritable_spool_dir_processes_in_memory(env, tmp_path):
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    with patch.object(processor, "PhotoJobCheckpoint",
+                      side_effect=lambda job_id: PhotoJobCheckpoint(job_id, redis=env.redis, spool_dir=blocker / "spool")):
+        await processor.process_photo_job(_job())
+
+    upload = env.admin.storage.from_.return_value.upload
+    assert upload.call_args.args[0] == "user-1/job-1.jpg"
+    assert isinstance(upload.call_args.args[1], bytes)
+    assert env.insert_messages.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_spool_write_error_after_generation_finishes_in_memory_without_regenerating(env):
+    with patch.object(processor, "apply_watermark_file", side_effect=OSError(28, "No space left on device")):
+        await processor.process_photo_job(_job())
+
+    env.generate.assert_awaited_once()  # the raw spool file is reused
+    upload = env.admin.storage.from_.return_value.upload
+    assert isinstance(upload.call_args.args[1], bytes)
+    assert env.insert_messages.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_spool_write_error_before_generation_falls_back_to_memory(env):
+    with patch.object(processor, "_spool_generated", side_effect=OSError(28, "No space left on device")):
+        await processor.process_photo_job(_job())
+
+    upload = env.admin.storage.from_.return_value.upload
+    assert isinstance(upload.call_args.args[1], bytes)
+    assert env.insert_messages.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_unreadable_raw_spool_after_generation_fails_the_attempt(env):
+    def lose_spool(src, dst):
+        src.unlink()
+        raise OSError(5, "Input/output error")
+
+    with patch.object(processor, "apply_watermark_file", side_effect=lose_spool), \
+         patch.object(processor, "_in_memory_stages", AsyncMock()) as in_memory:
+        with pytest.raises(OSError):
+            await processor._generate_and_upload(
+                PhotoJobCheckpoint("job-1", redis=env.redis, spool_dir=env.spool), "p", "user-1/job-1.jpg",
+            )
+    env.generate.assert_awaited_once()
+    in_memory.assert_not_awaited()  # BullMQ retries rather than generating a second time
@@ -0,0 +1,73 @@
+"""
+Memory-peak benchmark for the photo pipeline's streaming path.
+
+The ComfyUI /api/view download is served by an httpx.MockTransport that yields the
+body lazily, so tracemalloc sees exactly what the provider keeps in memory:
+the whole image for the legacy bytes path, roughly one chunk for the streamed path.
+Run with -s to see the measured peaks.
+"""
+import tracemalloc
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.services.image.comfyui_provider import DOWNLOAD_CHUNK_SIZE, ComfyUIProvider
+from app.services.image.watermark import apply_watermark_file
+
+IMAGE_SIZE = 16 * 1024 * 1024  # a large upscaled output
+OUTPUTS = {"9": {"images": [{"filename": "out.png", "subfolder": ""}]}}
+
+
+def _view_transport() -> httpx.MockTransport:
+    async def body():
+        for _ in range(IMAGE_SIZE // DOWNLOAD_CHUNK_SIZE):
+            yield b"\0" * DOWNLOAD_CHUNK_SIZE
+
+    return httpx.MockTransport(lambda request: httpx.Response(200, content=body()))
+
+
+async def _peak_during(coro_factory) -> int:
+    async with httpx.AsyncClient(transport=_view_transport()) as client:
+        tracemalloc.start()
+        try:
+            await coro_factory(client)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return peak
+
+
+@pytest.mark.asyncio
+async def test_streamed_download_peak_is_chunk_sized(tmp_path):
+    provider = ComfyUIProvider()
+    dest = tmp_path / "job.raw.part"
+
+    buffered_peak = await _peak_during(
+        lambda client: provider._download_output(client, OUTPUTS, "9")
+    )
+    streamed_peak = await _peak_during(
+        lambda client: provider._download_output(client, OUTPUTS, "9", dest=dest)
+    )
+    print(f"\nComfyUI download peak: buffered={buffered_peak / 2**20:.1f} MB "
+          f"streamed={streamed_peak / 2**20:.2f} MB")
+
+    assert dest.stat().st_size == IMAGE_SIZE
+    assert buffered_peak >= IMAGE_SIZE
+    assert streamed_peak < IMAGE_SIZE // 8
+
+
+def test_file_watermark_writes_jpeg_of_same_dimensions(tmp_path):
+    src = tmp_path / "job.raw.jpg"
+    dst = tmp_path / "job.watermarked.part"
+    Image.new("RGB", (1024, 1536), "black").save(src, format="PNG")
+
+    apply_watermark_file(src, dst)
+
+    with Image.open(dst) as out:
+        assert out.format == "JPEG"
+        assert out.size == (1024, 1536)
+        # Watermark text lands in the bottom-right corner only
+        assert out.getbbox() is not None
+        left, top, _, _ = out.getbbox()
+        assert left > 1024 // 2 and top > 1536 * 9 // 10
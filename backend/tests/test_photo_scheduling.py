@@ -0,0 +1,88 @@
+"""
+Tests for photo queue scheduling — per-user in-flight cap, tier priority, dedup.
+Redis is the shared in-memory double; supabase_admin is mocked.
+"""
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.jobs import queue, scheduling
+from app.services.jobs.scheduling import DUPLICATE, ENQUEUED, THROTTLED
+
+
+@pytest.fixture
+def redis(memory_redis):
+    with patch.object(scheduling, "get_redis", return_value=memory_redis), \
+         patch.object(scheduling.settings, "photo_max_inflight_per_user", 2):
+        yield memory_redis
+
+
+@pytest.mark.asyncio
+async def test_identical_pending_scene_is_coalesced(redis):
+    assert await scheduling.acquire_photo_slot("u1", "At the beach", "j1") == ENQUEUED
+    assert await scheduling.acquire_photo_slot("u1", "  at the   BEACH ", "j2") == DUPLICATE
+    # Another user asking for the same scene is independent
+    assert await scheduling.acquire_photo_slot("u2", "At the beach", "j3") == ENQUEUED
+
+
+@pytest.mark.asyncio
+async def test_per_user_inflight_cap(redis):
+    assert await scheduling.acquire_photo_slot("u1", "scene a", "j1") == ENQUEUED
+    assert await scheduling.acquire_photo_slot("u1", "scene b", "j2") == ENQUEUED
+    assert await scheduling.acquire_photo_slot("u1", "scene c", "j3") == THROTTLED
+    # Throttled request leaves no dedup key behind — retrying later is allowed
+    await scheduling.release_photo_slot("u1", "scene a", "j1")
+    assert await scheduling.acquire_photo_slot("u1", "scene c", "j4") == ENQUEUED
+
+
+@pytest.mark.asyncio
+async def test_release_is_idempotent_and_clears_dedup(redis):
+    await scheduling.acquire_photo_slot("u1", "scene a", "j1")
+    await scheduling.release_photo_slot("u1", "scene a", "j1")
+    await scheduling.release_photo_slot("u1", "scene a", "j1")
+    assert await redis.zcard("ava:photo_inflight:u1") == 0
+    assert await scheduling.acquire_photo_slot("u1", "scene a", "j2") == ENQUEUED
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_fails_open():
+    broken = MagicMock()
+    broken.set.side_effect = ConnectionError("no redis")
+    with patch.object(scheduling, "get_redis", return_value=broken):
+        assert await scheduling.acquire_photo_slot("u1", "scene", "j1") == ENQUEUED
+
+
+@pytest.mark.asyncio
+async def test_priority_follows_subscription_tier():
+    admin = MagicMock()
+    chain = admin.from_.return_value.select.return_value.eq.return_value.limit.return_value
+    with patch.object(scheduling, "supabase_admin", admin), \
+         patch.multiple(
+             scheduling.settings,
+             stripe_price_id_basic="price_b",
+             stripe_price_id_premium="price_p",
+             stripe_price_id_elite="price_e",
+         ):
+        chain.execute.return_value = SimpleNamespace(data=[{"stripe_price_id": "price_e"}])
+        elite = await scheduling.get_photo_priority("u1")
+        chain.execute.return_value = SimpleNamespace(data=[{"stripe_price_id": "price_b"}])
+        basic = await scheduling.get_photo_priority("u1")
+        chain.execute.return_value = SimpleNamespace(data=[])
+        none = await scheduling.get_photo_priority("u1")
+
+    assert scheduling.PRIORITY_REFERENCE < elite < basic < none
+
+
+@pytest.mark.asyncio
+async def test_failed_queue_add_releases_slot_and_dedup_key(redis):
+    broken_queue = MagicMock(add=AsyncMock(side_effect=ConnectionError("bullmq down")))
+    with patch.object(queue, "get_photo_queue", return_value=broken_queue), \
+         patch.object(queue, "get_photo_priority", AsyncMock(return_value=10)):
+        with pytest.raises(ConnectionError):
+            await queue.enqueue_photo_job("u1", "scene a", {}, "web")
+
+    assert redis.strings == {}
+    assert redis.zsets[scheduling._inflight_key("u1")] == {}
+    # The same request can be retried right away
+    assert await scheduling.acquire_photo_slot("u1", "scene a", "j2") == ENQUEUED
@@ -0,0 +1,139 @@
+"""
+Tests for TTLCache and SignedUrlService (bulk signing, single-flight, cache tiers).
+Storage is mocked; the Redis tier is disabled except where a test supplies a double.
+"""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.services.cache.lru import TTLCache
+from app.services.storage import signed_urls
+from app.services.storage.signed_urls import SignedUrlService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expires_entries():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl_s=5, clock=clock)
+    cache.set("a", 1)
+    clock.now = 4.9
+    assert cache.get("a") == 1
+    clock.now = 5.0
+    assert cache.get("a") is None
+    assert "a" not in cache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl_s=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # a is now most recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def _storage(calls: list):
+    def create_signed_urls(paths, expires_in):
+        calls.append(list(paths))
+        return [
+            {"path": p, "signedURL": f"https://cdn/{p}?token=t", "signedUrl": f"https://cdn/{p}?token=t", "error": None}
+            for p in paths
+        ]
+
+    admin = MagicMock()
+    admin.storage.from_.return_value.create_signed_urls.side_effect = create_signed_urls
+    return admin
+
+
+@pytest.mark.asyncio
+async def test_page_is_signed_in_one_bulk_call_then_cached():
+    calls = []
+    service = SignedUrlService("photos", use_redis=False)
+    with patch.object(signed_urls, "supabase_admin", _storage(calls)):
+        urls = await service.sign_many(["u/1.jpg", "u/2.jpg", "u/1.jpg"])
+        again = await service.sign_many(["u/1.jpg", "u/2.jpg"])
+    assert calls == [["u/1.jpg", "u/2.jpg"]]
+    assert urls == again
+    assert urls["u/2.jpg"] == "https://cdn/u/2.jpg?token=t"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_in_flight_sign():
+    calls = []
+    service = SignedUrlService("photos", use_redis=False)
+    gate = asyncio.Event()
+    real_to_thread = asyncio.to_thread
+
+    async def slow_to_thread(fn, *args):
+        await gate.wait()
+        return await real_to_thread(fn, *args)
+
+    with patch.object(signed_urls, "supabase_admin", _storage(calls)), \
+         patch.object(signed_urls.asyncio, "to_thread", slow_to_thread):
+        tasks = [asyncio.ensure_future(service.sign("u/ref.jpg")) for _ in range(5)]
+        await asyncio.sleep(0)
+        gate.set()
+        results = await asyncio.gather(*tasks)
+    assert calls == [["u/ref.jpg"]]
+    assert len(set(results)) == 1 and results[0]
+
+
+@pytest.mark.asyncio
+async def test_failed_sign_is_omitted_and_not_cached():
+    service = SignedUrlService("photos", use_redis=False)
+    admin = MagicMock()
+    admin.storage.from_.return_value.create_signed_urls.side_effect = RuntimeError("storage down")
+    with patch.object(signed_urls, "supabase_admin", admin):
+        assert await service.sign_many(["u/1.jpg"]) == {}
+    assert "u/1.jpg" not in service._local
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_shares_signatures_between_workers():
+    store: dict[str, str] = {}
+
+    class Pipe:
+        def set(self, key, value, ex=None):
+            store[key] = value
+
+        async def execute(self):
+            return []
+
+    redis = MagicMock()
+    redis.pipeline.return_value = Pipe()
+
+    async def mget(keys):
+        return [store.get(k) for k in keys]
+
+    redis.mget = mget
+
+    calls = []
+    worker_a = SignedUrlService("photos")
+    worker_b = SignedUrlService("photos")
+    with patch.object(signed_urls, "supabase_admin", _storage(calls)), \
+         patch.object(signed_urls, "get_redis", return_value=redis):
+        url_a = await worker_a.sign("u/1.jpg")
+        url_b = await worker_b.sign("u/1.jpg")
+    assert calls == [["u/1.jpg"]]
+    assert url_a == url_b
+
+
+@pytest.mark.asyncio
+async def test_sign_fresh_bypasses_cache_and_refreshes_it():
+    calls = []
+    service = SignedUrlService("photos", use_redis=False)
+    with patch.object(signed_urls, "supabase_admin", _storage(calls)):
+        await service.sign("u/1.jpg")
+        assert await service.sign_fresh("u/1.jpg") == "https://cdn/u/1.jpg?token=t"
+        await service.sign("u/1.jpg")
+    assert calls == [["u/1.jpg"], ["u/1.jpg"]]
@@ -0,0 +1,165 @@
+"""
+Tests for asynchronous, idempotent Stripe webhook handling: POST /billing/webhook
+(verify -> record -> enqueue), the stripe_events ledger and per-subscription ordering
+in billing/webhook_events.py, and the billing queue processor.
+Stripe, supabase_admin and BullMQ are mocked.
+"""
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers import billing
+from app.services.billing import subscription, webhook_events
+from app.services.jobs import billing_processor, billing_queue
+
+EVENT = {
+    "id": "evt_1",
+    "type": "invoice.payment_failed",
+    "created": 1700000000,
+    "data": {"object": {"subscription": "sub_1"}},
+}
+
+
+class WebhookRequest:
+    def __init__(self, event):
+        self._body = json.dumps(event).encode()
+        self.headers = {"stripe-signature": "t=1,v1=sig"}
+
+    async def body(self):
+        return self._body
+
+
+@pytest.fixture
+def verified():
+    with patch.object(billing, "verify_webhook_event", MagicMock()) as verify:
+        yield verify
+
+
+@pytest.mark.asyncio
+async def test_webhook_records_enqueues_and_returns(verified):
+    with patch.object(billing, "record_stripe_event", AsyncMock(return_value=True)) as record, \
+         patch.object(billing, "enqueue_stripe_event", AsyncMock(return_value=True)) as enqueue, \
+         patch.object(billing, "process_stripe_event", AsyncMock()) as process:
+        assert await billing.stripe_webhook(WebhookRequest(EVENT)) == {"received": True}
+    record.assert_awaited_once_with(EVENT)
+    enqueue.assert_awaited_once_with(EVENT)
+    process.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_processed_redelivery_is_acknowledged_without_work(verified):
+    with patch.object(billing, "record_stripe_event", AsyncMock(return_value=False)), \
+         patch.object(billing, "enqueue_stripe_event", AsyncMock()) as enqueue:
+        assert await billing.stripe_webhook(WebhookRequest(EVENT)) == {"received": True}
+    enqueue.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_queue_down_processes_inline_and_500s_on_failure(verified):
+    with patch.object(billing, "record_stripe_event", AsyncMock(return_value=True)), \
+         patch.object(billing, "enqueue_stripe_event", AsyncMock(return_value=False)), \
+         patch.object(billing, "process_stripe_event", AsyncMock(side_effect=RuntimeError("db down"))):
+        with pytest.raises(HTTPException) as exc:
+            await billing.stripe_webhook(WebhookRequest(EVENT))
+    assert exc.value.status_code == 500  # Stripe will redeliver
+
+
+@pytest.mark.asyncio
+async def test_record_dedups_on_event_id():
+    db = MagicMock()
+    ledger = db.from_.return_value
+    ledger.upsert.return_value.execute.return_value = SimpleNamespace(data=[{"id": "evt_1"}])
+    with patch.object(webhook_events, "supabase_admin", db):
+        assert await webhook_events.record_stripe_event(EVENT) is True
+    row = ledger.upsert.call_args.args[0]
+    assert (row["id"], row["subscription_id"], row["event_created"]) == ("evt_1", "sub_1", 1700000000)
+    assert ledger.upsert.call_args.kwargs == {"on_conflict": "id", "ignore_duplicates": True}
+
+    ledger.upsert.return_value.execute.return_value = SimpleNamespace(data=[])
+    ledger.select.return_value.eq.return_value.limit.return_value.execute.return_value = \
+        SimpleNamespace(data=[{"status": "processed"}])
+    with patch.object(webhook_events, "supabase_admin", db):
+        assert await webhook_events.record_stripe_event(EVENT) is False
+
+    # A previous attempt that failed is processed again
+    ledger.select.return_value.eq.return_value.limit.return_value.execute.return_value = \
+        SimpleNamespace(data=[{"status": "failed"}])
+    with patch.object(webhook_events, "supabase_admin", db):
+        assert await webhook_events.record_stripe_event(EVENT) is True
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("state, removed", [("failed", True), ("delayed", False), ("unknown", False)])
+async def test_redelivery_after_exhausted_retries_requeues(state, removed):
+    queue = MagicMock(getJobState=AsyncMock(return_value=state), remove=AsyncMock(), add=AsyncMock())
+    with patch.object(billing_queue, "get_billing_queue", return_value=queue):
+        assert await billing_queue.enqueue_stripe_event(EVENT) is True
+    assert queue.remove.await_count == int(removed)
+    if removed:
+        queue.remove.assert_awaited_once_with("evt_1")
+    assert queue.add.await_args.args[2]["jobId"] == "evt_1"
+
+
+def _ordering_db(newer_rows):
+    db = MagicMock()
+    chain = db.from_.return_value.select.return_value.eq.return_value.eq.return_value.in_.return_value
+    chain.gt.return_value.limit.return_value.execute.return_value = SimpleNamespace(data=newer_rows)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_older_status_event_is_skipped():
+    db = _ordering_db([{"id": "evt_newer_deleted"}])
+    with patch.object(webhook_events, "supabase_admin", db), \
+         patch.object(webhook_events, "deactivate_subscription", AsyncMock()) as deactivate:
+        await webhook_events.process_stripe_event(EVENT)
+    deactivate.assert_not_awaited()
+    assert db.from_.return_value.update.call_args.args[0]["status"] == "skipped"
+
+
+@pytest.mark.asyncio
+async def test_handler_failure_marks_failed_and_raises_for_retry():
+    db = _ordering_db([])
+    with patch.object(webhook_events, "supabase_admin", db), \
+         patch.object(webhook_events, "deactivate_subscription", AsyncMock(side_effect=RuntimeError("db down"))):
+        with pytest.raises(RuntimeError):
+            await webhook_events.process_stripe_event(EVENT)
+    assert db.from_.return_value.update.call_args.args[0]["status"] == "failed"
+
+    with patch.object(webhook_events, "supabase_admin", db), \
+         patch.object(webhook_events, "deactivate_subscription", AsyncMock()) as deactivate:
+        await webhook_events.process_stripe_event(EVENT, attempt=2)
+    deactivate.assert_awaited_once_with("sub_1", new_status="past_due")
+    assert db.from_.return_value.update.call_args.args[0]["status"] == "processed"
+    assert db.from_.return_value.update.call_args.args[0]["attempts"] == 2
+    assert webhook_events._subscription_locks == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_cancel_state_write_is_retried_not_marked_processed():
+    event = {"id": "evt_2", "type": "customer.subscription.updated", "created": 1700000000,
+             "data": {"object": {"id": "sub_1", "cancel_at_period_end": True}}}
+    db = _ordering_db([])
+    db.from_.return_value.update.return_value.eq.return_value.execute.side_effect = [
+        RuntimeError("db down"),  # the subscriptions update
+        SimpleNamespace(data=[]),  # marking the ledger row failed
+    ]
+    with patch.object(webhook_events, "supabase_admin", db), \
+         patch.object(subscription, "supabase_admin", db):
+        with pytest.raises(RuntimeError):
+            await webhook_events.process_stripe_event(event)
+    assert db.from_.return_value.update.call_args.args[0]["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_billing_processor_dispatches():
+    with patch.object(billing_processor, "process_stripe_event", AsyncMock()) as process:
+        await billing_processor.process_billing_job(
+            SimpleNamespace(id="evt_1", name="stripe_event", data={"event": EVENT}, attemptsMade=2)
+        )
+    process.assert_awaited_once_with(EVENT, attempt=3)
+    with pytest.raises(ValueError):
+        await billing_processor.process_billing_job(SimpleNamespace(id="x", name="bogus", data={}, attemptsMade=0))
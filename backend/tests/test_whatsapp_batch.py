@@ -0,0 +1,96 @@
+"""
+Tests for batched WhatsApp webhook payloads: every entry/change/message is processed,
+senders run concurrently under WHATSAPP_BATCH_CONCURRENCY, and one sender's messages
+keep payload order. _process_inbound is mocked — the pipeline itself is covered in
+test_whatsapp_dedup.py.
+"""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services import chat_pipeline
+
+
+def _msg(message_id, sender, text="hi"):
+    return {"id": message_id, "from": sender, "type": "text", "text": {"body": text}}
+
+
+def _value(*messages, statuses=()):
+    return {"value": {"metadata": {"phone_number_id": "pn-1"},
+                      "messages": list(messages), "statuses": list(statuses)}}
+
+
+BATCH = {"entry": [
+    {"changes": [_value(_msg("m1", "A"), _msg("m2", "B")), _value(_msg("m3", "A"))]},
+    {"changes": [_value(_msg("m4", "C"), statuses=[{"status": "failed", "recipient_id": "D"}])]},
+    {"changes": [{"value": {"statuses": [{"status": "read"}]}}]},
+]}
+
+
+@pytest.mark.asyncio
+async def test_every_message_in_every_entry_and_change_is_processed():
+    with patch.object(chat_pipeline, "_process_inbound", AsyncMock()) as process:
+        await chat_pipeline.process_whatsapp_message(BATCH)
+    assert sorted(c.args[1]["id"] for c in process.await_args_list) == ["m1", "m2", "m3", "m4"]
+
+
+@pytest.mark.asyncio
+async def test_senders_run_concurrently_with_per_sender_order_and_bound():
+    events, in_flight, peak = [], 0, 0
+
+    async def process(value, message):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        events.append(("start", message["id"]))
+        await asyncio.sleep(0.01)
+        events.append(("end", message["id"]))
+        in_flight -= 1
+
+    body = {"entry": [{"changes": [_value(
+        _msg("a1", "A"), _msg("a2", "A"), _msg("b1", "B"), _msg("c1", "C"), _msg("d1", "D"),
+    )]}]}
+    with patch.object(chat_pipeline, "_process_inbound", side_effect=process), \
+         patch.object(chat_pipeline.settings, "whatsapp_batch_concurrency", 2):
+        await chat_pipeline.process_whatsapp_message(body)
+
+    assert events.index(("end", "a1")) < events.index(("start", "a2"))
+    assert peak == 2  # parallel across senders, capped by the semaphore
+
+
+@pytest.mark.asyncio
+async def test_one_failing_message_does_not_drop_the_rest():
+    process = AsyncMock(side_effect=[RuntimeError("boom"), None, None, None])
+    with patch.object(chat_pipeline, "_process_inbound", process):
+        await chat_pipeline.process_whatsapp_message(BATCH)
+    assert process.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_status_only_payload_is_a_no_op():
+    with patch.object(chat_pipeline, "_process_inbound", AsyncMock()) as process:
+        await chat_pipeline.process_whatsapp_message({"entry": [{"changes": [{"value": {"statuses": []}}]}]})
+    process.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_same_sender_in_concurrent_payloads_keeps_arrival_order():
+    events = []
+
+    async def process(value, message):
+        events.append(("start", message["id"]))
+        # A slow dedup claim / user lookup for the first message must not let the second overtake it
+        await asyncio.sleep(0.02 if message["id"] == "m1" else 0)
+        events.append(("end", message["id"]))
+
+    first = {"entry": [{"changes": [_value(_msg("m1", "A"))]}]}
+    second = {"entry": [{"changes": [_value(_msg("m2", "A"))]}]}
+    with patch.object(chat_pipeline, "_process_sender_message", side_effect=process):
+        await asyncio.gather(
+            chat_pipeline.process_whatsapp_message(first),
+            chat_pipeline.process_whatsapp_message(second),
+        )
+
+    assert events == [("start", "m1"), ("end", "m1"), ("start", "m2"), ("end", "m2")]
+    assert chat_pipeline._sender_locks == {}
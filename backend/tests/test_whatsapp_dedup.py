@@ -0,0 +1,114 @@
+"""
+Tests for idempotent WhatsApp ingestion: claim_inbound_message (SET NX on the
+messages[].id) and its use in chat_pipeline.process_whatsapp_message.
+Redis is an in-memory double shared by the "workers"; lookup/LLM/send are mocked.
+"""
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services import chat_pipeline, whatsapp
+
+
+class NxRedis:
+    def __init__(self):
+        self.strings: dict[str, str] = {}
+        self.ttls: dict[str, int] = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        await asyncio.sleep(0)  # let concurrent callers interleave
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        self.ttls[key] = ex
+        return True
+
+    async def delete(self, key):
+        self.strings.pop(key, None)
+
+
+def _payload(message_id="wamid.ABC"):
+    return {"entry": [{"changes": [{"value": {
+        "metadata": {"phone_number_id": "pn-1"},
+        "messages": [{"id": message_id, "from": "33600000000", "type": "text", "text": {"body": "hi"}}],
+    }}]}]}
+
+
+@pytest.fixture
+def pipeline():
+    redis = NxRedis()
+
+    async def slow_reply(msg):
+        await asyncio.sleep(0.01)
+        return "hello"
+
+    receive = AsyncMock(side_effect=slow_reply)
+    with patch.object(whatsapp, "get_redis", return_value=redis), \
+         patch.object(chat_pipeline, "lookup_user_by_phone", AsyncMock(return_value={"user_id": "u1"})), \
+         patch.object(chat_pipeline, "get_avatar_for_user", AsyncMock(return_value=None)), \
+         patch.object(chat_pipeline, "insert_messages", AsyncMock()), \
+         patch.object(chat_pipeline.whatsapp_adapter, "receive", receive), \
+         patch.object(chat_pipeline.whatsapp_adapter, "send", AsyncMock()) as send:
+        yield redis, receive, send
+
+
+@pytest.mark.asyncio
+async def test_concurrent_redeliveries_reply_once(pipeline):
+    redis, receive, send = pipeline
+    # Original delivery and Meta's retry land on two workers at the same time
+    await asyncio.gather(
+        chat_pipeline.process_whatsapp_message(_payload()),
+        chat_pipeline.process_whatsapp_message(_payload()),
+    )
+    assert receive.await_count == 1
+    assert send.await_count == 1
+    assert redis.strings["ava:wa_inbound:wamid.ABC"] == "done"
+    assert redis.ttls["ava:wa_inbound:wamid.ABC"] == whatsapp.settings.whatsapp_dedup_ttl_s
+
+    # A late retry after completion is dropped too
+    await chat_pipeline.process_whatsapp_message(_payload())
+    assert receive.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_distinct_message_ids_are_both_processed(pipeline):
+    _, receive, _ = pipeline
+    await chat_pipeline.process_whatsapp_message(_payload("wamid.1"))
+    await chat_pipeline.process_whatsapp_message(_payload("wamid.2"))
+    assert receive.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_failure_before_reply_releases_claim(pipeline):
+    redis, receive, send = pipeline
+    receive.side_effect = [RuntimeError("openai down"), "hello"]
+
+    await chat_pipeline.process_whatsapp_message(_payload())  # failure is logged
+    assert "ava:wa_inbound:wamid.ABC" not in redis.strings
+    send.assert_not_awaited()
+
+    await chat_pipeline.process_whatsapp_message(_payload())
+    send.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_claim_is_short_lived_until_the_reply_is_sent(pipeline):
+    redis, receive, send = pipeline
+    send.side_effect = [ConnectionError("worker died mid-send"), None]
+
+    await chat_pipeline.process_whatsapp_message(_payload())
+    # Only the in-progress claim is left, and it expires like the job lock
+    assert redis.strings["ava:wa_inbound:wamid.ABC"] == "processing"
+    assert redis.ttls["ava:wa_inbound:wamid.ABC"] == whatsapp.settings.whatsapp_claim_ttl_s
+
+    del redis.strings["ava:wa_inbound:wamid.ABC"]  # claim TTL elapsed
+    await chat_pipeline.process_whatsapp_message(_payload())  # stalled re-run / redelivery
+    assert send.await_count == 2
+    assert redis.strings["ava:wa_inbound:wamid.ABC"] == "done"
+
+
+@pytest.mark.asyncio
+async def test_claim_fails_open_when_redis_is_down():
+    with patch.object(whatsapp, "get_redis", side_effect=ConnectionError("down")):
+        assert await whatsapp.claim_inbound_message("wamid.X") is True
@@ -0,0 +1,171 @@
+"""
+Tests for the pooled outbound WhatsApp sender (services/whatsapp_sender.py).
+Graph API is an httpx.MockTransport; backoff sleeps are patched out. The Redis rate
+bucket is a Python double of the Lua script unless a test breaks it on purpose.
+"""
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.services import whatsapp_sender as sender_module
+from app.services.whatsapp_sender import SharedTokenBucket, TokenBucket, WhatsAppSender
+
+
+class BucketRedis:
+    """eval() of _TAKE_TOKEN_LUA in Python, on a controllable clock — shared like Redis would be."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.buckets: dict[str, tuple[float, float]] = {}
+        self.keys: list[str] = []
+
+    async def eval(self, script, numkeys, key, rate, burst):
+        self.keys.append(key)
+        tokens, ts = self.buckets.get(key, (float(burst), self.now))
+        tokens = min(burst, tokens + max(0.0, self.now - ts) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self.buckets[key] = (tokens, self.now)
+        return str(wait).encode()
+
+
+@pytest.fixture(autouse=True)
+def shared_bucket():
+    fake = BucketRedis()
+    with patch.object(sender_module, "get_redis", return_value=fake):
+        yield fake
+
+
+def _transport(statuses: list[int], seen: list[httpx.Request]):
+    replies = iter(statuses)
+
+    def handler(request):
+        seen.append(request)
+        status = next(replies)
+        headers = {"retry-after": "1"} if status == 429 else {}
+        return httpx.Response(status, json={"messages": [{"id": "wamid.OUT"}]}, headers=headers)
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.fixture
+def no_sleep():
+    with patch.object(sender_module.asyncio, "sleep", AsyncMock()) as sleep:
+        yield sleep
+
+
+@pytest.mark.asyncio
+async def test_retries_429_then_succeeds_on_one_client(no_sleep):
+    seen = []
+    sender = WhatsAppSender(rate_per_s=100, burst=10, max_attempts=4, transport=_transport([429, 429, 200, 200], seen))
+
+    result = await sender.send_text("pn-1", "+33600000000", "hello")
+
+    assert result["messages"][0]["id"] == "wamid.OUT"
+    assert len(seen) == 3
+    assert seen[0].url.path.endswith("/pn-1/messages")
+    assert no_sleep.await_args_list[0].args[0] == 1.0  # Retry-After honoured
+
+    client = sender._client
+    await sender.send_template("pn-1", "+33600000001", "welcome")
+    assert sender._client is client  # one pooled client for every send
+    await sender.aclose()
+
+
+@pytest.mark.asyncio
+async def test_permanent_4xx_raises_without_retry(no_sleep):
+    seen = []
+    sender = WhatsAppSender(rate_per_s=100, burst=10, max_attempts=4, transport=_transport([400], seen))
+    with pytest.raises(httpx.HTTPStatusError):
+        await sender.send_text("pn-1", "+33600000000", "hello")
+    assert len(seen) == 1
+
+
+@pytest.mark.asyncio
+async def test_exhausted_retries_raise(no_sleep):
+    seen = []
+    sender = WhatsAppSender(rate_per_s=100, burst=10, max_attempts=3, transport=_transport([429, 429, 429], seen))
+    with pytest.raises(httpx.HTTPStatusError):
+        await sender.send_text("pn-1", "+33600000000", "hello")
+    assert len(seen) == 3
+
+
+@pytest.mark.asyncio
+async def test_5xx_is_not_retried(no_sleep):
+    # Meta may have accepted the message before failing — resending could duplicate it
+    seen = []
+    sender = WhatsAppSender(rate_per_s=100, burst=10, max_attempts=4, transport=_transport([503, 200], seen))
+    with pytest.raises(httpx.HTTPStatusError):
+        await sender.send_text("pn-1", "+33600000000", "hello")
+    assert len(seen) == 1
+
+
+@pytest.mark.asyncio
+async def test_connect_errors_are_retried_but_read_timeouts_are_not(no_sleep):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        raise httpx.ReadTimeout("no response", request=request)
+
+    sender = WhatsAppSender(rate_per_s=100, burst=10, max_attempts=4, transport=httpx.MockTransport(handler))
+    with pytest.raises(httpx.ReadTimeout):
+        await sender.send_text("pn-1", "+33600000000", "hello")
+    assert len(calls) == 2  # one retry after the connect error, none after the read timeout
+
+
+@pytest.mark.asyncio
+async def test_send_text_many_reports_per_message_outcome(no_sleep):
+    seen = []
+    sender = WhatsAppSender(rate_per_s=100, burst=10, max_attempts=1, transport=_transport([200, 400, 200], seen))
+    results = await sender.send_text_many("pn-1", [("+1", "a"), ("+2", "b"), ("+3", "c")])
+    assert [r is None for r in results].count(True) == 2
+    assert sum(isinstance(r, httpx.HTTPStatusError) for r in results) == 1
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_when_empty():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+
+    async def fake_sleep(seconds):
+        now[0] += seconds
+
+    with patch.object(sender_module.asyncio, "sleep", side_effect=fake_sleep):
+        for _ in range(4):
+            await bucket.acquire()
+    # Burst of 2 is free, the next 2 tokens take 1/rate = 0.5s each
+    assert now[0] == pytest.approx(1.0)
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_shared_across_processes(shared_bucket):
+    async def fake_sleep(seconds):
+        shared_bucket.now += seconds
+
+    # Two senders stand in for two processes (e.g. an API worker and the chat worker)
+    api, worker = WhatsAppSender(rate_per_s=2, burst=2), WhatsAppSender(rate_per_s=2, burst=2)
+    with patch.object(sender_module.asyncio, "sleep", side_effect=fake_sleep):
+        for sender in (api, worker, api, worker):
+            await sender._bucket("pn-1").acquire()
+    # One budget: burst of 2 is free, the next 2 tokens take 1/rate = 0.5s each
+    assert shared_bucket.now == pytest.approx(1.0)
+    assert set(shared_bucket.keys) == {"ava:wa_send_bucket:pn-1"}
+
+
+@pytest.mark.asyncio
+async def test_redis_down_falls_back_to_a_process_share_of_the_rate():
+    broken = AsyncMock(side_effect=ConnectionError("no redis"))
+    with patch.object(sender_module, "get_redis", return_value=AsyncMock(eval=broken)), \
+         patch.object(sender_module.settings, "whatsapp_send_processes", 4):
+        bucket = WhatsAppSender(rate_per_s=60, burst=20)._bucket("pn-1")
+        await bucket.acquire()
+    assert isinstance(bucket, SharedTokenBucket)
+    assert bucket.local.rate == 15 and bucket.local.burst == 5
+
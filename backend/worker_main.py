@@ -5,7 +5,11 @@ Run as a separate Docker service:
   CMD: python worker_main.py
 
 This process ONLY runs the BullMQ Worker — it never imports or starts FastAPI.
-Concurrency: 3 concurrent image generation jobs (Claude's discretion per CONTEXT.md).
+Handles 'generate_photo' and 'generate_reference' jobs (see processor.process_job).
+Concurrency: adaptive (AIMD) between PHOTO_WORKER_MIN_CONCURRENCY and
+PHOTO_WORKER_MAX_CONCURRENCY, starting at PHOTO_WORKER_INITIAL_CONCURRENCY (default 3).
+See app/services/jobs/concurrency.py.
+Also runs the admin metrics reconcile loop (app/services/metrics/rollups.py).
 
 Redis connection: parsed from REDIS_URL env var.
   Default: redis://redis:6379 (Docker Compose service name 'redis')
@@ -17,6 +21,7 @@ Queue (enqueue) and Worker (consume) to avoid job serialization mismatch.
 import asyncio
 import logging
 import os
+import time
 from urllib.parse import urlparse
 
 logging.basicConfig(
@@ -25,29 +30,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ava.worker")
 
+METRICS_INTERVAL = 15.0  # seconds between queue-depth polls / metric publishes
+METRICS_KEY = "ava:metrics:photo_worker"  # Redis hash — current concurrency limit et al.
+
+
+async def _publish_metrics(queue, controller) -> None:
+    """Feed queue depth to the controller and publish its state to Redis, forever."""
+    from app.redis_client import get_redis
+
+    while True:
+        try:
+            controller.set_queue_depth(await queue.getJobCountByTypes("waiting", "prioritized"))
+            snapshot = controller.snapshot()
+            snapshot["updated_at"] = int(time.time())
+            await get_redis().hset(METRICS_KEY, mapping=snapshot)
+        except Exception as e:
+            logger.warning(f"Worker metrics publish failed: {e}")
+        await asyncio.sleep(METRICS_INTERVAL)
+
 
 async def main() -> None:
     # Deferred imports ensure env vars (loaded by app.config) are available
-    from bullmq import Worker
-    from app.services.jobs.processor import process_photo_job
+    from bullmq import Queue, Worker
+    from app.services.jobs.processor import process_job
+    from app.services.jobs.concurrency import photo_concurrency
+    from app.services.metrics.rollups import run_reconcile_loop
 
     redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
     parsed = urlparse(redis_url)
     host = parsed.hostname or "redis"
     port = parsed.port or 6379
 
-    logger.info(f"BullMQ worker starting — Redis {host}:{port} concurrency=3")
+    logger.info(
+        f"BullMQ worker starting — Redis {host}:{port} concurrency={photo_concurrency.limit} "
+        f"(adaptive {photo_concurrency.min_limit}-{photo_concurrency.max_limit})"
+    )
 
     worker = Worker(
         "photo_generation",
-        process_photo_job,
+        process_job,
         {
             "connection": {"host": host, "port": port},
-            "concurrency": 3,
+            "concurrency": photo_concurrency.limit,
         },
     )
+    # Worker.run() re-reads opts["concurrency"] before fetching each job
+    photo_concurrency.on_change(lambda limit: worker.opts.update(concurrency=limit))
+
+    queue = Queue("photo_generation", {"connection": {"host": host, "port": port}})
+    asyncio.ensure_future(_publish_metrics(queue, photo_concurrency))
+    # Admin metrics rollups: rewrite recent days + recompute gauges (app/services/metrics/rollups.py)
+    asyncio.ensure_future(run_reconcile_loop())
 
-    logger.info("Worker ready — listening for photo_generation jobs...")
+    logger.info("Worker ready — listening for photo_generation jobs (generate_photo, generate_reference)...")
     # Block forever — process killed by Docker stop signal
     await asyncio.Future()
 
@@ -1,3 +1,4 @@
+import { useRef } from 'react'
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
 
 export interface ChatMessage {
@@ -7,18 +8,69 @@ export interface ChatMessage {
   created_at: string
 }
 
+// Full (non-incremental) refetch interval — re-signs photo URLs in messages already held.
+// Signed URLs served by /chat/history stay valid for at least 10 minutes.
+const HISTORY_FULL_REFRESH_MS = 5 * 60_000
+
+interface HistorySync {
+  token: string | null
+  // X-Cursor of the newest row held — long-polls wait for newer rows. '' = empty
+  // history (long-poll for any message); null = no full page held yet.
+  cursor: string | null
+  etag: string | null     // If-None-Match on full fetches — unchanged history costs a 304
+  fullAt: number
+}
+
 export function useChatHistory(token: string | null) {
+  const queryClient = useQueryClient()
+  const sync = useRef<HistorySync>({ token, cursor: null, etag: null, fullAt: 0 })
+
   return useQuery({
     queryKey: ['chat-history'],
-    queryFn: () =>
-      fetch('/chat/history', {
-        headers: { Authorization: `Bearer ${token}` },
-      }).then(r => {
+    queryFn: async ({ signal }) => {
+      const prev = queryClient.getQueryData<ChatMessage[]>(['chat-history']) ?? []
+      const state = sync.current
+      if (state.token !== token || Date.now() - state.fullAt > HISTORY_FULL_REFRESH_MS) {
+        // Same user: keep the ETag — a 304 means the page held is the one last served
+        sync.current = { token, cursor: null, etag: state.token === token ? state.etag : null, fullAt: 0 }
+      }
+      const { cursor, etag } = sync.current
+      const headers: Record<string, string> = { Authorization: `Bearer ${token}` }
+
+      if (cursor === null) {
+        // Full page
+        if (etag) headers['If-None-Match'] = etag
+        const r = await fetch('/chat/history', { headers, signal })
+        if (r.status === 304) {
+          // Same page as last time — the 304 repeats its cursor, so long-poll next
+          sync.current.cursor = r.headers.get('X-Cursor')
+          sync.current.fullAt = Date.now()
+          return prev
+        }
         if (!r.ok) throw new Error('Failed to load history')
-        return r.json() as Promise<ChatMessage[]>
-      }),
+        sync.current = {
+          token,
+          cursor: r.headers.get('X-Cursor'),
+          etag: r.headers.get('ETag'),
+          fullAt: Date.now(),
+        }
+        return (await r.json()) as ChatMessage[]
+      }
+
+      // Long-poll: the server holds the request until a new message lands (or ~25s pass)
+      const url = cursor ? `/chat/updates?after=${encodeURIComponent(cursor)}` : '/chat/updates'
+      const r = await fetch(url, { headers, signal })
+      if (!r.ok) throw new Error('Failed to load history')
+      const rows = (await r.json()) as ChatMessage[]
+      sync.current.cursor = r.headers.get('X-Cursor') || cursor
+      // Append rows not already held (useSendMessage appends the user row itself)
+      const seen = new Set(prev.map(m => m.id))
+      return [...prev, ...rows.filter(m => !seen.has(m.id))]
+    },
     enabled: !!token,
-    refetchInterval: 3000,
+    // Re-issue the long-poll as soon as the previous one returns; an in-flight request
+    // is not duplicated by the interval.
+    refetchInterval: 1000,
   })
 }
 
@@ -60,7 +112,7 @@ export function useSendMessage(token: string | null, options?: UseSendMessageOpt
       // Append the real user message row to the cache immediately.
       // Do NOT call invalidateQueries — that triggers a full refetch which returns
       // the user message but NOT the assistant reply yet (background task still running).
-      // The 3s poll in useChatHistory does the honest work of picking up the assistant reply.
+      // The /chat/updates long-poll in useChatHistory picks up the assistant reply when it lands.
       queryClient.setQueryData<ChatMessage[]>(['chat-history'], prev => [
         ...(prev ?? []),
         userMessage,